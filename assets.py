@@ -0,0 +1,98 @@
+import io
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional, assets are then sent at their original size
+    Image = None
+
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+INSTAGRAM_LOGO = "instagram.png"
+HOSTED_URL_MARGIN_SECONDS = 3600  # Stop reusing a signed CDN link this long before it expires
+
+@dataclass(slots=True)
+class StaticAsset:
+    """A bundled image kept in memory, downsized for the size it is displayed at."""
+    name: str  # attachment filename
+    path: str
+    max_size: int  # longest side in pixels
+    data: Optional[bytes] = None
+    hosted_url: Optional[str] = None  # CDN link of a copy Discord already stores
+    hosted_until: float = 0.0
+
+    def reference(self) -> Tuple[Optional[str], Optional[Tuple[bytes, str]]]:
+        """Return the URL embeds should use for this asset and the file to upload with them, if any."""
+        if self.hosted_url and time.time() < self.hosted_until - HOSTED_URL_MARGIN_SECONDS:
+            return self.hosted_url, None
+        if self.data:
+            return f"attachment://{self.name}", (self.data, self.name)
+        return None, None
+
+# Attachment filename -> asset
+STATIC_ASSETS: Dict[str, StaticAsset] = {
+    INSTAGRAM_LOGO: StaticAsset(INSTAGRAM_LOGO, os.path.join(ASSET_DIR, "Instagram.png"), max_size=64),
+}
+
+def downsize_image(data: bytes, max_size: int) -> bytes:
+    """Shrink an image to fit max_size, returning the original bytes if that isn't smaller."""
+    if Image is None:
+        return data
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if max(image.size) <= max_size:
+                return data
+            image.thumbnail((max_size, max_size))
+            output = io.BytesIO()
+            image.save(output, format="PNG", optimize=True)
+        return output.getvalue() if output.tell() < len(data) else data
+    except Exception as e:
+        logging.warning(f"Could not downsize image, using it as is: {e}")
+        return data
+
+def load_static_assets() -> None:
+    """Read and downsize every registered asset once; later calls are no-ops."""
+    for asset in STATIC_ASSETS.values():
+        if asset.data is not None:
+            continue
+        try:
+            with open(asset.path, "rb") as f:
+                original = f.read()
+        except FileNotFoundError:
+            logging.warning(f"Static asset {asset.name} not found at {asset.path}")
+            asset.data = b""
+            continue
+        asset.data = downsize_image(original, asset.max_size)
+        logging.info(f"Loaded static asset {asset.name}: {len(original)} bytes, {len(asset.data)} bytes after downsizing")
+    if Image is None:
+        logging.info("Pillow is not installed, static assets are not downsized")
+
+def get_asset(name: str) -> StaticAsset:
+    """Return a registered asset, loading the registry first if needed."""
+    asset = STATIC_ASSETS[name]
+    if asset.data is None:
+        load_static_assets()
+    return asset
+
+def signed_url_expiry(url: str) -> float:
+    """Read the expiry of a signed Discord CDN link (hex epoch in its ex parameter)."""
+    try:
+        return float(int(parse_qs(urlparse(url).query)["ex"][0], 16))
+    except (KeyError, IndexError, ValueError):
+        return 0.0
+
+def note_hosted_attachments(attachments: Iterable) -> None:
+    """Remember where Discord hosts assets we uploaded, so following messages can link them instead."""
+    for attachment in attachments:
+        asset = STATIC_ASSETS.get(attachment.filename)
+        if asset is None:
+            continue
+        expires_at = signed_url_expiry(attachment.url)
+        if expires_at > asset.hosted_until:
+            asset.hosted_url = attachment.url
+            asset.hosted_until = expires_at
+            logging.debug(f"Reusing hosted copy of {asset.name} until {expires_at:.0f}")
@@ -4,61 +4,47 @@ from discord.ext import tasks
 import os
 from dotenv import load_dotenv
 import logging
-import requests
-import io
 import time
-from datetime import datetime, timezone, UTC, timedelta
-from typing import Optional
-from instagram import fetch_instagram_content, INSTAGRAM_POST_CACHE, INSTAGRAM_STORY_CACHE, save_last_ig_post_shortcode, save_last_ig_story, load_last_ig_story, userdetails_instagram
+from dataclasses import asdict
+from typing import List, Optional
+import asyncio
+from instagram import fetch_instagram_content, BACKGROUND_TASKS, INSTAGRAM_POST_CACHE, INSTAGRAM_STORY_CACHE, LAST_FETCHED_STORY_IDS, cache_content_items, configure_content_caches, fetch_user_snapshot, record_fetched_items, save_last_ig_post_shortcode, load_last_ig_post_shortcode, save_last_ig_story, load_last_ig_story, store_user_snapshot, userdetails_instagram
+from delivery import OutboundItem, enqueue_delivery, is_delivery_pending
+from sessions import start_sessions
+from cache_snapshot import restore_cache_snapshot, snapshot_caches
+from assets import load_static_assets, note_hosted_attachments
+from command_sync import sync_commands_if_changed
+from config import CONFIG, CONFIG_FILE, CONFIG_WATCH_INTERVAL, load_config, parse_setting, reload_config_if_changed, update_setting
+from content_cache import ContentCache
+from ipc import POLLER_SOCKET, request_poll, request_user_snapshot, start_poller_server
+from outbox import OUTBOX, OUTBOX_MAX_AGE_SECONDS, OutboxEntry, add_to_outbox, expired_outbox_entries, load_entry_media, load_outbox, mark_part_sent, persist_outbox, schedule_persist_outbox
+from records import ContentItem, HistoryRecord, PostItem, PostRecord, StoryRecord, UserSnapshot
+from render import DELETED_POST_NOTICE, EXPIRED_STORY_NOTICE, INSTAGRAM_EMBED_COLOR, forget_rendered_item, render_item, render_deleted_post_notice, render_expired_story_notice, set_attachment_refs
+from follower_series import FOLLOWER_DELTA_WINDOWS, follower_deltas, follower_series_range
+from subscriptions import SUBSCRIPTIONS, load_subscriptions, subscribe_channel, subscription_usernames, unsubscribe_channels, subscribed_usernames
+from story_expiry import STORY_EXPIRATION_HOURS, STORY_EXPIRY_RECHECK_SECONDS, load_story_expiry_schedule, schedule_story_expiry, run_story_expiry_timer
 
 logging.basicConfig(filename="bot.log", level=logging.DEBUG, format="%(asctime)s:%(levelname)s:%(message)s")
 
+STARTED_AT = time.perf_counter()
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '.env'))
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
 if not DISCORD_TOKEN:
     logging.error("DISCORD_TOKEN is not set in .env")
     raise ValueError("DISCORD_TOKEN is not set in .env")
 
-CHECK_INTERVAL = 60
-AUTO_POST_CHANNEL_FILE = "auto_post_channel.txt"
-INSTAGRAM_LOGO_PATH = os.path.join(os.path.dirname(__file__), "instagram.png")  # Path to instagram.png
-DISCORD_FILE_SIZE_LIMIT = 8 * 1024 * 1024  
-STORY_EXPIRATION_HOURS = 24  # 
-DISCORD_FILE_SIZE_LIMIT = 10 * 1024 * 1024  
-
 intents = discord.Intents.default()
 intents.message_content = True
 bot = discord.Client(intents=intents)
 tree = app_commands.CommandTree(bot)
-
-class PostView(ui.View):
-    def __init__(self, url: str, content_type: str):
-        super().__init__(timeout=None)
-        self.add_item(ui.Button(label=f"View {content_type.capitalize()}", url=url, style=discord.ButtonStyle.link))
-
-def load_auto_post_channel() -> Optional[int]:
-    """Load the auto-post channel ID."""
-    try:
-        with open(AUTO_POST_CHANNEL_FILE, "r") as f:
-            channel_id = f.read().strip()
-            if channel_id:
-                channel_id = int(channel_id)
-                logging.debug(f"Loaded auto-post channel ID: {channel_id}")
-                return channel_id
-            return None
-    except (FileNotFoundError, ValueError):
-        logging.warning("No valid auto-post channel ID found, starting fresh")
-        return None
-
-def save_auto_post_channel(channel_id: Optional[int]) -> None:
-    """Save the auto-post channel ID."""
-    try:
-        with open(AUTO_POST_CHANNEL_FILE, "w") as f:
-            f.write(str(channel_id) if channel_id else "")
-        logging.debug(f"Saved auto-post channel ID: {channel_id}")
-    except Exception as e:
-        logging.error(f"Error saving auto-post channel ID: {e}")
-        print(f"Error saving auto-post channel ID: {e}")
+story_expiry_task: Optional[asyncio.Task] = None
+poll_lock = asyncio.Lock()
+cache_restore_task: Optional[asyncio.Task] = None
+outbox_load_task: Optional[asyncio.Task] = None
+last_poll_completed_at = 0.0
+early_poll_waiters: List[asyncio.Future] = []  # /ping calls waiting for the next poll the loop runs
+commands_synced = False
+startup_completed = False  # on_ready runs again on every reconnect
 
 def is_admin():
     async def predicate(interaction: discord.Interaction) -> bool:
@@ -68,381 +54,490 @@ def is_admin():
         return True
     return app_commands.check(predicate)
 
-@tasks.loop(seconds=CHECK_INTERVAL)
+def find_item_embed(embeds: List[discord.Embed], field_name: str, value: str) -> int:
+    """Find which embed of a (possibly coalesced) message belongs to an item."""
+    for idx, embed in enumerate(embeds):
+        if any(field.name == field_name and str(field.value) == str(value) for field in embed.fields):
+            return idx
+    return 0
+
+def view_without_link(message: discord.Message, url: str) -> Optional[ui.View]:
+    """Rebuild a message's link buttons without the one pointing at url."""
+    view = ui.View.from_message(message, timeout=None)
+    for child in list(view.children):
+        if getattr(child, "url", None) == url:
+            view.remove_item(child)
+    return view if view.children else None
+
+async def edit_item_embed(message: discord.Message, embeds: List[discord.Embed], idx: int, embed: discord.Embed, username: str, url: str) -> None:
+    """Replace one item's embed in a message, keeping the other items and every existing attachment."""
+    set_attachment_refs(embed, username, {attachment.filename for attachment in message.attachments})
+    if embeds:
+        embeds[idx] = embed
+    else:
+        embeds = [embed]
+    await message.edit(content="", embeds=embeds, attachments=message.attachments, view=view_without_link(message, url))
+
+async def apply_deleted_post_notice(channel: discord.abc.Messageable, username: str, entry: PostRecord) -> None:
+    """Edit the message for a deleted post in a channel and record that the notice is applied."""
+    shortcode = entry.shortcode
+    message_id = entry.message_ids.get(str(channel.id))
+    current_utc = int(time.time())
+    logging.debug(f"Processing deleted post {shortcode} for @{username}, message_id: {message_id}, channel_id: {channel.id}")
+    try:
+        message = await channel.fetch_message(int(message_id))
+        embeds = list(message.embeds)
+        idx = find_item_embed(embeds, "Shortcode", shortcode)
+        if embeds and embeds[idx].description and DELETED_POST_NOTICE in embeds[idx].description:
+            logging.debug(f"Message {message_id} for {shortcode} already marked as deleted, skipping edit")
+        else:
+            like_count = entry.like_count
+            comment_count = entry.comment_count
+            if like_count is None or comment_count is None:
+                cached_post = INSTAGRAM_POST_CACHE.get(username, shortcode)
+                if cached_post:
+                    like_count = cached_post.like_count if cached_post.like_count is not None else "Unknown"
+                    comment_count = cached_post.comment_count if cached_post.comment_count is not None else "Unknown"
+                else:
+                    like_count = "Unknown"
+                    comment_count = "Unknown"
+            embed = render_deleted_post_notice(embeds[idx] if embeds else None, entry, message_id, entry.deleted_at or current_utc, like_count, comment_count)
+            await edit_item_embed(message, embeds, idx, embed, username, f"https://www.instagram.com/p/{shortcode}/")
+            logging.info(f"Edited message {message_id} in channel {channel.id} for deleted post {shortcode} with deletion notice")
+            print(f"Edited message {message_id} in channel {channel.id} for deleted post {shortcode}")
+    except discord.NotFound:
+        logging.warning(f"Message {message_id} for deleted post {shortcode} not found in channel {channel.id}")
+        print(f"Message {message_id} for deleted post {shortcode} not found in channel {channel.id}")
+    except discord.errors.HTTPException as e:
+        logging.error(f"HTTP error editing message {message_id} for deleted post {shortcode}: {e}")
+        print(f"HTTP error editing message {message_id} for deleted post {shortcode}: {e}")
+        return
+    except Exception as e:
+        logging.error(f"Error editing message {message_id} for deleted post {shortcode}: {e}")
+        print(f"Error editing message {message_id} for deleted post {shortcode}: {e}")
+        return
+    save_last_ig_post_shortcode(
+        username=username,
+        shortcode=shortcode,
+        timestamp=entry.timestamp,
+        channel_id=channel.id,
+        marked_deleted=True,
+        deleted_at=entry.deleted_at or current_utc,
+        notice_applied=True
+    )
+
+async def apply_expired_story_notice(channel: discord.abc.Messageable, username: str, entry: StoryRecord) -> None:
+    """Edit the message for an expired story in a channel and record that the notice is applied."""
+    story_id = entry.story_id
+    message_id = entry.message_ids.get(str(channel.id))
+    current_utc = int(time.time())
+    try:
+        message = await channel.fetch_message(int(message_id))
+        embeds = list(message.embeds)
+        idx = find_item_embed(embeds, "Story ID", story_id)
+        if embeds and embeds[idx].description and EXPIRED_STORY_NOTICE in embeds[idx].description:
+            logging.debug(f"Message {message_id} for story {story_id} already marked as expired, skipping edit")
+        else:
+            embed = render_expired_story_notice(embeds[idx] if embeds else None, entry, entry.expired_at or current_utc)
+            await edit_item_embed(message, embeds, idx, embed, username, f"https://www.instagram.com/stories/{username}/{story_id}/")
+            logging.info(f"Edited message {message_id} in channel {channel.id} for expired story {story_id} with expiration notice")
+            print(f"Edited message {message_id} in channel {channel.id} for expired story {story_id}")
+    except discord.NotFound:
+        logging.warning(f"Message {message_id} for expired story {story_id} not found in channel {channel.id}")
+        print(f"Message {message_id} for expired story {story_id} not found in channel {channel.id}")
+    except discord.errors.HTTPException as e:
+        logging.error(f"HTTP error editing message {message_id} for expired story {story_id}: {e}")
+        print(f"HTTP error editing message {message_id} for expired story {story_id}: {e}")
+        return
+    except Exception as e:
+        logging.error(f"Error editing message {message_id} for expired story {story_id}: {e}")
+        print(f"Error editing message {message_id} for expired story {story_id}: {e}")
+        return
+    save_last_ig_story(
+        username=username,
+        story_id=story_id,
+        timestamp=entry.timestamp,
+        channel_id=channel.id,
+        expired=True,
+        expired_at=entry.expired_at or current_utc,
+        notice_applied=True
+    )
+
+async def apply_pending_notices() -> None:
+    """Apply deletion and expiry notices that the history says are still missing in any channel.
+
+    Entries whose notice is recorded as applied are skipped without touching Discord.
+    """
+    for username in CONFIG.monitored_usernames:
+        for entry in load_last_ig_post_shortcode(username).entries.values():
+            if entry.marked_deleted:
+                for channel in channels_missing_notice(entry):
+                    await apply_deleted_post_notice(channel, username, entry)
+        for entry in load_last_ig_story(username).entries.values():
+            if entry.expired:
+                for channel in channels_missing_notice(entry):
+                    await apply_expired_story_notice(channel, username, entry)
+
+def channels_missing_notice(entry: HistoryRecord) -> List[discord.abc.Messageable]:
+    """Return the channels holding a message for a history entry that don't show its notice yet."""
+    channels = []
+    for channel_key in entry.message_ids:
+        if channel_key in entry.notices_applied:
+            continue
+        channel = bot.get_channel(int(channel_key))
+        if channel:
+            channels.append(channel)
+        else:
+            logging.warning(f"Channel {channel_key} for history entry {entry.identifier} not found")
+    return channels
+
+async def expire_scheduled_story(username: str, story_id: str, expires_at: int) -> None:
+    """Mark a story expired at its scheduled expiry time and edit its messages straight away.
+
+    The latest poll is only used as confirmation: if it still returned the story after
+    the expiry time, the expiry is pushed back instead of applied.
+    """
+    fetched_at, fetched_story_ids = LAST_FETCHED_STORY_IDS.get(username, (0, set()))
+    if story_id in fetched_story_ids and fetched_at >= expires_at:
+        logging.info(f"Story {story_id} of @{username} is still live after its expiry time, rechecking in {STORY_EXPIRY_RECHECK_SECONDS}s")
+        schedule_story_expiry(username, story_id, int(time.time()) + STORY_EXPIRY_RECHECK_SECONDS)
+        return
+    entry = load_last_ig_story(username).entries.get(story_id)
+    if not entry:
+        logging.debug(f"Scheduled expiry for unknown story {story_id} of @{username}, ignoring")
+        return
+    if not entry.expired:
+        entry.expired = True
+        entry.expired_at = int(expires_at)
+        save_last_ig_story(
+            username=username,
+            story_id=story_id,
+            timestamp=entry.timestamp,
+            expired=True,
+            expired_at=entry.expired_at
+        )
+        logging.info(f"Story {story_id} of @{username} expired at its scheduled time")
+    for channel in channels_missing_notice(entry):
+        await apply_expired_story_notice(channel, username, entry)
+
+def schedule_known_story_expiries() -> None:
+    """Schedule expiry for every recorded story that has not expired yet."""
+    load_story_expiry_schedule()
+    for username in CONFIG.monitored_usernames:
+        for entry in load_last_ig_story(username).entries.values():
+            if entry.expired or not entry.timestamp:
+                continue
+            schedule_story_expiry(username, entry.story_id, entry.timestamp + STORY_EXPIRATION_HOURS * 3600)
+
+def record_delivery(item: ContentItem, channel_id: int, message: discord.Message) -> None:
+    """Record in the history that an item was posted to a channel."""
+    note_hosted_attachments(message.attachments)
+    if isinstance(item, PostItem):
+        save_last_ig_post_shortcode(
+            username=item.username,
+            shortcode=item.shortcode,
+            timestamp=item.timestamp,
+            channel_id=channel_id,
+            message_id=message.id,
+            like_count=item.like_count,
+            comment_count=item.comment_count
+        )
+        logging.info(f"Posted Instagram post shortcode {item.shortcode} to channel {channel_id}, message_id: {message.id}")
+        print(f"Posted Instagram post shortcode {item.shortcode} to channel {channel_id}, message_id: {message.id}")
+    else:
+        save_last_ig_story(
+            username=item.username,
+            story_id=item.story_id,
+            timestamp=item.timestamp,
+            channel_id=channel_id,
+            message_id=message.id
+        )
+        logging.info(f"Posted Instagram story {item.story_id} to channel {channel_id}, message_id: {message.id}")
+        print(f"Posted Instagram story {item.story_id} to channel {channel_id}, message_id: {message.id}")
+
+def content_cache_for(item: ContentItem) -> ContentCache:
+    return INSTAGRAM_POST_CACHE if isinstance(item, PostItem) else INSTAGRAM_STORY_CACHE
+
+def release_delivered_media(item: ContentItem) -> None:
+    """Once an item has gone out to every channel it was queued for, keep only its metadata in memory."""
+    forget_rendered_item(item)
+    task = asyncio.create_task(content_cache_for(item).release_media(item))
+    BACKGROUND_TASKS.add(task)
+    task.add_done_callback(BACKGROUND_TASKS.discard)
+
+async def load_cached_media(content_items: List[ContentItem]) -> List[ContentItem]:
+    """Read the media of cached items back from the media store where they were released."""
+    loaded = []
+    for item in content_items:
+        loaded.extend(await content_cache_for(item).load_media([item]))
+    return loaded
+
+def record_part_sent(entry: OutboxEntry, part: int, part_count: int, message: discord.Message) -> None:
+    """Record a message Discord accepted in the history and the outbox."""
+    record_delivery(entry.item, entry.channel_id, message)
+    mark_part_sent(entry, part, part_count)
+
+def queue_outbox_entry(channel: discord.abc.Messageable, entry: OutboxEntry, item: ContentItem) -> None:
+    """Queue the messages of an outbox entry that Discord hasn't accepted yet; the channel's delivery worker sends them.
+
+    The split into messages is recorded on the entry the first time, and a resumed entry
+    is rendered with the same split so its sent parts keep their meaning.
+    """
+    parts = render_item(item, CONFIG.discord_file_size_limit, entry.parts)
+    if entry.parts is None:
+        entry.parts = [rendered.media_filenames for rendered in parts]
+        schedule_persist_outbox()
+    logging.info(f"Queueing Instagram {item.KIND} {item.identifier} with media {[media.filename for media in item.media]} for channel {channel.id}")
+    for part, rendered in enumerate(parts):
+        if part in entry.parts_sent:
+            continue
+        if not rendered.embeds:
+            logging.warning(f"Media of part {part + 1} of {item.KIND} {item.identifier} are gone, skipping it for channel {channel.id}")
+            mark_part_sent(entry, part, len(parts))
+            continue
+        enqueue_delivery(
+            channel,
+            OutboundItem(
+                identifier=item.identifier,
+                embeds=rendered.embeds,
+                files=rendered.files,
+                buttons=rendered.buttons,
+                on_sent=lambda message, part=part: record_part_sent(entry, part, len(parts), message),
+                on_drained=lambda: release_delivered_media(item)
+            ),
+            upload_limit=CONFIG.discord_file_size_limit
+        )
+
+def deliver_content_items(channel: discord.abc.Messageable, content_items: List[ContentItem]) -> None:
+    """Put new posts and stories for a channel in the outbox and queue them.
+
+    Await persist_outbox afterwards to make sure they survive a restart.
+    """
+    for entry in add_to_outbox(channel.id, content_items):
+        if not is_delivery_pending(channel.id, entry.item.identifier):
+            queue_outbox_entry(channel, entry, entry.item)
+
+async def fan_out_content_items(content_items: List[ContentItem]) -> None:
+    """Queue freshly fetched content for every channel subscribed to its user, durably."""
+    for channel_key, subscription in SUBSCRIPTIONS.items():
+        channel = bot.get_channel(int(channel_key))
+        if not channel:
+            logging.error(f"Error: Subscribed channel {channel_key} not found")
+            print(f"Error: Subscribed channel {channel_key} not found")
+            continue
+        channel_items = [item for item in content_items if item.username in subscription_usernames(subscription, CONFIG.monitored_usernames)]
+        if channel_items:
+            deliver_content_items(channel, channel_items)
+    await persist_outbox()
+
+async def resume_outbox() -> None:
+    """Queue outbox entries that aren't being sent, after a failed send or a restart.
+
+    Media released since the entry was added are read back from the media store, so
+    nothing is fetched from Instagram again.
+    """
+    if outbox_load_task is not None:
+        await asyncio.wait([outbox_load_task])
+    for entry in expired_outbox_entries():
+        logging.warning(f"Giving up on {entry.item.KIND} {entry.item.identifier} for channel {entry.channel_id}, it couldn't be sent for {OUTBOX_MAX_AGE_SECONDS}s")
+    for entry in list(OUTBOX.values()):
+        if is_delivery_pending(entry.channel_id, entry.item.identifier):
+            continue
+        channel = bot.get_channel(entry.channel_id)
+        if not channel:
+            logging.warning(f"Channel {entry.channel_id} for outbox entry {entry.item.identifier} not found, keeping it for later")
+            continue
+        item = await load_entry_media(entry)
+        if OUTBOX.get(entry.key) is entry and not is_delivery_pending(entry.channel_id, entry.item.identifier):
+            logging.info(f"Resuming delivery of {entry.item.KIND} {entry.item.identifier} to channel {entry.channel_id} from the outbox")
+            queue_outbox_entry(channel, entry, item)
+
+async def fetch_content(usernames: List[str]) -> List[ContentItem]:
+    """Fetch new posts and stories, in this process or, with POLLER_SOCKET set, through the poller process."""
+    if not POLLER_SOCKET:
+        content_items, _ = await fetch_instagram_content(usernames=usernames)
+        return content_items
+    try:
+        content_items, latest_posts, fetched_story_ids, snapshots = await request_poll(usernames)
+    except (ConnectionError, RuntimeError, asyncio.TimeoutError) as e:
+        logging.error(f"Error polling through the poller process: {e}")
+        print(f"Error polling through the poller process: {e}")
+        return []
+    LAST_FETCHED_STORY_IDS.update(fetched_story_ids)
+    for username, snapshot in snapshots.items():
+        store_user_snapshot(username, snapshot)
+    cache_content_items(latest_posts + content_items)
+    return content_items
+
+async def fetch_userdetails_snapshot(username: str) -> UserSnapshot:
+    """Refresh a user snapshot for /userdetails, in this process or, with POLLER_SOCKET set, through a poller process."""
+    if not POLLER_SOCKET:
+        return await fetch_user_snapshot(username)
+    return store_user_snapshot(username, await request_user_snapshot(username))
+
+async def run_poll_cycle() -> None:
+    """Fetch every subscribed user once, deliver new content to its channels and apply notices.
+
+    Run by the poll loop, which /ping brings forward (see wait_for_early_poll); the lock
+    makes sure only one poll talks to Instagram at a time and resolves the /ping calls
+    waiting for it.
+    """
+    global last_poll_completed_at
+    async with poll_lock:
+        waiters = list(early_poll_waiters)
+        early_poll_waiters.clear()
+        try:
+            usernames = [username for username in subscribed_usernames(CONFIG.monitored_usernames) if username in CONFIG.monitored_usernames]
+            if not usernames:
+                logging.info("No subscribed channels, skipping poll")
+                print("No subscribed channels, skipping poll")
+                return
+
+            await resume_outbox()
+            content_items = await fetch_content(usernames)
+            last_poll_completed_at = time.time()
+            await apply_pending_notices()
+
+            if not content_items:
+                logging.info("No new Instagram posts or stories found for auto-post")
+                print("No new Instagram posts or stories found for auto-post")
+                return
+
+            await fan_out_content_items(content_items)
+            await asyncio.to_thread(record_fetched_items, content_items)
+        finally:
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+async def wait_for_early_poll() -> None:
+    """Bring the poll loop's next iteration forward and wait for it, or for the poll already running.
+
+    The loop then carries on check_interval after this poll, so /ping never adds a fetch of its own.
+    """
+    if poll_lock.locked():
+        async with poll_lock:
+            return
+    waiter = asyncio.get_running_loop().create_future()
+    early_poll_waiters.append(waiter)
+    if check_social_posts.is_running():
+        check_social_posts.restart()  # Only cancels the loop's sleep, the lock shows no poll is running
+    else:
+        check_social_posts.start()
+    await waiter
+
+def snapshot_items_for_channel(channel_id: int) -> List[ContentItem]:
+    """Return the content from the latest polls that a channel has not received yet, for the users it is subscribed to."""
+    subscription = SUBSCRIPTIONS.get(str(channel_id))
+    if subscription is None:
+        return []
+    items = []
+    for username in subscription_usernames(subscription, CONFIG.monitored_usernames):
+        if username not in CONFIG.monitored_usernames:
+            continue
+        posts_by_shortcode = load_last_ig_post_shortcode(username).entries
+        stories_by_id = load_last_ig_story(username).entries
+        post = INSTAGRAM_POST_CACHE.latest(username)
+        if post:
+            entry = posts_by_shortcode.get(post.shortcode)
+            if not (entry and (entry.marked_deleted or str(channel_id) in entry.channel_ids)):
+                items.append(post)
+        for story in INSTAGRAM_STORY_CACHE.items_for(username):
+            entry = stories_by_id.get(str(story.story_id))
+            if not (entry and (entry.expired or str(channel_id) in entry.channel_ids)):
+                items.append(story)
+    return [item for item in items if not is_delivery_pending(channel_id, item.identifier)]
+
+@tasks.loop(seconds=CONFIG.check_interval)
 async def check_social_posts():
-    """Periodically check for new Instagram posts and stories, and update deleted/expired content."""
-    auto_post_channel_id: Optional[int] = load_auto_post_channel()
-    if not auto_post_channel_id:
-        logging.info("No auto-post channel set, skipping check_social_posts")
-        print("No auto-post channel set, skipping check_social_posts")
+    """Periodically check for new Instagram posts and stories, and update deleted/expired content.
+
+    Every monitored user is fetched once per tick no matter how many channels subscribe to it.
+    """
+    await run_poll_cycle()
+
+@tasks.loop(seconds=CONFIG.cache_snapshot_interval)
+async def snapshot_cache_loop():
+    """Periodically snapshot the in-memory caches so a restart starts warm."""
+    await snapshot_caches()
+
+@snapshot_cache_loop.before_loop
+async def before_snapshot_cache_loop():
+    """Don't overwrite the previous snapshot before it has been restored."""
+    if cache_restore_task is not None:
+        await asyncio.wait([cache_restore_task])
+
+def apply_config_changes(changed: List[str]) -> None:
+    """Put changed settings into effect without a restart.
+
+    Settings read where they are used (monitored users, limits) need nothing here.
+    """
+    if not changed:
         return
+    if "check_interval" in changed:
+        check_social_posts.change_interval(seconds=CONFIG.check_interval)
+    if "cache_snapshot_interval" in changed:
+        snapshot_cache_loop.change_interval(seconds=CONFIG.cache_snapshot_interval)
+    if {"content_cache_media_budget_bytes", "content_cache_max_entries", "content_cache_ttl_seconds"} & set(changed):
+        configure_content_caches()
+    logging.info(f"Applied settings {changed}")
+    print(f"Applied settings {changed}")
+
+@tasks.loop(seconds=CONFIG_WATCH_INTERVAL)
+async def watch_config_loop():
+    """Reload the config file when it is edited, outside the poll loop."""
+    apply_config_changes(reload_config_if_changed())
+
+config_group = app_commands.Group(name="config", description="Show or change the bot's settings without restarting it")
+
+@config_group.command(name="show", description="Show the settings in use")
+@is_admin()
+async def config_show(interaction: discord.Interaction):
+    """List every setting and its current value."""
+    lines = [f"**{name}**: {', '.join(value) if isinstance(value, list) else value}" for name, value in asdict(CONFIG).items()]
+    await interaction.response.send_message("\n".join(lines), ephemeral=True)
 
-    channel = bot.get_channel(auto_post_channel_id)
-    if not channel:
-        logging.error(f"Error: Auto-post channel {auto_post_channel_id} not found")
-        print(f"Error: Auto-post channel {auto_post_channel_id} not found")
+@config_group.command(name="set", description="Change a setting and save it to the config file")
+@app_commands.describe(name="The setting to change", value="The new value (comma-separated usernames for monitored_usernames)")
+@is_admin()
+async def config_set(interaction: discord.Interaction, name: str, value: str):
+    """Validate, apply and persist one setting."""
+    try:
+        changed = update_setting(name, parse_setting(name, value))
+    except (KeyError, ValueError) as e:
+        await interaction.response.send_message(f"Invalid setting: {e}", ephemeral=True)
         return
+    except OSError as e:
+        logging.error(f"Error saving settings: {e}")
+        await interaction.response.send_message(f"Could not save {CONFIG_FILE}, {name} is unchanged: {e}", ephemeral=True)
+        return
+    apply_config_changes(changed)
+    logging.info(f"Setting {name} changed to {getattr(CONFIG, name)} by {interaction.user}")
+    await interaction.response.send_message(f"✅ {name} is now {getattr(CONFIG, name)}.", ephemeral=True)
 
-    content_items, deleted_posts = await fetch_instagram_content(channel_id=auto_post_channel_id)
-    
-    current_utc = datetime.now(UTC).strftime("%Y-%m-%d %H:%M:%S UTC")
-    instagram_logo = discord.File(INSTAGRAM_LOGO_PATH, filename="instagram.png") if os.path.exists(INSTAGRAM_LOGO_PATH) else None
-    if not instagram_logo:
-        logging.warning(f"Instagram logo file not found at {INSTAGRAM_LOGO_PATH}")
-
-    for deleted_post in deleted_posts:
-        shortcode = deleted_post["entry"]["shortcode"]
-        username = deleted_post["username"]
-        message_id = deleted_post["entry"]["message_ids"].get(str(auto_post_channel_id))
-        logging.debug(f"Processing deleted post {shortcode} for @{username}, message_id: {message_id}, channel_id: {auto_post_channel_id}")
-        if message_id:
-            try:
-                message = await channel.fetch_message(int(message_id))
-                if message.embeds and len(message.embeds) > 0 and message.embeds[0].description and "**Deleted Post**: This post has been deleted." in message.embeds[0].description:
-                    logging.debug(f"Message {message_id} for {shortcode} already marked as deleted, skipping edit")
-                    continue
-                embed = message.embeds[0] if message.embeds and len(message.embeds) > 0 else discord.Embed(
-                    title="Deleted Instagram Post",
-                    color=0xC13584
-                )
-                original_caption = embed.description if message.embeds and len(message.embeds) > 0 and embed.description and "**Deleted Post**: This post has been deleted." not in embed.description else "No caption"
-                deletion_notice = "\n\n**Deleted Post**: This post has been deleted."
-                embed.description = f"{original_caption}{deletion_notice}"
-                posted_at = deleted_post["entry"]["timestamp"]
-                post_id = deleted_post["entry"]["message_ids"].get(str(auto_post_channel_id), "N/A")
-                posted_at_discord = posted_at or "Unknown"
-                if posted_at and isinstance(posted_at, str):
-                    try:
-                        posted_at_dt = datetime.strptime(posted_at, "%Y-%m-%d %H:%M:%S UTC")
-                        posted_at_discord = f"<t:{int(posted_at_dt.replace(tzinfo=timezone.utc).timestamp())}:F>"
-                    except ValueError as e:
-                        logging.error(f"Invalid posted_at timestamp format for {shortcode}: {posted_at}, error: {e}")
-                        posted_at_discord = posted_at or "Unknown"
-                else:
-                    logging.warning(f"posted_at is None or not a string for {shortcode}: {posted_at}")
-                    posted_at_discord = "Unknown"
-
-                deleted_at = deleted_post["entry"].get("deleted_at", current_utc)
-                deleted_at_discord = deleted_at
-                if deleted_at and isinstance(deleted_at, str):
-                    try:
-                        deleted_at_dt = datetime.strptime(deleted_at, "%Y-%m-%d %H:%M:%S UTC")
-                        deleted_at_discord = f"<t:{int(deleted_at_dt.replace(tzinfo=timezone.utc).timestamp())}:F>"
-                    except ValueError as e:
-                        logging.error(f"Invalid deleted_at timestamp format for {shortcode}: {deleted_at}, error: {e}")
-                        deleted_at_discord = deleted_at or current_utc
-                else:
-                    logging.warning(f"deleted_at is None or not a string for {shortcode}: {deleted_at}, using current_utc")
-                    deleted_at_discord = f"<t:{int(datetime.strptime(current_utc, '%Y-%m-%d %H:%M:%S UTC').replace(tzinfo=timezone.utc).timestamp())}:F>"
-
-                like_count = deleted_post["entry"].get("like_count", None)
-                comment_count = deleted_post["entry"].get("comment_count", None)
-                if like_count is None or comment_count is None:
-                    cached_post = INSTAGRAM_POST_CACHE.get(username, {}).get("post", {})
-                    if cached_post.get("shortcode") == shortcode:
-                        like_count = cached_post.get("like_count", "Unknown")
-                        comment_count = cached_post.get("comment_count", "Unknown")
-                    else:
-                        like_count = "Unknown"
-                        comment_count = "Unknown"
-
-                embed.clear_fields()
-                embed.add_field(name="Post ID", value=post_id, inline=True)
-                embed.add_field(name="Shortcode", value=shortcode, inline=True)
-                embed.add_field(name="Posted At", value=posted_at_discord, inline=True)
-                embed.add_field(name="Deleted At", value=deleted_at_discord, inline=True)
-                embed.add_field(name="Likes", value=like_count, inline=True)
-                embed.add_field(name="Comments", value=comment_count, inline=True)
-
-                embed.set_author(name=f"@{username} | Instagram", icon_url="attachment://instagram.png" if instagram_logo else None)
-
-                files = [instagram_logo] if instagram_logo else []
-                profile_data = None
-                profile_filename = None
-                if username in INSTAGRAM_POST_CACHE and "profile" in INSTAGRAM_POST_CACHE[username]:
-                    cached_profile = INSTAGRAM_POST_CACHE[username]["profile"]
-                    if time.time() - cached_profile["timestamp"] < 300:
-                        profile_data = io.BytesIO(cached_profile["profile_data"].getvalue())
-                        profile_filename = cached_profile["profile_filename"]
-                        files.append(discord.File(profile_data, filename=profile_filename))
-                        embed.set_thumbnail(url=f"attachment://{profile_filename}")
-                        logging.debug(f"Using cached profile picture for deleted post {shortcode}: {profile_filename}")
-
-                if message.attachments:
-                    for attachment in message.attachments:
-                        if attachment.filename.lower().endswith(('.jpg', '.mp4')):
-                            response = requests.get(attachment.url)
-                            response.raise_for_status()
-                            file_size = len(response.content)
-                            if file_size <= DISCORD_FILE_SIZE_LIMIT:
-                                files.append(discord.File(io.BytesIO(response.content), filename=attachment.filename))
-                                logging.debug(f"Retaining attachment for deleted post {shortcode}: {attachment.filename}")
-                            else:
-                                logging.warning(f"Attachment {attachment.filename} for deleted post {shortcode} exceeds Discord file size limit ({DISCORD_FILE_SIZE_LIMIT} bytes)")
-                await message.edit(content="", embed=embed, attachments=files, view=None)
-                save_last_ig_post_shortcode(
-                    username=username,
-                    shortcode=shortcode,
-                    timestamp=posted_at or "1970-01-01 00:00:00 UTC",
-                    channel_id=auto_post_channel_id,
-                    message_id=message_id,
-                    marked_deleted=True,
-                    deleted_at=deleted_at or current_utc,
-                    like_count=like_count if like_count != "Unknown" else None,
-                    comment_count=comment_count if comment_count != "Unknown" else None
-                )
-                logging.info(f"Edited message {message_id} in channel {auto_post_channel_id} for deleted post {shortcode} with deletion notice")
-                print(f"Edited message {message_id} in channel {auto_post_channel_id} for deleted post {shortcode}")
-            except discord.NotFound:
-                logging.warning(f"Message {message_id} for deleted post {shortcode} not found in channel {auto_post_channel_id}")
-                print(f"Message {message_id} for deleted post {shortcode} not found in channel {auto_post_channel_id}")
-            except discord.errors.HTTPException as e:
-                logging.error(f"HTTP error editing message {message_id} for deleted post {shortcode}: {e}")
-                print(f"HTTP error editing message {message_id} for deleted post {shortcode}: {e}")
-            except Exception as e:
-                logging.error(f"Error editing message {message_id} for deleted post {shortcode}: {e}")
-                print(f"Error editing message {message_id} for deleted post {shortcode}: {e}")
-
-    for username in INSTAGRAM_STORY_CACHE:
-        story_history = load_last_ig_story(username)
-        for story_entry in story_history.get("stories", []):
-            story_id = story_entry["story_id"]
-            message_id = story_entry["message_ids"].get(str(auto_post_channel_id))
-            if message_id and story_entry.get("expired"):
-                try:
-                    message = await channel.fetch_message(int(message_id))
-                    if message.embeds and len(message.embeds) > 0 and message.embeds[0].description and "**Expired Story**: This story has expired." in message.embeds[0].description:
-                        logging.debug(f"Message {message_id} for story {story_id} already marked as expired, skipping edit")
-                        continue
-                    embed = message.embeds[0] if message.embeds and len(message.embeds) > 0 else discord.Embed(
-                        title="Expired Instagram Story",
-                        color=0xC13584
-                    )
-                    expiration_notice = "**Expired Story**: This story has expired."
-                    embed.description = expiration_notice
-                    posted_at = story_entry["timestamp"]
-                    story_id_field = story_id
-                    posted_at_discord = posted_at or "Unknown"
-                    if posted_at and isinstance(posted_at, str):
-                        try:
-                            posted_at_dt = datetime.strptime(posted_at, "%Y-%m-%d %H:%M:%S UTC")
-                            posted_at_discord = f"<t:{int(posted_at_dt.replace(tzinfo=timezone.utc).timestamp())}:F>"
-                        except ValueError as e:
-                            logging.error(f"Invalid posted_at timestamp format for story {story_id}: {posted_at}, error: {e}")
-                            posted_at_discord = posted_at or "Unknown"
-                    else:
-                        logging.warning(f"posted_at is None or not a string for story {story_id}: {posted_at}")
-                        posted_at_discord = "Unknown"
-
-                    expired_at = story_entry.get("expired_at", current_utc)
-                    expired_at_discord = expired_at
-                    if expired_at and isinstance(expired_at, str):
-                        try:
-                            expired_at_dt = datetime.strptime(expired_at, "%Y-%m-%d %H:%M:%S UTC")
-                            expired_at_discord = f"<t:{int(expired_at_dt.replace(tzinfo=timezone.utc).timestamp())}:F>"
-                        except ValueError as e:
-                            logging.error(f"Invalid expired_at timestamp format for story {story_id}: {expired_at}, error: {e}")
-                            expired_at_discord = expired_at or current_utc
-                    else:
-                        logging.warning(f"expired_at is None or not a string for story {story_id}: {expired_at}, using current_utc")
-                        expired_at_discord = f"<t:{int(datetime.strptime(current_utc, '%Y-%m-%d %H:%M:%S UTC').replace(tzinfo=timezone.utc).timestamp())}:F>"
-
-                    embed.clear_fields()
-                    embed.add_field(name="Story ID", value=story_id_field, inline=True)
-                    embed.add_field(name="Posted At", value=posted_at_discord, inline=True)
-                    embed.add_field(name="Expired At", value=expired_at_discord, inline=True)
-
-                    embed.set_author(name=f"@{username} | Instagram", icon_url="attachment://instagram.png" if instagram_logo else None)
-
-                    files = [instagram_logo] if instagram_logo else []
-                    profile_data = None
-                    profile_filename = None
-                    if username in INSTAGRAM_STORY_CACHE and "profile" in INSTAGRAM_STORY_CACHE[username]:
-                        cached_profile = INSTAGRAM_STORY_CACHE[username]["profile"]
-                        if time.time() - cached_profile["timestamp"] < 300:
-                            profile_data = io.BytesIO(cached_profile["profile_data"].getvalue())
-                            profile_filename = cached_profile["profile_filename"]
-                            files.append(discord.File(profile_data, filename=profile_filename))
-                            embed.set_thumbnail(url=f"attachment://{profile_filename}")
-                            logging.debug(f"Using cached profile picture for expired story {story_id}: {profile_filename}")
-
-                    if message.attachments:
-                        for attachment in message.attachments:
-                            if attachment.filename.lower().endswith(('.jpg', '.mp4')):
-                                response = requests.get(attachment.url)
-                                response.raise_for_status()
-                                file_size = len(response.content)
-                                if file_size <= DISCORD_FILE_SIZE_LIMIT:
-                                    files.append(discord.File(io.BytesIO(response.content), filename=attachment.filename))
-                                    logging.debug(f"Retaining attachment for expired story {story_id}: {attachment.filename}")
-                                else:
-                                    logging.warning(f"Attachment {attachment.filename} for expired story {story_id} exceeds Discord file size limit ({DISCORD_FILE_SIZE_LIMIT} bytes)")
-                    await message.edit(content="", embed=embed, attachments=files, view=None)
-                    logging.info(f"Edited message {message_id} in channel {auto_post_channel_id} for expired story {story_id} with expiration notice")
-                    print(f"Edited message {message_id} in channel {auto_post_channel_id} for expired story {story_id}")
-                except discord.NotFound:
-                    logging.warning(f"Message {message_id} for expired story {story_id} not found in channel {auto_post_channel_id}")
-                    print(f"Message {message_id} for expired story {story_id} not found in channel {auto_post_channel_id}")
-                except discord.errors.HTTPException as e:
-                    logging.error(f"HTTP error editing message {message_id} for expired story {story_id}: {e}")
-                    print(f"HTTP error editing message {message_id} for expired story {story_id}: {e}")
-                except Exception as e:
-                    logging.error(f"Error editing message {message_id} for expired story {story_id}: {e}")
-                    print(f"Error editing message {message_id} for expired story {story_id}: {e}")
+@config_set.autocomplete("name")
+async def config_set_name_autocomplete(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    return [app_commands.Choice(name=name, value=name) for name in asdict(CONFIG) if current.lower() in name][:25]
 
-    if not content_items:
-        logging.info("No new Instagram posts or stories found for auto-post")
-        print("No new Instagram posts or stories found for auto-post")
-        return
+@config_group.command(name="reload", description="Reload the settings from the config file")
+@is_admin()
+async def config_reload(interaction: discord.Interaction):
+    """Reload the config file straight away instead of waiting for the watcher."""
+    changed = await asyncio.to_thread(load_config)
+    apply_config_changes(changed)
+    await interaction.response.send_message(f"✅ Reloaded settings, changed: {', '.join(changed) if changed else 'nothing'}.", ephemeral=True)
 
-    for item in content_items:
-        instagram_logo = discord.File(INSTAGRAM_LOGO_PATH, filename="instagram.png") if os.path.exists(INSTAGRAM_LOGO_PATH) else None
-        if not instagram_logo:
-            logging.warning(f"Instagram logo file not found at {INSTAGRAM_LOGO_PATH}")
-        content_type = item['type']
-        identifier = item['shortcode']
-        view = PostView(item['url'], content_type)
-        if item['media_data_list'] and item['filename_list']:
-            files = [instagram_logo] if instagram_logo else []
-            embeds = []
-            for idx, (media_data, filename) in enumerate(item['media_data_list']):
-                file_size = len(media_data.getvalue())
-                logging.debug(f"Processing {content_type} media {idx+1} for {item['url']}: {filename}, size: {file_size} bytes")
-                if file_size > DISCORD_FILE_SIZE_LIMIT:
-                    logging.warning(f"Media {filename} exceeds Discord file size limit ({DISCORD_FILE_SIZE_LIMIT} bytes)")
-                    continue
-                files.append(discord.File(io.BytesIO(media_data.getvalue()), filename=filename))
-                embed = discord.Embed(
-                    title=f"New Instagram {content_type.capitalize()}{' (Media ' + str(idx+1) + ')' if idx > 0 else ''}",
-                    description=item['text'] if content_type == "post" and idx == 0 else "" if content_type == "story" else f"Additional media {idx+1} for {content_type}",
-                    color=0xC13584
-                )
-                posted_at = item['timestamp']
-                posted_at_discord = posted_at or "Unknown"
-                if posted_at and isinstance(posted_at, str):
-                    try:
-                        posted_at_dt = datetime.strptime(posted_at, "%Y-%m-%d %H:%M:%S UTC")
-                        posted_at_discord = f"<t:{int(posted_at_dt.replace(tzinfo=timezone.utc).timestamp())}:F>"
-                        if content_type == "story":
-                            expires_at_dt = posted_at_dt + timedelta(hours=STORY_EXPIRATION_HOURS)
-                            expires_at_discord = f"<t:{int(expires_at_dt.replace(tzinfo=timezone.utc).timestamp())}:F>"
-                    except ValueError as e:
-                        logging.error(f"Invalid posted_at timestamp format for {identifier}: {posted_at}, error: {e}")
-                        posted_at_discord = posted_at or "Unknown"
-                        expires_at_discord = "Unknown" if content_type == "story" else None
-                else:
-                    logging.warning(f"posted_at is None or not a string for {identifier}: {posted_at}")
-                    posted_at_discord = "Unknown"
-                    expires_at_discord = "Unknown" if content_type == "story" else None
-
-                like_count = item.get('like_count', "N/A" if content_type == "story" else "Unknown")
-                comment_count = item.get('comment_count', "N/A" if content_type == "story" else "Unknown")
-
-                embed.clear_fields()
-                if content_type == "post":
-                    embed.add_field(name="Post ID", value=item['id'], inline=True)
-                    embed.add_field(name="Shortcode", value=identifier, inline=True)
-                    embed.add_field(name="Posted At", value=posted_at_discord, inline=True)
-                    embed.add_field(name="Likes", value=like_count, inline=True)
-                    embed.add_field(name="Comments", value=comment_count, inline=True)
-                else:  # Story
-                    embed.add_field(name="Story ID", value=identifier, inline=True)
-                    embed.add_field(name="Posted At", value=posted_at_discord, inline=True)
-                    embed.add_field(name="Expires At", value=expires_at_discord, inline=True)
-
-                embed.set_author(name=f"@{item['username']} | Instagram", icon_url="attachment://instagram.png" if instagram_logo else None)
-                if item.get('profile_data') and item.get('profile_filename'):
-                    profile_data = io.BytesIO(item['profile_data'].getvalue())
-                    files.append(discord.File(profile_data, filename=item['profile_filename']))
-                    embed.set_thumbnail(url=f"attachment://{item['profile_filename']}")
-                embeds.append(embed)
-            logging.info(f"Auto-posting Instagram {content_type} {identifier} with media {item['filename_list']} to channel {auto_post_channel_id}")
-            try:
-                message = await channel.send(content="", embeds=embeds, files=files, view=view)
-                logging.info(f"Successfully sent message with {len(files)} files and {len(embeds)} embeds for {identifier}")
-            except discord.errors.HTTPException as e:
-                logging.error(f"Failed to send message for {identifier}: {e}")
-                print(f"Failed to send message for {identifier}: {e}")
-                continue
-        else:
-            embed = discord.Embed(
-                title=f"New Instagram {content_type.capitalize()}",
-                description=item['text'] if content_type == "post" else "",
-                color=0xC13584
-            )
-            posted_at = item['timestamp']
-            posted_at_discord = posted_at or "Unknown"
-            if posted_at and isinstance(posted_at, str):
-                try:
-                    posted_at_dt = datetime.strptime(posted_at, "%Y-%m-%d %H:%M:%S UTC")
-                    posted_at_discord = f"<t:{int(posted_at_dt.replace(tzinfo=timezone.utc).timestamp())}:F>"
-                    if content_type == "story":
-                        expires_at_dt = posted_at_dt + timedelta(hours=STORY_EXPIRATION_HOURS)
-                        expires_at_discord = f"<t:{int(expires_at_dt.replace(tzinfo=timezone.utc).timestamp())}:F>"
-                except ValueError as e:
-                    logging.error(f"Invalid posted_at timestamp format for {identifier}: {posted_at}, error: {e}")
-                    posted_at_discord = posted_at or "Unknown"
-                    expires_at_discord = "Unknown" if content_type == "story" else None
-            else:
-                logging.warning(f"posted_at is None or not a string for {identifier}: {posted_at}")
-                posted_at_discord = "Unknown"
-                expires_at_discord = "Unknown" if content_type == "story" else None
-
-            like_count = item.get('like_count', "N/A" if content_type == "story" else "Unknown")
-            comment_count = item.get('comment_count', "N/A" if content_type == "story" else "Unknown")
-
-            embed.clear_fields()
-            if content_type == "post":
-                embed.add_field(name="Post ID", value=item['id'], inline=True)
-                embed.add_field(name="Shortcode", value=identifier, inline=True)
-                embed.add_field(name="Posted At", value=posted_at_discord, inline=True)
-                embed.add_field(name="Likes", value=like_count, inline=True)
-                embed.add_field(name="Comments", value=comment_count, inline=True)
-            else:  # Story
-                embed.add_field(name="Story ID", value=identifier, inline=True)
-                embed.add_field(name="Posted At", value=posted_at_discord, inline=True)
-                embed.add_field(name="Expires At", value=expires_at_discord, inline=True)
-
-            embed.set_author(name=f"@{item['username']} | Instagram", icon_url="attachment://instagram.png" if instagram_logo else None)
-            files = [instagram_logo] if instagram_logo else []
-            if item.get('profile_data') and item.get('profile_filename'):
-                profile_data = io.BytesIO(item['profile_data'].getvalue())
-                files.append(discord.File(profile_data, filename=item['profile_filename']))
-                embed.set_thumbnail(url=f"attachment://{item['profile_filename']}")
-            logging.warning(f"No media available for Instagram {content_type} {identifier}")
-            try:
-                message = await channel.send(content="", embed=embed, files=files, view=view)
-            except discord.errors.HTTPException as e:
-                logging.error(f"Failed to send message for {identifier}: {e}")
-                print(f"Failed to send message for {identifier}: {e}")
-                continue
-        if content_type == "post":
-            save_last_ig_post_shortcode(
-                username=item['username'],
-                shortcode=item['shortcode'],
-                timestamp=item['timestamp'],
-                channel_id=auto_post_channel_id,
-                message_id=message.id,
-                like_count=item.get('like_count'),
-                comment_count=item.get('comment_count')
-            )
-            logging.info(f"Auto-posted Instagram post shortcode {item['shortcode']} to channel {auto_post_channel_id}, message_id: {message.id}")
-            print(f"Auto-posted Instagram post shortcode {item['shortcode']} to channel {auto_post_channel_id}, message_id: {message.id}")
-        else:
-            save_last_ig_story(
-                username=item['username'],
-                story_id=item['shortcode'],
-                timestamp=item['timestamp'],
-                channel_id=auto_post_channel_id,
-                message_id=message.id
-            )
-            logging.info(f"Auto-posted Instagram story {item['shortcode']} to channel {auto_post_channel_id}, message_id: {message.id}")
-            print(f"Auto-posted Instagram story {item['shortcode']} to channel {auto_post_channel_id}, message_id: {message.id}")
+tree.add_command(config_group)
 
 @tree.command(name="ping", description="Check for new Instagram posts and stories in the current channel")
 @is_admin()
 async def ping(interaction: discord.Interaction):
-    """Check for new Instagram posts and stories in the current channel."""
+    """Post the latest Instagram posts and stories this channel is missing.
+
+    Served from the latest poll when it is recent enough, otherwise the poll loop's next
+    poll is brought forward (or an in-progress one awaited), so /ping never adds its own
+    Instagram fetch. Only the users the channel is subscribed to are posted.
+    """
     await interaction.response.send_message("🔄 Checking for new Instagram posts and stories, please wait...", ephemeral=True)
     channel = interaction.channel
     if not channel:
@@ -450,383 +545,58 @@ async def ping(interaction: discord.Interaction):
         print("Error: Discord channel not found")
         await interaction.followup.send("Error: Discord channel not found", ephemeral=True)
         return
-    
-    content_items, deleted_posts = await fetch_instagram_content(channel_id=channel.id)
-    
-    current_utc = datetime.now(UTC).strftime("%Y-%m-%d %H:%M:%S UTC")
-    instagram_logo = discord.File(INSTAGRAM_LOGO_PATH, filename="instagram.png") if os.path.exists(INSTAGRAM_LOGO_PATH) else None
-    if not instagram_logo:
-        logging.warning(f"Instagram logo file not found at {INSTAGRAM_LOGO_PATH}")
-
-    for deleted_post in deleted_posts:
-        shortcode = deleted_post["entry"]["shortcode"]
-        username = deleted_post["username"]
-        message_id = deleted_post["entry"]["message_ids"].get(str(channel.id))
-        logging.debug(f"Processing deleted post {shortcode} for @{username}, message_id: {message_id}, channel_id: {channel.id}")
-        if message_id:
-            try:
-                message = await channel.fetch_message(int(message_id))
-                if message.embeds and len(message.embeds) > 0 and message.embeds[0].description and "**Deleted Post**: This post has been deleted." in message.embeds[0].description:
-                    logging.debug(f"Message {message_id} for {shortcode} already marked as deleted, skipping edit")
-                    continue
-                embed = message.embeds[0] if message.embeds and len(message.embeds) > 0 else discord.Embed(
-                    title="Deleted Instagram Post",
-                    color=0xC13584
-                )
-                original_caption = embed.description if message.embeds and len(message.embeds) > 0 and embed.description and "**Deleted Post**: This post has been deleted." not in embed.description else "No caption"
-                deletion_notice = "\n\n**Deleted Post**: This post has been deleted."
-                embed.description = f"{original_caption}{deletion_notice}"
-                posted_at = deleted_post["entry"]["timestamp"]
-                post_id = deleted_post["entry"]["message_ids"].get(str(channel.id), "N/A")
-                posted_at_discord = posted_at or "Unknown"
-                if posted_at and isinstance(posted_at, str):
-                    try:
-                        posted_at_dt = datetime.strptime(posted_at, "%Y-%m-%d %H:%M:%S UTC")
-                        posted_at_discord = f"<t:{int(posted_at_dt.replace(tzinfo=timezone.utc).timestamp())}:F>"
-                    except ValueError as e:
-                        logging.error(f"Invalid posted_at timestamp format for {shortcode}: {posted_at}, error: {e}")
-                        posted_at_discord = posted_at or "Unknown"
-                else:
-                    logging.warning(f"posted_at is None or not a string for {shortcode}: {posted_at}")
-                    posted_at_discord = "Unknown"
-
-                deleted_at = deleted_post["entry"].get("deleted_at", current_utc)
-                deleted_at_discord = deleted_at
-                if deleted_at and isinstance(deleted_at, str):
-                    try:
-                        deleted_at_dt = datetime.strptime(deleted_at, "%Y-%m-%d %H:%M:%S UTC")
-                        deleted_at_discord = f"<t:{int(deleted_at_dt.replace(tzinfo=timezone.utc).timestamp())}:F>"
-                    except	ValueError as e:
-                        logging.error(f"Invalid deleted_at timestamp format for {shortcode}: {deleted_at}, error: {e}")
-                        deleted_at_discord = deleted_at or current_utc
-                else:
-                    logging.warning(f"deleted_at is None or not a string for {shortcode}: {deleted_at}, using current_utc")
-                    deleted_at_discord = f"<t:{int(datetime.strptime(current_utc, '%Y-%m-%d %H:%M:%S UTC').replace(tzinfo=timezone.utc).timestamp())}:F>"
-
-                like_Command = deleted_post["entry"].get("like_count", None)
-                comment_count = deleted_post["entry"].get("comment_count", None)
-                if like_count is None or comment_count is None:
-                    cached_post = INSTAGRAM_POST_CACHE.get(username, {}).get("post", {})
-                    if cached_post.get("shortcode") == shortcode:
-                        like_count = cached_post.get("like_count", "Unknown")
-                        comment_count = cached_post.get("comment_count", "Unknown")
-                    else:
-                        like_count = "Unknown"
-                        comment_count = "Unknown"
-
-                embed.clear_fields()
-                embed.add_field(name="Post ID", value=post_id, inline=True)
-                embed.add_field(name="Shortcode", value=shortcode, inline=True)
-                embed.add_field(name="Posted At", value=posted_at_discord, inline=True)
-                embed.add_field(name="Deleted At", value=deleted_at_discord, inline=True)
-                embed.add_field(name="Likes", value=like_count, inline=True)
-                embed.add_field(name="Comments", value=comment_count, inline=True)
-
-                embed.set_author(name=f"@{username} | Instagram", icon_url="attachment://instagram.png" if instagram_logo else None)
-
-                files = [instagram_logo] if instagram_logo else []
-                profile_data = None
-                profile_filename = None
-                if username in INSTAGRAM_POST_CACHE and "profile" in INSTAGRAM_POST_CACHE[username]:
-                    cached_profile = INSTAGRAM_POST_CACHE[username]["profile"]
-                    if time.time() - cached_profile["timestamp"] < 300:
-                        profile_data = io.BytesIO(cached_profile["profile_data"].getvalue())
-                        profile_filename = cached_profile["profile_filename"]
-                        files.append(discord.File(profile_data, filename=profile_filename))
-                        embed.set_thumbnail(url=f"attachment://{profile_filename}")
-                        logging.debug(f"Using cached profile picture for deleted post {shortcode}: {profile_filename}")
-
-                if message.attachments:
-                    for attachment in message.attachments:
-                        if attachment.filename.lower().endswith(('.jpg', '.mp4')):
-                            response = requests.get(attachment.url)
-                            response.raise_for_status()
-                            file_size = len(response.content)
-                            if file_size <= DISCORD_FILE_SIZE_LIMIT:
-                                files.append(discord.File(io.BytesIO(response.content), filename=attachment.filename))
-                                logging.debug(f"Retaining attachment for deleted post {shortcode}: {attachment.filename}")
-                            else:
-                                logging.warning(f"Attachment {attachment.filename} for deleted post {shortcode} exceeds Discord file size limit ({DISCORD_FILE_SIZE_LIMIT} bytes)")
-                await message.edit(content="", embed=embed, attachments=files, view=None)
-                save_last_ig_post_shortcode(
-                    username=username,
-                    shortcode=shortcode,
-                    timestamp=posted_at or "1970-01-01 00:00:00 UTC",
-                    channel_id=channel.id,
-                    message_id=message_id,
-                    marked_deleted=True,
-                    deleted_at=deleted_at or current_utc,
-                    like_count=like_count if like_count != "Unknown" else None,
-                    comment_count=comment_count if comment_count != "Unknown" else None
-                )
-                logging.info(f"Edited message {message_id} in channel {channel.id} for deleted post {shortcode} with deletion notice")
-                print(f"Edited message {message_id} in channel {channel.id} for deleted post {shortcode}")
-            except discord.NotFound:
-                logging.warning(f"Message {message_id} for deleted post {shortcode} not found in channel {channel.id}")
-                print(f"Message {message_id} for deleted post {shortcode} not found in channel {channel.id}")
-            except discord.errors.HTTPException as e:
-                logging.error(f"HTTP error editing message {message_id} for deleted post {shortcode}: {e}")
-                print(f"HTTP error editing message {message_id} for deleted post {shortcode}: {e}")
-            except Exception as e:
-                logging.error(f"Error editing message {message_id} for deleted post {shortcode}: {e}")
-                print(f"Error editing message {message_id} for deleted post {shortcode}: {e}")
-
-    for username in INSTAGRAM_STORY_CACHE:
-        story_history = load_last_ig_story(username)
-        for story_entry in story_history.get("stories", []):
-            story_id = story_entry["story_id"]
-            message_id = story_entry["message_ids"].get(str(channel.id))
-            if message_id and story_entry.get("expired"):
-                try:
-                    message = await channel.fetch_message(int(message_id))
-                    if message.embeds and len(message.embeds) > 0 and message.embeds[0].description and "**Expired Story**: This story has expired." in message.embeds[0].description:
-                        logging.debug(f"Message {message_id} for story {story_id} already marked as expired, skipping edit")
-                        continue
-                    embed = message.embeds[0] if message.embeds and len(message.embeds) > 0 else discord.Embed(
-                        title="Expired Instagram Story",
-                        color=0xC13584
-                    )
-                    expiration_notice = "**Expired Story**: This story has expired."
-                    embed.description = expiration_notice
-                    posted_at = story_entry["timestamp"]
-                    story_id_field = story_id
-                    posted_at_discord = posted_at or "Unknown"
-                    if posted_at and isinstance(posted_at, str):
-                        try:
-                            posted_at_dt = datetime.strptime(posted_at, "%Y-%m-%d %H:%M:%S UTC")
-                            posted_at_discord = f"<t:{int(posted_at_dt.replace(tzinfo=timezone.utc).timestamp())}:F>"
-                        except ValueError as e:
-                            logging.error(f"Invalid posted_at timestamp format for story {story_id}: {posted_at}, error: {e}")
-                            posted_at_discord = posted_at or "Unknown"
-                    else:
-                        logging.warning(f"posted_at is None or not a string for story {story_id}: {posted_at}")
-                        posted_at_discord = "Unknown"
-
-                    expired_at = story_entry.get("expired_at", current_utc)
-                    expired_at_discord = expired_at
-                    if expired_at and isinstance(expired_at, str):
-                        try:
-                            expired_at_dt = datetime.strptime(expired_at, "%Y-%m-%d %H:%M:%S UTC")
-                            expired_at_discord = f"<t:{int(expired_at_dt.replace(tzinfo=timezone.utc).timestamp())}:F>"
-                        except ValueError as e:
-                            logging.error(f"Invalid expired_at timestamp format for story {story_id}: {expired_at}, error: {e}")
-                            expired_at_discord = expired_at or current_utc
-                    else:
-                        logging.warning(f"expired_at is None or not a string for story {story_id}: {expired_at}, using current_utc")
-                        expired_at_discord = f"<t:{int(datetime.strptime(current_utc, '%Y-%m-%d %H:%M:%S UTC').replace(tzinfo=timezone.utc).timestamp())}:F>"
-
-                    embed.clear_fields()
-                    embed.add_field(name="Story ID", value=story_id_field, inline=True)
-                    embed.add_field(name="Posted At", value=posted_at_discord, inline=True)
-                    embed.add_field(name="Expired At", value=expired_at_discord, inline=True)
-
-                    embed.set_author(name=f"@{username} | Instagram", icon_url="attachment://instagram.png" if instagram_logo else None)
-
-                    files = [instagram_logo] if instagram_logo else []
-                    profile_data = None
-                    profile_filename = None
-                    if username in INSTAGRAM_STORY_CACHE and "profile" in INSTAGRAM_STORY_CACHE[username]:
-                        cached_profile = INSTAGRAM_STORY_CACHE[username]["profile"]
-                        if time.time() - cached_profile["timestamp"] < 300:
-                            profile_data = io.BytesIO(cached_profile["profile_data"].getvalue())
-                            profile_filename = cached_profile["profile_filename"]
-                            files.append(discord.File(profile_data, filename=profile_filename))
-                            embed.set_thumbnail(url=f"attachment://{profile_filename}")
-                            logging.debug(f"Using cached profile picture for expired story {story_id}: {profile_filename}")
-
-                    if message.attachments:
-                        for attachment in message.attachments:
-                            if attachment.filename.lower().endswith(('.jpg', '.mp4')):
-                                response = requests.get(attachment.url)
-                                response.raise_for_status()
-                                file_size = len(response.content)
-                                if file_size <= DISCORD_FILE_SIZE_LIMIT:
-                                    files.append(discord.File(io.BytesIO(response.content), filename=attachment.filename))
-                                    logging.debug(f"Retaining attachment for expired story {story_id}: {attachment.filename}")
-                                else:
-                                    logging.warning(f"Attachment {attachment.filename} for expired story {story_id} exceeds Discord file size limit ({DISCORD_FILE_SIZE_LIMIT} bytes)")
-                    await message.edit(content="", embed=embed, attachments=files, view=None)
-                    logging.info(f"Edited message {message_id} in channel {channel.id} for expired story {story_id} with expiration notice")
-                    print(f"Edited message {message_id} in channel {channel.id} for expired story {story_id}")
-                except discord.NotFound:
-                    logging.warning(f"Message {message_id} for expired story {story_id} not found in channel {channel.id}")
-                    print(f"Message {message_id} for expired story {story_id} not found in channel {channel.id}")
-                except discord.errors.HTTPException as e:
-                    logging.error(f"HTTP error editing message {message_id} for expired story {story_id}: {e}")
-                    print(f"HTTP error editing message {message_id} for expired story {story_id}: {e}")
-                except Exception as e:
-                    logging.error(f"Error editing message {message_id} for expired story {story_id}: {e}")
-                    print(f"Error editing message {message_id} for expired story {story_id}: {e}")
+    if str(channel.id) not in SUBSCRIPTIONS:
+        await interaction.followup.send("This channel isn't subscribed to any Instagram account, use /autopost to subscribe it first.", ephemeral=True)
+        return
 
+    snapshot_age = time.time() - last_poll_completed_at
+    if snapshot_age > CONFIG.ping_snapshot_max_age_seconds:
+        logging.info(f"Latest poll is {snapshot_age:.0f}s old, requesting an early poll for /ping")
+        await wait_for_early_poll()
+    else:
+        logging.debug(f"Serving /ping from the latest poll ({snapshot_age:.0f}s old)")
+
+    content_items = await load_cached_media(snapshot_items_for_channel(channel.id))
     if not content_items:
-        logging.info("No new Instagram posts or stories found for auto-post")
-        print("No new Instagram posts or stories found for auto-post")
+        logging.info(f"No new Instagram posts or stories for channel {channel.id}")
+        print(f"No new Instagram posts or stories for channel {channel.id}")
         await interaction.followup.send("✅ No new Instagram posts or stories found.", ephemeral=True)
         return
 
-    for item in content_items:
-        instagram_logo = discord.File(INSTAGRAM_LOGO_PATH, filename="instagram.png") if os.path.exists(INSTAGRAM_LOGO_PATH) else None
-        if not instagram_logo:
-            logging.warning(f"Instagram logo file not found at {INSTAGRAM_LOGO_PATH}")
-        content_type = item['type']
-        identifier = item['shortcode']
-        view = PostView(item['url'], content_type)
-        if item['media_data_list'] and item['filename_list']:
-            files = [instagram_logo] if instagram_logo else []
-            embeds = []
-            for idx, (media_data, filename) in enumerate(item['media_data_list']):
-                file_size = len(media_data.getvalue())
-                logging.debug(f"Processing {content_type} media {idx+1} for {item['url']}: {filename}, size: {file_size} bytes")
-                if file_size > DISCORD_FILE_SIZE_LIMIT:
-                    logging.warning(f"Media {filename} exceeds Discord file size limit ({DISCORD_FILE_SIZE_LIMIT} bytes)")
-                    continue
-                files.append(discord.File(io.BytesIO(media_data.getvalue()), filename=filename))
-                embed = discord.Embed(
-                    title=f"New Instagram {content_type.capitalize()}{' (Media ' + str(idx+1) + ')' if idx > 0 else ''}",
-                    description=item['text'] if content_type == "post" and idx == 0 else "" if content_type == "story" else f"Additional media {idx+1} for {content_type}",
-                    color=0xC13584
-                )
-                posted_at = item['timestamp']
-                posted_at_discord = posted_at or "Unknown"
-                if posted_at and isinstance(posted_at, str):
-                    try:
-                        posted_at_dt = datetime.strptime(posted_at, "%Y-%m-%d %H:%M:%S UTC")
-                        posted_at_discord = f"<t:{int(posted_at_dt.replace(tzinfo=timezone.utc).timestamp())}:F>"
-                        if content_type == "story":
-                            expires_at_dt = posted_at_dt + timedelta(hours=STORY_EXPIRATION_HOURS)
-                            expires_at_discord = f"<t:{int(expires_at_dt.replace(tzinfo=timezone.utc).timestamp())}:F>"
-                    except ValueError as e:
-                        logging.error(f"Invalid posted_at timestamp format for {identifier}: {posted_at}, error: {e}")
-                        posted_at_discord = posted_at or "Unknown"
-                        expires_at_discord = "Unknown" if content_type == "story" else None
-                else:
-                    logging.warning(f"posted_at is None or not a string for {identifier}: {posted_at}")
-                    posted_at_discord = "Unknown"
-                    expires_at_discord = "Unknown" if content_type == "story" else None
-
-                like_count = item.get('like_count', "N/A" if content_type == "story" else "Unknown")
-                comment_count = item.get('comment_count', "N/A" if content_type == "story" else "Unknown")
-
-                embed.clear_fields()
-                if content_type == "post":
-                    embed.add_field(name="Post ID", value=item['id'], inline=True)
-                    embed.add_field(name="Shortcode", value=identifier, inline=True)
-                    embed.add_field(name="Posted At", value=posted_at_discord, inline=True)
-                    embed.add_field(name="Likes", value=like_count, inline=True)
-                    embed.add_field(name="Comments", value=comment_count, inline=True)
-                else:  
-                    embed.add_field(name="Story ID", value=identifier, inline=True)
-                    embed.add_field(name="Posted At", value=posted_at_discord, inline=True)
-                    embed.add_field(name="Expires At", value=expires_at_discord, inline=True)
-
-                embed.set_author(name=f"@{item['username']} | Instagram", icon_url="attachment://instagram.png" if instagram_logo else None)
-                if item.get('profile_data') and item.get('profile_filename'):
-                    profile_data = io.BytesIO(item['profile_data'].getvalue())
-                    files.append(discord.File(profile_data, filename=item['profile_filename']))
-                    embed.set_thumbnail(url=f"attachment://{item['profile_filename']}")
-                embeds.append(embed)
-            logging.info(f"Posting Instagram {content_type} {identifier} with media {item['filename_list']} to channel {channel.id}")
-            try:
-                message = await channel.send(content="", embeds=embeds, files=files, view=view)
-                logging.info(f"Successfully sent message with {len(files)} files and {len(embeds)} embeds for {identifier}")
-            except discord.errors.HTTPException as e:
-                logging.error(f"Failed to send message for {identifier}: {e}")
-                print(f"Failed to send message for {identifier}: {e}")
-                continue
-        else:
-            embed = discord.Embed(
-                title=f"New Instagram {content_type.capitalize()}",
-                description=item['text'] if content_type == "post" else "",
-                color=0xC13584
-            )
-            posted_at = item['timestamp']
-            posted_at_discord = posted_at or "Unknown"
-            if posted_at and isinstance(posted_at, str):
-                try:
-                    posted_at_dt = datetime.strptime(posted_at, "%Y-%m-%d %H:%M:%S UTC")
-                    posted_at_discord = f"<t:{int(posted_at_dt.replace(tzinfo=timezone.utc).timestamp())}:F>"
-                    if content_type == "story":
-                        expires_at_dt = posted_at_dt + timedelta(hours=STORY_EXPIRATION_HOURS)
-                        expires_at_discord = f"<t:{int(expires_at_dt.replace(tzinfo=timezone.utc).timestamp())}:F>"
-                except ValueError as e:
-                    logging.error(f"Invalid posted_at timestamp format for {identifier}: {posted_at}, error: {e}")
-                    posted_at_discord = posted_at or "Unknown"
-                    expires_at_discord = "Unknown" if content_type == "story" else None
-            else:
-                logging.warning(f"posted_at is None or not a string for {identifier}: {posted_at}")
-                posted_at_discord = "Unknown"
-                expires_at_discord = "Unknown" if content_type == "story" else None
-
-            like_count = item.get('like_count', "N/A" if content_type == "story" else "Unknown")
-            comment_count = item.get('comment_count', "N/A" if content_type == "story" else "Unknown")
-
-            embed.clear_fields()
-            if content_type == "post":
-                embed.add_field(name="Post ID", value=item['id'], inline=True)
-                embed.add_field(name="Shortcode", value=identifier, inline=True)
-                embed.add_field(name="Posted At", value=posted_at_discord, inline=True)
-                embed.add_field(name="Likes", value=like_count, inline=True)
-                embed.add_field(name="Comments", value=comment_count, inline=True)
-            else: 
-                embed.add_field(name="Story ID", value=identifier, inline=True)
-                embed.add_field(name="Posted At", value=posted_at_discord, inline=True)
-                embed.add_field(name="Expires At", value=expires_at_discord, inline=True)
-
-            embed.set_author(name=f"@{item['username']} | Instagram", icon_url="attachment://instagram.png" if instagram_logo else None)
-            files = [instagram_logo] if instagram_logo else []
-            if item.get('profile_data') and item.get('profile_filename'):
-                profile_data = io.BytesIO(item['profile_data'].getvalue())
-                files.append(discord.File(profile_data, filename=item['profile_filename']))
-                embed.set_thumbnail(url=f"attachment://{item['profile_filename']}")
-            logging.warning(f"No media available for Instagram {content_type} {identifier}")
-            try:
-                message = await channel.send(content="", embed=embed, files=files, view=view)
-            except discord.errors.HTTPException as e:
-                logging.error(f"Failed to send message for {identifier}: {e}")
-                print(f"Failed to send message for {identifier}: {e}")
-                continue
-        if content_type == "post":
-            save_last_ig_post_shortcode(
-                username=item['username'],
-                shortcode=item['shortcode'],
-                timestamp=item['timestamp'],
-                channel_id=channel.id,
-                message_id=message.id,
-                like_count=item.get('like_count'),
-                comment_count=item.get('comment_count')
-            )
-            logging.info(f"Posted Instagram post shortcode {item['shortcode']} to channel {channel.id}, message_id: {message.id}")
-            print(f"Posted Instagram post shortcode {item['shortcode']} to channel {channel.id}, message_id: {message.id}")
-        else:
-            save_last_ig_story(
-                username=item['username'],
-                story_id=item['shortcode'],
-                timestamp=item['timestamp'],
-                channel_id=channel.id,
-                message_id=message.id
-            )
-            logging.info(f"Posted Instagram story {item['shortcode']} to channel {channel.id}, message_id: {message.id}")
-            print(f"Posted Instagram story {item['shortcode']} to channel {channel.id}, message_id: {message.id}")
-    await interaction.followup.send("✅ New Instagram posts and stories checked and posted if available.", ephemeral=True)
-
-    
+    deliver_content_items(channel, content_items)
+    await persist_outbox()
+    await interaction.followup.send(f"✅ Found {len(content_items)} new Instagram posts and stories, they are being posted now.", ephemeral=True)
+
 @tree.command(name="autopost", description="Enable/disable auto-posting of new Instagram posts and stories to a specified channel")
-@app_commands.describe(channel="The channel to auto-post new Instagram posts and stories to (leave empty to disable)")
+@app_commands.describe(
+    channel="The channel to auto-post new Instagram posts and stories to (leave empty to disable for this server)",
+    username="The monitored Instagram username to post (default: all monitored users)"
+)
 @is_admin()
-async def autopost(interaction: discord.Interaction, channel: Optional[discord.TextChannel] = None):
-    """Enable or disable auto-posting of Instagram posts and stories."""
+async def autopost(interaction: discord.Interaction, channel: Optional[discord.TextChannel] = None, username: Optional[str] = None):
+    """Subscribe a channel to auto-posted Instagram posts and stories, or disable auto-posting for this server."""
     await interaction.response.defer(ephemeral=True)
     try:
         if channel:
-            save_auto_post_channel(channel.id)
-            logging.info(f"Auto-post channel set to {channel.id} by {interaction.user}")
-            print(f"Auto-post channel set to {channel.id}")
-            await interaction.followup.send(f"✅ Auto-posting enabled for new Instagram posts and stories in {channel.mention}.", ephemeral=True)
+            if username and username not in CONFIG.monitored_usernames:
+                await interaction.followup.send(f"@{username} is not a monitored Instagram account. Monitored accounts: {', '.join(CONFIG.monitored_usernames)}", ephemeral=True)
+                return
+            usernames = [username] if username else None
+            subscribe_channel(channel.id, channel.guild.id, usernames)
+            logging.info(f"Auto-post channel {channel.id} subscribed to {usernames or 'all monitored users'} by {interaction.user}")
+            print(f"Auto-post channel {channel.id} subscribed to {usernames or 'all monitored users'}")
+            accounts = ', '.join('@' + name for name in usernames) if usernames else "all monitored accounts"
+            await interaction.followup.send(f"✅ Auto-posting enabled for new Instagram posts and stories from {accounts} in {channel.mention}.", ephemeral=True)
         else:
-            save_auto_post_channel(None)
-            logging.info(f"Auto-posting disabled by {interaction.user}")
-            print("Auto-posting disabled")
-            await interaction.followup.send("✅ Auto-posting disabled.", ephemeral=True)
+            guild_channel_ids = [
+                int(channel_key) for channel_key, subscription in SUBSCRIPTIONS.items()
+                if subscription.get("guild_id") == str(interaction.guild_id)
+                or (interaction.guild and interaction.guild.get_channel(int(channel_key)))
+            ]
+            unsubscribe_channels(guild_channel_ids)
+            logging.info(f"Auto-posting disabled for channels {guild_channel_ids} by {interaction.user}")
+            print(f"Auto-posting disabled for channels {guild_channel_ids}")
+            await interaction.followup.send("✅ Auto-posting disabled for this server.", ephemeral=True)
     except Exception as e:
         logging.error(f"Error in autopost command: {e}")
         print(f"Error in autopost command: {e}")
@@ -838,7 +608,7 @@ async def userdetails(interaction: discord.Interaction, username: str = "avamax"
     """Show Instagram user details for the specified user."""
     await interaction.response.defer()
     try:
-        embed, file = await userdetails_instagram(username=username)
+        embed, file = await userdetails_instagram(username=username, fetch_snapshot=fetch_userdetails_snapshot)
         await interaction.followup.send(embed=embed, file=file)
         logging.info(f"Sent user details for @{username} to Discord")
         print(f"Sent user details for @{username} to Discord")
@@ -848,7 +618,7 @@ async def userdetails(interaction: discord.Interaction, username: str = "avamax"
         if str(e).startswith("429"):
             await interaction.followup.send(f"Rate limit hit, trying with another account...", ephemeral=True)
             try:
-                embed, file = await userdetails_instagram(username=username)
+                embed, file = await userdetails_instagram(username=username, fetch_snapshot=fetch_userdetails_snapshot)
                 await interaction.followup.send(embed=embed, file=file)
             except Exception as re:
                 logging.error(f"Retry failed for @{username}: {re}")
@@ -857,16 +627,73 @@ async def userdetails(interaction: discord.Interaction, username: str = "avamax"
         else:
             await interaction.followup.send(f"Error fetching user details for @{username}: {str(e)}", ephemeral=True)
 
+@tree.command(name="followers", description="Show how an Instagram account's follower count changed over the last hour, day and week")
+@app_commands.describe(username="The monitored Instagram username (default: avamax)")
+async def followers(interaction: discord.Interaction, username: str = "avamax"):
+    """Report follower deltas from the recorded follower time series."""
+    await interaction.response.defer()
+    try:
+        latest, deltas = follower_deltas(username)
+        if not latest:
+            await interaction.followup.send(f"No follower history recorded for @{username} yet.", ephemeral=True)
+            return
+        embed = discord.Embed(title=f"{username} | Instagram Followers", color=INSTAGRAM_EMBED_COLOR)
+        embed.add_field(name="Followers", value=latest[1], inline=True)
+        embed.add_field(name="Sampled At", value=f"<t:{latest[0]}:R>", inline=True)
+        for label, delta in deltas.items():
+            embed.add_field(name=f"Change ({label})", value=f"{delta:+d}" if delta is not None else "Not enough history", inline=False)
+        week = follower_series_range(username, latest[0] - FOLLOWER_DELTA_WINDOWS["7d"], latest[0], max_points=50)
+        if week:
+            counts = [count for _, count in week]
+            embed.set_footer(text=f"7d low: {min(counts)} | 7d high: {max(counts)}")
+        await interaction.followup.send(embed=embed)
+        logging.info(f"Sent follower history for @{username} to Discord")
+    except Exception as e:
+        logging.error(f"Error in followers command for @{username}: {e}")
+        print(f"Error in followers command for @{username}: {e}")
+        await interaction.followup.send(f"Error reading follower history for @{username}: {str(e)}", ephemeral=True)
+
+@bot.event
+async def setup_hook():
+    """Load the settings and Instagram sessions (or listen for the poller process), then the cache snapshot and the outbox in the background so the gateway connects straight away."""
+    global cache_restore_task, outbox_load_task
+    apply_config_changes(load_config())
+    watch_config_loop.start()
+    if POLLER_SOCKET:
+        await start_poller_server(POLLER_SOCKET)
+    else:
+        start_sessions()
+    cache_restore_task = asyncio.create_task(restore_cache_snapshot())
+    outbox_load_task = asyncio.create_task(asyncio.to_thread(load_outbox))
+
 @bot.event
 async def on_ready():
-    """Handle bot startup."""
+    """Handle bot startup; reconnects fire this again and only redo what hasn't succeeded yet."""
+    global story_expiry_task, commands_synced, startup_completed
+    print(f"Logged in as {bot.user}")
+    logging.info(f"Logged in as {bot.user}, {time.perf_counter() - STARTED_AT:.2f}s after startup")
+    if not commands_synced:
+        try:
+            if await sync_commands_if_changed(tree, bot.application_id):
+                print("Slash commands synced")
+            commands_synced = True
+        except Exception as e:
+            logging.error(f"Error syncing slash commands: {e}")
+            print(f"Error syncing slash commands: {e}")
+    if startup_completed:
+        logging.info("Reconnected to Discord, startup already done")
+        return
     try:
-        print(f"Logged in as {bot.user}")
-        logging.info(f"Logged in as {bot.user}")
-        await tree.sync()
-        logging.info("Slash commands synced")
-        print("Slash commands synced")
-        check_social_posts.start()
+        load_static_assets()
+        if story_expiry_task is None or story_expiry_task.done():
+            schedule_known_story_expiries()
+            story_expiry_task = asyncio.create_task(run_story_expiry_timer(expire_scheduled_story))
+        load_subscriptions()
+        if not check_social_posts.is_running():
+            check_social_posts.start()
+        if not snapshot_cache_loop.is_running():
+            snapshot_cache_loop.start()
+        startup_completed = True
     except Exception as e:
         logging.error(f"Error in on_ready: {e}")
         print(f"Error in on_ready: {e}")
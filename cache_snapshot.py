@@ -0,0 +1,87 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from typing import Dict, Set
+from instagram import INSTAGRAM_POST_CACHE, INSTAGRAM_STORY_CACHE, USER_SNAPSHOT_CACHE, USER_SNAPSHOT_LOCK, remember_user_snapshot
+from item_codec import decode_value, encode_value
+from media_store import prune_media_store
+from outbox import OUTBOX_MEDIA_KEYS
+
+CACHE_SNAPSHOT_FILE = "cache_snapshot.json.gz"
+CACHE_SNAPSHOT_MAX_AGE_SECONDS = 86400  # User snapshots older than this aren't restored
+CACHE_SNAPSHOT_VERSION = 2
+
+_last_snapshot = None
+
+def save_cache_snapshot(caches: Dict, outbox_media_keys: Set[str]) -> bool:
+    """Write the caches to CACHE_SNAPSHOT_FILE unless nothing changed since the last snapshot.
+
+    Stored files that neither the snapshot nor the outbox refers to are pruned.
+    """
+    global _last_snapshot
+    referenced = set()
+    data = json.dumps(encode_value(caches, referenced), separators=(",", ":"), sort_keys=True)
+    if data == _last_snapshot:
+        return False
+    with gzip.open(f"{CACHE_SNAPSHOT_FILE}.tmp", "wt") as f:
+        f.write(data)
+    os.replace(f"{CACHE_SNAPSHOT_FILE}.tmp", CACHE_SNAPSHOT_FILE)
+    _last_snapshot = data
+    prune_media_store(referenced | outbox_media_keys)
+    logging.debug(f"Saved cache snapshot, {len(data)} bytes of metadata and {len(referenced)} stored files")
+    return True
+
+def read_cache_snapshot() -> Dict:
+    """Read the last snapshot, dropping user snapshots that went stale while the bot was down.
+
+    Posts and stories past their TTL are dropped by the content caches when restored.
+    """
+    try:
+        with gzip.open(CACHE_SNAPSHOT_FILE, "rt") as f:
+            caches = decode_value(json.load(f), lazy_media=True)
+        if caches.get("version") != CACHE_SNAPSHOT_VERSION:
+            raise ValueError(f"unsupported snapshot version {caches.get('version')}")
+    except (FileNotFoundError, OSError, json.JSONDecodeError, TypeError, KeyError, ValueError) as e:
+        logging.warning(f"No valid cache snapshot found, starting with empty caches: {e}")
+        return {}
+    now = time.time()
+    caches["snapshots"] = {
+        username: snapshot for username, snapshot in caches.get("snapshots", {}).items()
+        if now - snapshot.timestamp <= CACHE_SNAPSHOT_MAX_AGE_SECONDS
+    }
+    return caches
+
+def copy_caches() -> Dict:
+    """Take a shallow copy of the caches on the event loop, for a worker thread to serialize."""
+    with USER_SNAPSHOT_LOCK:
+        snapshots = dict(USER_SNAPSHOT_CACHE)
+    return {
+        "version": CACHE_SNAPSHOT_VERSION,
+        "posts": INSTAGRAM_POST_CACHE.snapshot(),
+        "stories": INSTAGRAM_STORY_CACHE.snapshot(),
+        "snapshots": snapshots,
+    }
+
+async def snapshot_caches() -> None:
+    """Snapshot the caches to disk without blocking the event loop."""
+    try:
+        await asyncio.to_thread(save_cache_snapshot, copy_caches(), set(OUTBOX_MEDIA_KEYS))
+    except Exception as e:
+        logging.error(f"Error saving cache snapshot: {e}")
+        print(f"Error saving cache snapshot: {e}")
+
+async def restore_cache_snapshot() -> None:
+    """Warm the caches from the last snapshot; anything fetched meanwhile is kept."""
+    started = time.perf_counter()
+    caches = await asyncio.to_thread(read_cache_snapshot)
+    for cache, key in ((INSTAGRAM_POST_CACHE, "posts"), (INSTAGRAM_STORY_CACHE, "stories")):
+        for item, cached_at in caches.get(key, []):
+            if (item.username, str(item.identifier)) not in cache.entries:
+                cache.put(item, cached_at)
+    for username, snapshot in caches.get("snapshots", {}).items():
+        if username not in USER_SNAPSHOT_CACHE:
+            remember_user_snapshot(username, snapshot)
+    logging.info(f"Restored cache snapshot in {time.perf_counter() - started:.2f}s: {len(INSTAGRAM_POST_CACHE.entries)} posts, {len(INSTAGRAM_STORY_CACHE.entries)} stories, {len(caches.get('snapshots', {}))} user snapshots")
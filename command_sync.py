@@ -0,0 +1,48 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Optional
+from discord import app_commands
+
+COMMAND_SYNC_FILE = "command_sync.json"
+
+def command_tree_fingerprint(tree: app_commands.CommandTree) -> str:
+    """Hash the global command definitions exactly as they would be sent to Discord."""
+    payload = sorted((command.to_dict(tree) for command in tree.get_commands()), key=lambda command: (command.get("type", 1), command["name"]))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+def load_synced_fingerprints() -> Dict[str, str]:
+    """Load the fingerprint of the last successful sync per application id."""
+    try:
+        with open(COMMAND_SYNC_FILE, "r") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_synced_fingerprint(application_id: int, fingerprint: str) -> None:
+    fingerprints = load_synced_fingerprints()
+    fingerprints[str(application_id)] = fingerprint
+    with open(f"{COMMAND_SYNC_FILE}.tmp", "w") as f:
+        json.dump(fingerprints, f, indent=4)
+    os.replace(f"{COMMAND_SYNC_FILE}.tmp", COMMAND_SYNC_FILE)
+
+async def sync_commands_if_changed(tree: app_commands.CommandTree, application_id: Optional[int]) -> bool:
+    """Sync the slash commands only if their definition changed since the last recorded sync.
+
+    Returns whether a sync was sent. The fingerprint is only recorded once Discord accepted
+    the commands, so a failed sync is retried on the next start.
+    """
+    fingerprint = command_tree_fingerprint(tree)
+    if application_id is not None and load_synced_fingerprints().get(str(application_id)) == fingerprint:
+        logging.info(f"Slash commands unchanged since the last sync ({fingerprint[:12]}), skipping sync")
+        return False
+    await tree.sync()
+    if application_id is not None:
+        try:
+            save_synced_fingerprint(application_id, fingerprint)
+        except OSError as e:
+            logging.warning(f"Could not record the command sync, the next start will sync again: {e}")
+    logging.info(f"Slash commands synced ({fingerprint[:12]})")
+    return True
@@ -0,0 +1,117 @@
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass, field, fields
+from typing import Any, Dict, List, Optional
+from content_cache import CONTENT_CACHE_MAX_ENTRIES, CONTENT_CACHE_MEDIA_BUDGET_BYTES, CONTENT_CACHE_TTL_SECONDS
+
+CONFIG_FILE = "config.json"
+CONFIG_WATCH_INTERVAL = 10  # How often the config file's modification time is checked
+
+@dataclass(slots=True)
+class BotConfig:
+    """Settings that can be changed while the bot runs, by editing CONFIG_FILE or with /config."""
+    monitored_usernames: List[str] = field(default_factory=lambda: ["avamax"])
+    check_interval: int = 60  # Seconds between polls
+    ping_snapshot_max_age_seconds: int = 120  # /ping serves the latest poll if it is at most this old
+    cache_snapshot_interval: int = 300
+    content_cache_media_budget_bytes: int = CONTENT_CACHE_MEDIA_BUDGET_BYTES
+    content_cache_max_entries: int = CONTENT_CACHE_MAX_ENTRIES
+    content_cache_ttl_seconds: int = CONTENT_CACHE_TTL_SECONDS
+    discord_file_size_limit: int = 10 * 1024 * 1024
+    deletion_confirm_limit: int = 5  # Deleted-post candidates confirmed per user and poll
+    userdetails_ttl_seconds: int = 300  # /userdetails serves older snapshots as is and refreshes them in the background
+    user_snapshot_max_entries: int = 64  # Cached /userdetails snapshots (with profile pictures) beyond the monitored users
+    post_fetch_window: int = 3  # Posts fetched per user and poll, and per page when the window is widened
+    post_fetch_max_window: int = 24  # How far the window is widened while every fetched post is unseen
+
+# The settings in use, updated in place on reload so every module sees the change
+CONFIG = BotConfig()
+_loaded_mtime: Optional[float] = None
+
+def parse_setting(name: str, value: str) -> Any:
+    """Convert a setting typed in Discord to the type of its default."""
+    if name not in BotConfig.__slots__:
+        raise KeyError(f"Unknown setting {name}, settings: {', '.join(BotConfig.__slots__)}")
+    if isinstance(getattr(CONFIG, name), list):
+        return [part.strip().lstrip("@") for part in value.split(",") if part.strip()]
+    return int(value)
+
+def validate_config(data: Dict) -> BotConfig:
+    """Build a config from raw settings, keeping the defaults for missing ones."""
+    config = BotConfig()
+    for name, value in data.items():
+        if name not in BotConfig.__slots__:
+            logging.warning(f"Ignoring unknown setting {name} in {CONFIG_FILE}")
+            continue
+        default = getattr(config, name)
+        if isinstance(default, list):
+            if not isinstance(value, list) or not value or not all(isinstance(part, str) and part for part in value):
+                raise ValueError(f"{name} must be a non-empty list of usernames")
+        elif not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+            raise ValueError(f"{name} must be a positive integer")
+        setattr(config, name, value)
+    return config
+
+def apply_config(config: BotConfig) -> List[str]:
+    """Copy new settings into CONFIG and return the names of those that changed."""
+    changed = []
+    for setting in fields(BotConfig):
+        value = getattr(config, setting.name)
+        if getattr(CONFIG, setting.name) != value:
+            setattr(CONFIG, setting.name, value)
+            changed.append(setting.name)
+    return changed
+
+def load_config() -> List[str]:
+    """Load CONFIG_FILE into CONFIG and return the settings that changed.
+
+    A missing file means the defaults; an invalid one is logged and the current settings are kept.
+    """
+    global _loaded_mtime
+    try:
+        _loaded_mtime = os.stat(CONFIG_FILE).st_mtime
+        with open(CONFIG_FILE, "r") as f:
+            config = validate_config(json.load(f))
+    except FileNotFoundError:
+        _loaded_mtime = None
+        config = BotConfig()
+    except (json.JSONDecodeError, ValueError, AttributeError) as e:
+        logging.error(f"Invalid {CONFIG_FILE}, keeping the current settings: {e}")
+        print(f"Invalid {CONFIG_FILE}, keeping the current settings: {e}")
+        return []
+    changed = apply_config(config)
+    if changed:
+        logging.info(f"Loaded settings {changed} from {CONFIG_FILE}: {asdict(CONFIG)}")
+    return changed
+
+def reload_config_if_changed() -> List[str]:
+    """Reload CONFIG_FILE if it was modified (or removed) since it was last loaded."""
+    try:
+        mtime = os.stat(CONFIG_FILE).st_mtime
+    except FileNotFoundError:
+        mtime = None
+    if mtime == _loaded_mtime:
+        return []
+    logging.info(f"{CONFIG_FILE} changed on disk, reloading")
+    return load_config()
+
+def save_config(config: BotConfig = CONFIG) -> None:
+    """Write settings (CONFIG by default) to CONFIG_FILE, so settings changed in Discord survive a restart."""
+    global _loaded_mtime
+    with open(f"{CONFIG_FILE}.tmp", "w") as f:
+        json.dump(asdict(config), f, indent=4)
+    os.replace(f"{CONFIG_FILE}.tmp", CONFIG_FILE)
+    _loaded_mtime = os.stat(CONFIG_FILE).st_mtime
+
+def update_setting(name: str, value: Any) -> List[str]:
+    """Change one setting, validating it like the file, and persist it.
+
+    The file is written first, so a setting that can't be saved (OSError) is not applied
+    either and the watcher has nothing to undo.
+    """
+    data = asdict(CONFIG)
+    data[name] = value
+    config = validate_config(data)
+    save_config(config)
+    return apply_config(config)
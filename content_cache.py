@@ -0,0 +1,255 @@
+import asyncio
+import collections
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, OrderedDict, Tuple
+from media_store import get_media, put_media
+from records import ContentItem, MediaHandle
+
+CONTENT_CACHE_MEDIA_BUDGET_BYTES = 256 * 1024 * 1024  # Media bytes kept per content cache
+CONTENT_CACHE_MAX_ENTRIES = 1024  # Metadata entries kept per content cache
+CONTENT_CACHE_TTL_SECONDS = 86400
+
+@dataclass(slots=True)
+class CacheEntry:
+    """A cached post or story and the bookkeeping for its two tiers."""
+    item: ContentItem
+    cached_at: float
+    expires_at: float
+    media_size: int = 0
+    media_evicted: bool = False  # The media tier dropped this item's files for good, only metadata is left
+
+@dataclass(slots=True)
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    evicted_entries: int = 0
+    evicted_media: int = 0
+    evicted_bytes: int = 0
+    released: int = 0
+    reloaded: int = 0
+
+def store_media(media: List[MediaHandle]) -> None:
+    """Write files to the media store, recording their keys on the handles."""
+    for handle in media:
+        if handle.loaded:
+            handle.key = put_media(handle.data, handle.key)
+
+def read_media(media: List[MediaHandle]) -> List[Optional[bytes]]:
+    return [get_media(handle.key) for handle in media]
+
+class ContentCache:
+    """An LRU cache of fetched posts or stories with separate metadata and media tiers.
+
+    The metadata tier keeps the items themselves, bounded by an entry count and a TTL.
+    The media tier keeps their files and is bounded by a byte budget; when it is over
+    budget the least recently used items lose their media but keep their metadata.
+    Media that were written to the media store (delivered items, see release_media) are
+    only released to it rather than lost, and load_media reads them back on demand.
+    Only touched from the event loop.
+    """
+    def __init__(
+        self,
+        kind: str,
+        media_budget_bytes: int,
+        max_entries: int = CONTENT_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = CONTENT_CACHE_TTL_SECONDS,
+        expiry: Optional[Callable[[ContentItem], float]] = None
+    ):
+        self.kind = kind
+        self.media_budget_bytes = media_budget_bytes
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.expiry = expiry  # Content-specific expiry (e.g. a story's 24 hours), on top of the TTL
+        self.entries: OrderedDict[Tuple[str, str], CacheEntry] = collections.OrderedDict()
+        self.media_lru: OrderedDict[Tuple[str, str], int] = collections.OrderedDict()  # key -> media bytes held
+        self.media_bytes = 0
+        self.stats = CacheStats()
+
+    def configure(self, media_budget_bytes: int, max_entries: int, ttl_seconds: float) -> None:
+        """Change the budgets, evicting straight away if the cache is now over them."""
+        self.media_budget_bytes = media_budget_bytes
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        for entry in self.entries.values():
+            entry.expires_at = self.expires_at(entry.item, entry.cached_at)
+        self.prune()
+
+    def expires_at(self, item: ContentItem, cached_at: float) -> float:
+        expires_at = cached_at + self.ttl_seconds
+        if self.expiry is not None:
+            expires_at = min(expires_at, self.expiry(item))
+        return expires_at
+
+    def put(self, item: ContentItem, cached_at: Optional[float] = None) -> None:
+        """Cache an item (replacing any older copy) and evict whatever no longer fits."""
+        key = (item.username, str(item.identifier))
+        cached_at = time.time() if cached_at is None else cached_at
+        self.discard(key)
+        entry = self.entries[key] = CacheEntry(item, cached_at, self.expires_at(item, cached_at), sum(media.size for media in item.media if media.loaded))
+        if entry.media_size:
+            self.media_lru[key] = entry.media_size
+            self.media_bytes += entry.media_size
+        self.prune()
+
+    def discard(self, key: Tuple[str, str]) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None and self.media_lru.pop(key, None) is not None:
+            self.media_bytes -= entry.media_size
+
+    def get(self, username: str, identifier: str) -> Optional[ContentItem]:
+        """Return a cached item's metadata, or None if it isn't cached (any more)."""
+        key = (username, str(identifier))
+        entry = self.entries.get(key)
+        if entry is None or entry.expires_at <= time.time():
+            if entry is not None:
+                self.discard(key)
+                self.stats.expired += 1
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        self.touch(key)
+        return entry.item
+
+    def items_for(self, username: str, with_media: bool = True) -> List[ContentItem]:
+        """Return a user's live cached items, oldest cached first.
+
+        With with_media, items whose media were evicted are left out since they
+        can no longer be sent as they were; media released to the media store still
+        need load_media before the items are rendered.
+        """
+        self.expire()
+        entries = sorted((entry for (owner, _), entry in self.entries.items() if owner == username), key=lambda entry: entry.cached_at)
+        items = []
+        for entry in entries:
+            if with_media and entry.media_evicted:
+                continue
+            self.touch((username, str(entry.item.identifier)))
+            items.append(entry.item)
+        return items
+
+    def latest(self, username: str, with_media: bool = True) -> Optional[ContentItem]:
+        """Return the item cached most recently for a user (None if, with with_media, its media were evicted)."""
+        items = self.items_for(username, with_media=False)
+        if not items or (with_media and self.entries[(username, str(items[-1].identifier))].media_evicted):
+            return None
+        return items[-1]
+
+    def touch(self, key: Tuple[str, str]) -> None:
+        self.entries.move_to_end(key)
+        if key in self.media_lru:
+            self.media_lru.move_to_end(key)
+
+    def expire(self) -> None:
+        now = time.time()
+        for key in [key for key, entry in self.entries.items() if entry.expires_at <= now]:
+            self.discard(key)
+            self.stats.expired += 1
+
+    def drop_media(self, key: Tuple[str, str]) -> None:
+        """Evict an item's files from the media tier, keeping its metadata.
+
+        Files already in the media store stay reachable through their keys.
+        """
+        size = self.media_lru.pop(key, None)
+        if size is None:
+            return
+        entry = self.entries[key]
+        if all(media.key for media in entry.item.media):
+            entry.item.media = [MediaHandle(None, media.filename, media.key) for media in entry.item.media]
+        else:
+            entry.item.media = []
+            entry.media_evicted = True
+        entry.media_size = 0
+        self.media_bytes -= size
+        self.stats.evicted_media += 1
+        self.stats.evicted_bytes += size
+
+    async def release_media(self, item: ContentItem) -> None:
+        """Write a delivered item's files to the media store and drop them from memory."""
+        key = (item.username, str(item.identifier))
+        entry = self.entries.get(key)
+        if entry is None or entry.item is not item or key not in self.media_lru:
+            return
+        media = list(item.media)
+        try:
+            await asyncio.to_thread(store_media, media)
+        except OSError as e:
+            logging.warning(f"Could not write media of {self.kind} {item.identifier} to the media store, keeping it in memory: {e}")
+            return
+        if self.entries.get(key) is not entry or key not in self.media_lru or item.media != media:
+            return
+        size = self.media_lru.pop(key)
+        item.media = [MediaHandle(None, handle.filename, handle.key) for handle in media]
+        entry.media_size = 0
+        self.media_bytes -= size
+        self.stats.released += 1
+        logging.debug(f"Released {size} bytes of media of {self.kind} {item.identifier} to the media store")
+
+    async def load_media(self, items: List[ContentItem]) -> List[ContentItem]:
+        """Read released media back from the media store so the items can be sent again.
+
+        Returns the items that have all their media; items whose stored files are gone
+        lose their media for good and are left out.
+        """
+        loadable = []
+        for item in items:
+            key = (item.username, str(item.identifier))
+            entry = self.entries.get(key)
+            if entry is None or entry.item is not item or all(media.loaded for media in item.media):
+                loadable.append(item)
+                continue
+            stored = list(item.media)
+            data = await asyncio.to_thread(read_media, stored)
+            if item.media != stored or self.entries.get(key) is not entry:
+                if all(media.loaded for media in item.media):
+                    loadable.append(item)
+                continue
+            if any(value is None for value in data):
+                item.media = []
+                entry.media_evicted = True
+                self.stats.evicted_media += 1
+                continue
+            item.media = [MediaHandle(value, handle.filename, handle.key) for value, handle in zip(data, stored)]
+            entry.media_size = sum(media.size for media in item.media)
+            self.media_lru[key] = entry.media_size
+            self.media_bytes += entry.media_size
+            self.stats.reloaded += 1
+            loadable.append(item)
+        # No prune here: evicting what was just loaded would undo it, the next put() catches up
+        return loadable
+
+    def prune(self) -> None:
+        """Drop expired entries, then evict least recently used ones until both tiers fit."""
+        self.expire()
+        evicted_entries, evicted_media = self.stats.evicted_entries, self.stats.evicted_media
+        while len(self.entries) > self.max_entries:
+            self.discard(next(iter(self.entries)))
+            self.stats.evicted_entries += 1
+        while self.media_bytes > self.media_budget_bytes and self.media_lru:
+            self.drop_media(next(iter(self.media_lru)))
+        if self.stats.evicted_entries != evicted_entries or self.stats.evicted_media != evicted_media:
+            logging.debug(f"Evicted {self.stats.evicted_entries - evicted_entries} entries and the media of {self.stats.evicted_media - evicted_media} more from the {self.kind} cache: {self.describe()}")
+
+    def snapshot(self) -> List[Tuple[ContentItem, float]]:
+        """Return the items that still have (or can reload) their media and when they were cached, for persisting the cache."""
+        return [(entry.item, entry.cached_at) for entry in self.entries.values() if not entry.media_evicted]
+
+    def describe(self) -> Dict:
+        return {
+            "kind": self.kind,
+            "entries": len(self.entries),
+            "media_entries": len(self.media_lru),
+            "media_bytes": self.media_bytes,
+            "media_budget_bytes": self.media_budget_bytes,
+            "hits": self.stats.hits,
+            "misses": self.stats.misses,
+            "expired": self.stats.expired,
+            "evicted_entries": self.stats.evicted_entries,
+            "evicted_media": self.stats.evicted_media,
+            "evicted_bytes": self.stats.evicted_bytes,
+            "released": self.stats.released,
+            "reloaded": self.stats.reloaded,
+        }
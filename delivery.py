@@ -0,0 +1,194 @@
+import discord
+from discord import ui
+import asyncio
+import collections
+import io
+import logging
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+DISCORD_MAX_EMBEDS_PER_MESSAGE = 10
+DISCORD_MAX_FILES_PER_MESSAGE = 10
+DISCORD_MAX_BUTTONS_PER_MESSAGE = 25
+DISCORD_MAX_EMBED_CHARS_PER_MESSAGE = 6000
+DELIVERY_MAX_RETRIES = 5
+
+class OutboundItem:
+    """A piece of content waiting in a channel's delivery queue.
+
+    Files are kept as raw bytes so a send can be retried or coalesced without
+    re-reading anything from disk.
+    """
+    def __init__(
+        self,
+        identifier: str,
+        embeds: List[discord.Embed],
+        files: List[Tuple[bytes, str]],
+        buttons: List[Tuple[str, str]],
+        on_sent: Optional[Callable[[discord.Message], None]] = None,
+        on_drained: Optional[Callable[[], None]] = None
+    ):
+        self.identifier = identifier
+        self.embeds = embeds
+        self.files = files
+        self.buttons = buttons
+        self.on_sent = on_sent
+        self.on_drained = on_drained  # Called once no channel has the identifier queued or sending any more
+
+    @property
+    def embed_chars(self) -> int:
+        return sum(len(embed) for embed in self.embeds)
+
+class ChannelDelivery:
+    """Delivery queue and worker state for a single channel."""
+    def __init__(self, channel: discord.abc.Messageable, upload_limit: int):
+        self.channel = channel
+        self.upload_limit = upload_limit
+        self.pending: Deque[OutboundItem] = collections.deque()
+        self.in_flight = collections.Counter()  # identifier -> queued or sending messages for it
+        self.wakeup = asyncio.Event()
+        self.worker: Optional[asyncio.Task] = None
+
+CHANNEL_DELIVERIES: Dict[int, ChannelDelivery] = {}
+
+def enqueue_delivery(channel: discord.abc.Messageable, item: OutboundItem, upload_limit: int) -> None:
+    """Queue an item for a channel and make sure the channel's worker is running."""
+    delivery = CHANNEL_DELIVERIES.get(channel.id)
+    if delivery is None:
+        delivery = CHANNEL_DELIVERIES[channel.id] = ChannelDelivery(channel, upload_limit)
+    delivery.pending.append(item)
+    delivery.in_flight[item.identifier] += 1
+    delivery.wakeup.set()
+    if delivery.worker is None or delivery.worker.done():
+        delivery.worker = asyncio.create_task(channel_delivery_worker(delivery))
+    logging.debug(f"Queued {item.identifier} for channel {channel.id}, {len(delivery.pending)} pending")
+
+def batch_files(batch: List[OutboundItem]) -> List[Tuple[bytes, str]]:
+    """Collect the files of a batch, uploading shared files (same filename) once."""
+    files = {}
+    for item in batch:
+        for data, filename in item.files:
+            files.setdefault(filename, data)
+    return [(data, filename) for filename, data in files.items()]
+
+def plan_attachment_packing(sizes: List[int], shared_size: int, shared_count: int, upload_limit: int) -> List[List[int]]:
+    """Split files into as few messages as possible next to attachments every message repeats.
+
+    Files are filled in order into the current message until the file count or byte
+    budget left once the shared attachments are in runs out, so the messages keep the
+    slides in carousel order; with consecutive slides per message, that greedy fill needs
+    the fewest messages. Returns the file indices of each message; files too large for
+    any message are left out.
+    """
+    max_files = DISCORD_MAX_FILES_PER_MESSAGE - shared_count
+    budget = upload_limit - shared_size
+    messages: List[List[int]] = []
+    free = 0
+    for index, size in enumerate(sizes):
+        if max_files <= 0 or size > budget:
+            logging.warning(f"File {index + 1} ({size} bytes) doesn't fit in a message next to {shared_size} bytes of shared attachments, leaving it out")
+            continue
+        if not messages or len(messages[-1]) >= max_files or free < size:
+            messages.append([])
+            free = budget
+        messages[-1].append(index)
+        free -= size
+    return messages
+
+def coalesce_batch(pending: Deque[OutboundItem], upload_limit: int) -> List[OutboundItem]:
+    """Pop the next item plus any following items that still fit into the same message."""
+    batch = [pending.popleft()]
+    while pending:
+        candidate = batch + [pending[0]]
+        files = batch_files(candidate)
+        if (
+            sum(len(item.embeds) for item in candidate) > DISCORD_MAX_EMBEDS_PER_MESSAGE
+            or sum(item.embed_chars for item in candidate) > DISCORD_MAX_EMBED_CHARS_PER_MESSAGE
+            or sum(len(item.buttons) for item in candidate) > DISCORD_MAX_BUTTONS_PER_MESSAGE
+            or len(files) > DISCORD_MAX_FILES_PER_MESSAGE
+            or sum(len(data) for data, _ in files) > upload_limit
+        ):
+            break
+        batch.append(pending.popleft())
+    return batch
+
+def retry_after_seconds(error: discord.HTTPException) -> float:
+    """Read how long Discord asked us to wait from a rate-limited response."""
+    headers = getattr(error.response, "headers", None) or {}
+    for header in ("Retry-After", "X-RateLimit-Reset-After"):
+        try:
+            return max(float(headers[header]), 0.0)
+        except (KeyError, TypeError, ValueError):
+            continue
+    return 1.0
+
+async def send_batch(channel: discord.abc.Messageable, batch: List[OutboundItem]) -> discord.Message:
+    """Send a batch as one message, waiting out any rate limit Discord reports."""
+    embeds = [embed for item in batch for embed in item.embeds]
+    view = ui.View(timeout=None)
+    for item in batch:
+        for label, url in item.buttons:
+            view.add_item(ui.Button(label=label, url=url, style=discord.ButtonStyle.link))
+    for attempt in range(DELIVERY_MAX_RETRIES):
+        files = [discord.File(io.BytesIO(data), filename=filename) for data, filename in batch_files(batch)]
+        try:
+            return await channel.send(content="", embeds=embeds, files=files, view=view)
+        except discord.RateLimited as e:
+            retry_after = e.retry_after
+        except discord.HTTPException as e:
+            if e.status != 429 or attempt == DELIVERY_MAX_RETRIES - 1:
+                raise
+            retry_after = retry_after_seconds(e)
+        logging.warning(f"Rate limited sending to channel {channel.id}, retrying in {retry_after:.2f}s (attempt {attempt + 1}/{DELIVERY_MAX_RETRIES})")
+        await asyncio.sleep(retry_after)
+    raise discord.DiscordException(f"Exhausted retries sending to channel {channel.id}")
+
+async def deliver_batch(channel: discord.abc.Messageable, batch: List[OutboundItem]) -> None:
+    """Send a batch and record the delivery of each item, splitting it up if the send fails."""
+    identifiers = [item.identifier for item in batch]
+    try:
+        message = await send_batch(channel, batch)
+    except discord.DiscordException as e:
+        logging.error(f"Failed to send message for {identifiers}: {e}")
+        print(f"Failed to send message for {identifiers}: {e}")
+        if len(batch) > 1:
+            # Retry one by one so a single bad item doesn't take the rest of the batch down
+            for item in batch:
+                await deliver_batch(channel, [item])
+        return
+    logging.info(f"Successfully sent message with {len(batch_files(batch))} files and {sum(len(item.embeds) for item in batch)} embeds for {identifiers}")
+    for item in batch:
+        if item.on_sent:
+            try:
+                item.on_sent(message)
+            except Exception as e:
+                logging.error(f"Error recording delivery of {item.identifier}: {e}")
+
+async def channel_delivery_worker(delivery: ChannelDelivery) -> None:
+    """Drain a channel's queue, coalescing consecutive items into as few messages as possible."""
+    while True:
+        if not delivery.pending:
+            delivery.wakeup.clear()
+            await delivery.wakeup.wait()
+            continue
+        batch = coalesce_batch(delivery.pending, delivery.upload_limit)
+        try:
+            await deliver_batch(delivery.channel, batch)
+        finally:
+            for item in batch:
+                delivery.in_flight[item.identifier] -= 1
+                if delivery.in_flight[item.identifier] <= 0:
+                    del delivery.in_flight[item.identifier]
+                    if item.on_drained and not is_delivery_pending_anywhere(item.identifier):
+                        try:
+                            item.on_drained()
+                        except Exception as e:
+                            logging.error(f"Error finishing delivery of {item.identifier}: {e}")
+
+def is_delivery_pending(channel_id: int, identifier: str) -> bool:
+    """Check whether an item is still queued or being sent to a channel."""
+    delivery = CHANNEL_DELIVERIES.get(channel_id)
+    return delivery is not None and identifier in delivery.in_flight
+
+def is_delivery_pending_anywhere(identifier: str) -> bool:
+    """Check whether an item is still queued or being sent to any channel."""
+    return any(identifier in delivery.in_flight for delivery in CHANNEL_DELIVERIES.values())
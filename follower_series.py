@@ -0,0 +1,111 @@
+import logging
+import math
+import os
+import struct
+import threading
+import time
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+FOLLOWER_SERIES_FILE = "follower_series_{}.bin"
+FOLLOWER_RECORD = struct.Struct("<qq")  # unix seconds, follower count
+FOLLOWER_SAMPLE_MIN_INTERVAL = 600  # An unchanged count is recorded at most this often
+FOLLOWER_DELTA_WINDOWS = {"1h": 3600, "24h": 86400, "7d": 7 * 86400}
+
+SERIES_LOCK = threading.Lock()
+
+def read_follower_record(f: BinaryIO, index: int) -> Tuple[int, int]:
+    """Read the record at a given index of an open series file."""
+    f.seek(index * FOLLOWER_RECORD.size)
+    return FOLLOWER_RECORD.unpack(f.read(FOLLOWER_RECORD.size))
+
+def follower_record_count(f: BinaryIO) -> int:
+    """Return the number of complete records in an open series file."""
+    return os.fstat(f.fileno()).st_size // FOLLOWER_RECORD.size
+
+def bisect_follower_records(f: BinaryIO, timestamp: int, count: int) -> int:
+    """Return the index of the first record taken after timestamp."""
+    lo, hi = 0, count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if read_follower_record(f, mid)[0] <= timestamp:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+def append_follower_sample(username: str, follower_count: int, timestamp: Optional[int] = None) -> None:
+    """Append a follower count sample, skipping it if nothing changed since a recent sample.
+
+    Samples not newer than the last record are skipped too, the series must stay sorted.
+    """
+    timestamp = int(timestamp if timestamp is not None else time.time())
+    file = FOLLOWER_SERIES_FILE.format(username)
+    try:
+        with SERIES_LOCK, open(file, "ab+") as f:
+            count = follower_record_count(f)
+            if count:
+                last_timestamp, last_count = read_follower_record(f, count - 1)
+                if timestamp <= last_timestamp:
+                    logging.debug(f"Skipping follower sample for {username} at {timestamp}, the series already has one at {last_timestamp}")
+                    return
+                if last_count == follower_count and timestamp - last_timestamp < FOLLOWER_SAMPLE_MIN_INTERVAL:
+                    return
+            # Drop a torn trailing record left by an interrupted write
+            f.truncate(count * FOLLOWER_RECORD.size)
+            f.seek(0, os.SEEK_END)
+            f.write(FOLLOWER_RECORD.pack(timestamp, follower_count))
+        logging.debug(f"Recorded follower sample for {username}: {follower_count} at {timestamp}")
+    except Exception as e:
+        logging.error(f"Error recording follower sample for {username}: {e}")
+        print(f"Error recording follower sample for {username}: {e}")
+
+def follower_sample_at(username: str, timestamp: int) -> Optional[Tuple[int, int]]:
+    """Return the latest sample taken at or before timestamp."""
+    try:
+        with open(FOLLOWER_SERIES_FILE.format(username), "rb") as f:
+            index = bisect_follower_records(f, timestamp, follower_record_count(f))
+            return read_follower_record(f, index - 1) if index else None
+    except FileNotFoundError:
+        return None
+
+def follower_series_range(username: str, start: int, end: int, max_points: int = 100) -> List[Tuple[int, int]]:
+    """Return samples between start and end, evenly downsampled to at most max_points.
+
+    Only the selected records are read from disk, so the cost does not grow with the
+    length of the series.
+    """
+    try:
+        with open(FOLLOWER_SERIES_FILE.format(username), "rb") as f:
+            count = follower_record_count(f)
+            lo = bisect_follower_records(f, start - 1, count)
+            hi = bisect_follower_records(f, end, count)
+            if hi <= lo:
+                return []
+            step = max(1, math.ceil((hi - lo) / max_points))
+            samples = [read_follower_record(f, index) for index in range(lo, hi, step)]
+            if (hi - 1 - lo) % step:
+                samples.append(read_follower_record(f, hi - 1))
+            return samples
+    except FileNotFoundError:
+        return []
+
+def follower_baseline(username: str, timestamp: int, window: int = FOLLOWER_DELTA_WINDOWS["24h"]) -> Optional[Tuple[int, int]]:
+    """Return the sample to compare a count taken at timestamp against.
+
+    That is the sample from window seconds earlier, or the oldest one while the series is shorter.
+    """
+    sample = follower_sample_at(username, timestamp - window)
+    if sample is None:
+        samples = follower_series_range(username, 0, timestamp - 1, max_points=1)
+        sample = samples[0] if samples else None
+    return sample
+
+def follower_deltas(username: str, now: Optional[int] = None) -> Tuple[Optional[Tuple[int, int]], Dict[str, Optional[int]]]:
+    """Return the latest sample and the follower change over each of FOLLOWER_DELTA_WINDOWS."""
+    now = int(now if now is not None else time.time())
+    latest = follower_sample_at(username, now)
+    deltas = {}
+    for label, seconds in FOLLOWER_DELTA_WINDOWS.items():
+        past = follower_sample_at(username, now - seconds)
+        deltas[label] = latest[1] - past[1] if latest and past else None
+    return latest, deltas
@@ -1,75 +1,121 @@
 import discord
 from discord import app_commands, ui
 import instagrapi
+from instagrapi.exceptions import MediaNotFound
 import os
 import time
 import logging
 import requests
 import io
 import json
-import itertools
+import asyncio
+import collections
+import threading
 from dotenv import load_dotenv
-from typing import Optional, Tuple, List, Dict
+try:
+    import fcntl
+except ImportError:  # Windows: history files are only locked within the process
+    fcntl = None
+from typing import Optional, OrderedDict, Tuple, List, Dict, Callable, Awaitable
 from datetime import datetime, timezone, UTC
+from story_expiry import STORY_EXPIRATION_HOURS, schedule_story_expiry
+from follower_series import append_follower_sample, follower_baseline
+from render import INSTAGRAM_EMBED_COLOR
+from sessions import configure_sessions, get_next_client, report_client_error, wait_for_sessions
+from records import ContentItem, History, MediaHandle, PostItem, PostRecord, StoryItem, StoryRecord, UserSnapshot
+from content_cache import ContentCache
+from config import CONFIG
 
 logging.basicConfig(filename="bot.log", level=logging.DEBUG, format="%(asctime)s:%(levelname)s:%(message)s")
 
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '.env'))
+# Which numbered INSTAGRAM_USERNAME_n/INSTAGRAM_PASSWORD_n accounts this process uses, so pollers can have their own
+INSTAGRAM_ACCOUNT_NUMBERS = [int(number) for number in os.getenv("INSTAGRAM_ACCOUNT_NUMBERS", "1,2,3").split(",") if number.strip()]
 INSTAGRAM_ACCOUNTS = [
-    {"username": os.getenv("INSTAGRAM_USERNAME_1"), "password": os.getenv("INSTAGRAM_PASSWORD_1"), "session_file": "ig_session_1.json"},
-    {"username": os.getenv("INSTAGRAM_USERNAME_2"), "password": os.getenv("INSTAGRAM_PASSWORD_2"), "session_file": "ig_session_2.json"},
-    {"username": os.getenv("INSTAGRAM_USERNAME_3"), "password": os.getenv("INSTAGRAM_PASSWORD_3"), "session_file": "ig_session_3.json"},
+    {"username": os.getenv(f"INSTAGRAM_USERNAME_{number}"), "password": os.getenv(f"INSTAGRAM_PASSWORD_{number}"), "session_file": f"ig_session_{number}.json"}
+    for number in INSTAGRAM_ACCOUNT_NUMBERS
 ]
 
 INSTAGRAM_ACCOUNTS = [acc for acc in INSTAGRAM_ACCOUNTS if acc["username"] and acc["password"]]
 if not INSTAGRAM_ACCOUNTS:
     logging.error("No valid Instagram accounts provided in .env")
     raise ValueError("No valid Instagram accounts provided in .env")
-
-INSTAGRAM_POST_CACHE = {}
-INSTAGRAM_STORY_CACHE = {}
-CACHE_VALIDITY_SECONDS = 300
-INSTAGRAM_USERNAMES_TO_MONITOR = ["avamax"]
+configure_sessions(INSTAGRAM_ACCOUNTS)
+
+INSTAGRAM_POST_CACHE = ContentCache("post", CONFIG.content_cache_media_budget_bytes, CONFIG.content_cache_max_entries, CONFIG.content_cache_ttl_seconds)
+INSTAGRAM_STORY_CACHE = ContentCache("story", CONFIG.content_cache_media_budget_bytes, CONFIG.content_cache_max_entries, CONFIG.content_cache_ttl_seconds, expiry=lambda story: story.timestamp + STORY_EXPIRATION_HOURS * 3600)
+LAST_FETCHED_STORY_IDS = {}  # username -> (fetched_at, story ids returned by the latest poll)
+INFLIGHT_REQUESTS: Dict[Tuple[str, str], asyncio.Future] = {}
+USER_SNAPSHOT_CACHE: OrderedDict[str, UserSnapshot] = collections.OrderedDict()  # least recently stored first
+USER_SNAPSHOT_LOCK = threading.Lock()  # Snapshots are stored from fetch threads and the event loop
+BACKGROUND_TASKS = set()
+HISTORY_LOCK_FILE = "history.lock"
 LAST_IG_POST_FILE = "last_ig_post_shortcode_{}.json"
 LAST_IG_STORY_FILE = "last_ig_story_{}.json"
-LAST_FOLLOWER_COUNT_FILE = "last_follower_count_{}.txt"
-DISCORD_FILE_SIZE_LIMIT = 8 * 1024 * 1024  
-
-ig_clients = []
-current_client_index = itertools.cycle(range(len(INSTAGRAM_ACCOUNTS)))
-
-def get_next_client() -> Tuple[instagrapi.Client, str]:
-    """Get the next Instagram client in the rotation."""
-    index = next(current_client_index)
-    return ig_clients[index], INSTAGRAM_ACCOUNTS[index]["username"]
-
-def initialize_instagram_clients() -> None:
-    """Initialize Instagram clients for each account."""
-    for account in INSTAGRAM_ACCOUNTS:
-        username = account["username"]
-        password = account["password"]
-        session_file = account["session_file"]
-        try:
-            client = instagrapi.Client()
-            if os.path.exists(session_file):
-                client.load_settings(session_file)
-                logging.info(f"Loaded Instagram session for {username} from {session_file}")
-            else:
-                client.login(username, password)
-                with open(session_file, 'w') as f:
-                    json.dump(client.get_settings(), f)
-                logging.info(f"Saved Instagram session for {username} to {session_file}")
-            ig_clients.append(client)
-        except Exception as e:
-            logging.error(f"Instagram authentication failed for {username}: {e}")
-            print(f"Instagram authentication failed for {username}: {e}")
-
-initialize_instagram_clients()
-if not ig_clients:
-    logging.error("No Instagram clients initialized successfully")
-    raise ValueError("No Instagram clients initialized successfully")
 
-def load_last_ig_post_shortcode(username: str) -> Dict:
+class HistoryLock:
+    """Serializes history file updates between fetch threads and the event loop, and
+    between processes when the poller runs separately.
+
+    Re-entrant like an RLock; the file lock is taken by the outermost holder only.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.RLock()
+        self.depth = 0
+        self.file = None
+
+    def __enter__(self):
+        self.lock.acquire()
+        self.depth += 1
+        if self.depth == 1 and fcntl is not None:
+            try:
+                self.file = open(self.path, "a")
+                fcntl.flock(self.file, fcntl.LOCK_EX)
+            except OSError as e:
+                logging.warning(f"Could not lock {self.path}, only locking within this process: {e}")
+                self.file = None
+        return self
+
+    def __exit__(self, *exc_info):
+        self.depth -= 1
+        if self.depth == 0 and self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+        self.lock.release()
+
+HISTORY_LOCK = HistoryLock(HISTORY_LOCK_FILE)
+
+def to_epoch(value) -> Optional[int]:
+    """Convert a stored timestamp (epoch seconds or a legacy "%Y-%m-%d %H:%M:%S UTC" string) to epoch seconds."""
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value)
+    try:
+        return int(datetime.strptime(value, "%Y-%m-%d %H:%M:%S UTC").replace(tzinfo=timezone.utc).timestamp())
+    except (TypeError, ValueError):
+        logging.warning(f"Unparseable stored timestamp {value!r}, treating as unknown")
+        return 0
+
+def migrate_history_timestamps(history: Dict, entries_key: str, latest_key: str, event_key: str) -> bool:
+    """Rewrite legacy string timestamps in a history to epoch seconds, returning whether anything changed."""
+    changed = False
+    for record in history.get(entries_key, []) + [history.get(latest_key, {})]:
+        for key in ("timestamp", event_key):
+            if isinstance(record.get(key), str):
+                record[key] = to_epoch(record[key])
+                changed = True
+    return changed
+
+def write_history_file(file: str, history: Dict) -> None:
+    """Atomically write a history file."""
+    with open(f"{file}.tmp", "w") as f:
+        json.dump(history, f, indent=4)
+    os.replace(f"{file}.tmp", file)
+
+def load_last_ig_post_shortcode(username: str) -> History:
     """Load the last Instagram post shortcode history for a user."""
     file = LAST_IG_POST_FILE.format(username)
     try:
@@ -77,69 +123,64 @@ def load_last_ig_post_shortcode(username: str) -> Dict:
             data = json.load(f)
             if not isinstance(data, dict) or "posts" not in data:
                 data = {"latest_post": {}, "posts": []}
-            logging.debug(f"Loaded Instagram post shortcode history for {username}: {data}")
-            return data
-    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            if migrate_history_timestamps(data, "posts", "latest_post", "deleted_at"):
+                with HISTORY_LOCK:
+                    write_history_file(file, data)
+                logging.info(f"Migrated Instagram post shortcode history for {username} to epoch timestamps")
+            history = History.from_dict(data, "posts", "latest_post", PostRecord)
+            logging.debug(f"Loaded Instagram post shortcode history for {username}: {len(history.entries)} posts, latest: {history.latest_id}")
+            return history
+    except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError):
         logging.warning(f"No valid Instagram post shortcode history found for {username}, starting fresh")
-        return {"latest_post": {}, "posts": []}
+        return History()
 
 def save_last_ig_post_shortcode(
     username: str,
     shortcode: str,
-    timestamp: Optional[str],
+    timestamp: Optional[int],
     channel_id: Optional[int] = None,
     message_id: Optional[int] = None,
     marked_deleted: bool = False,
-    deleted_at: Optional[str] = None,
+    deleted_at: Optional[int] = None,
     like_count: Optional[int] = None,
-    comment_count: Optional[int] = None
+    comment_count: Optional[int] = None,
+    notice_applied: bool = False
 ) -> None:
-    """Save the Instagram post shortcode history for a user."""
-    file = LAST_IG_POST_FILE.format(username)
-    history = load_last_ig_post_shortcode(username)
-    posts = history.get("posts", [])
-    for entry in posts:
-        if entry["shortcode"] == str(shortcode):
-            if channel_id and str(channel_id) not in entry["channel_ids"]:
-                entry["channel_ids"].append(str(channel_id))
-                if message_id:
-                    entry["message_ids"][str(channel_id)] = str(message_id)
-            entry["marked_deleted"] = marked_deleted
-            if deleted_at:
-                entry["deleted_at"] = deleted_at
-            if like_count is not None:
-                entry["like_count"] = like_count
-            if comment_count is not None:
-                entry["comment_count"] = comment_count
-            break
-    else:
-        new_entry = {
-            "shortcode": str(shortcode),
-            "channel_ids": [str(channel_id)] if channel_id else [],
-            "message_ids": {str(channel_id): str(message_id)} if channel_id and message_id else {},
-            "timestamp": timestamp or "1970-01-01 00:00:00 UTC",
-            "marked_deleted": marked_deleted,
-            "deleted_at": deleted_at if deleted_at else None,
-            "like_count": like_count if like_count is not None else None,
-            "comment_count": comment_count if comment_count is not None else None
-        }
-        posts.append(new_entry)
-    latest_post = history.get("latest_post", {})
-    if not latest_post or (timestamp and timestamp > latest_post.get("timestamp", "1970-01-01 00:00:00 UTC")):
-        history["latest_post"] = {
-            "shortcode": str(shortcode),
-            "timestamp": timestamp or "1970-01-01 00:00:00 UTC"
-        }
-    history["posts"] = posts
-    try:
-        with open(file, "w") as f:
-            json.dump(history, f, indent=4)
-        logging.debug(f"Saved Instagram post shortcode history for {username}: {history}")
-    except Exception as e:
-        logging.error(f"Error saving Instagram post shortcode history for {username}: {e}")
-        print(f"Error saving Instagram post shortcode history for {username}: {e}")
+    """Save the Instagram post shortcode history for a user.
+
+    With notice_applied, records that the deletion notice is already on the message in
+    channel_id so it is never fetched again.
+    """
+    with HISTORY_LOCK:
+        file = LAST_IG_POST_FILE.format(username)
+        history = load_last_ig_post_shortcode(username)
+        entry = history.entries.get(str(shortcode))
+        if entry is None:
+            entry = history.entries[str(shortcode)] = PostRecord(shortcode=str(shortcode), timestamp=timestamp or 0)
+        if channel_id and str(channel_id) not in entry.channel_ids:
+            entry.channel_ids.append(str(channel_id))
+            if message_id:
+                entry.message_ids[str(channel_id)] = str(message_id)
+        entry.marked_deleted = marked_deleted
+        if deleted_at:
+            entry.deleted_at = deleted_at
+        if notice_applied and channel_id and str(channel_id) not in entry.notices_applied:
+            entry.notices_applied.append(str(channel_id))
+        if like_count is not None:
+            entry.like_count = like_count
+        if comment_count is not None:
+            entry.comment_count = comment_count
+        if history.latest_id is None or (timestamp and timestamp > history.latest_timestamp):
+            history.latest_id = str(shortcode)
+            history.latest_timestamp = timestamp or 0
+        try:
+            write_history_file(file, history.to_dict("posts", "latest_post", PostRecord))
+            logging.debug(f"Saved Instagram post shortcode history for {username}: {entry}")
+        except Exception as e:
+            logging.error(f"Error saving Instagram post shortcode history for {username}: {e}")
+            print(f"Error saving Instagram post shortcode history for {username}: {e}")
 
-def load_last_ig_story(username: str) -> Dict:
+def load_last_ig_story(username: str) -> History:
     """Load the last Instagram story history for a user."""
     file = LAST_IG_STORY_FILE.format(username)
     try:
@@ -147,99 +188,117 @@ def load_last_ig_story(username: str) -> Dict:
             data = json.load(f)
             if not isinstance(data, dict) or "stories" not in data:
                 data = {"latest_story": {}, "stories": []}
-            logging.debug(f"Loaded Instagram story history for {username}: {data}")
-            return data
-    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            if migrate_history_timestamps(data, "stories", "latest_story", "expired_at"):
+                with HISTORY_LOCK:
+                    write_history_file(file, data)
+                logging.info(f"Migrated Instagram story history for {username} to epoch timestamps")
+            history = History.from_dict(data, "stories", "latest_story", StoryRecord)
+            logging.debug(f"Loaded Instagram story history for {username}: {len(history.entries)} stories, latest: {history.latest_id}")
+            return history
+    except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError):
         logging.warning(f"No valid Instagram story history found for {username}, starting fresh")
-        return {"latest_story": {}, "stories": []}
+        return History()
 
 def save_last_ig_story(
     username: str,
     story_id: str,
-    timestamp: Optional[str],
+    timestamp: Optional[int],
     channel_id: Optional[int] = None,
     message_id: Optional[int] = None,
     expired: bool = False,
-    expired_at: Optional[str] = None
+    expired_at: Optional[int] = None,
+    notice_applied: bool = False
 ) -> None:
-    """Save the Instagram story history for a user."""
-    file = LAST_IG_STORY_FILE.format(username)
-    history = load_last_ig_story(username)
-    stories = history.get("stories", [])
-    for entry in stories:
-        if entry["story_id"] == str(story_id):
-            if channel_id and str(channel_id) not in entry["channel_ids"]:
-                entry["channel_ids"].append(str(channel_id))
-                if message_id:
-                    entry["message_ids"][str(channel_id)] = str(message_id)
-            entry["expired"] = expired
-            if expired_at:
-                entry["expired_at"] = expired_at
-            break
-    else:
-        new_entry = {
-            "story_id": str(story_id),
-            "channel_ids": [str(channel_id)] if channel_id else [],
-            "message_ids": {str(channel_id): str(message_id)} if channel_id and message_id else {},
-            "timestamp": timestamp or "1970-01-01 00:00:00 UTC",
-            "expired": expired,
-            "expired_at": expired_at if expired_at else None
-        }
-        stories.append(new_entry)
-    latest_story = history.get("latest_story", {})
-    if not latest_story or (timestamp and timestamp > latest_story.get("timestamp", "1970-01-01 00:00:00 UTC")):
-        history["latest_story"] = {
-            "story_id": str(story_id),
-            "timestamp": timestamp or "1970-01-01 00:00:00 UTC"
-        }
-    history["stories"] = stories
-    try:
-        with open(file, "w") as f:
-            json.dump(history, f, indent=4)
-        logging.debug(f"Saved Instagram story history for {username}: {history}")
-    except Exception as e:
-        logging.error(f"Error saving Instagram story history for {username}: {e}")
-        print(f"Error saving Instagram story history for {username}: {e}")
+    """Save the Instagram story history for a user.
+
+    With notice_applied, records that the expiry notice is already on the message in
+    channel_id so it is never fetched again.
+    """
+    with HISTORY_LOCK:
+        file = LAST_IG_STORY_FILE.format(username)
+        history = load_last_ig_story(username)
+        entry = history.entries.get(str(story_id))
+        if entry is None:
+            entry = history.entries[str(story_id)] = StoryRecord(story_id=str(story_id), timestamp=timestamp or 0)
+        if channel_id and str(channel_id) not in entry.channel_ids:
+            entry.channel_ids.append(str(channel_id))
+            if message_id:
+                entry.message_ids[str(channel_id)] = str(message_id)
+        entry.expired = expired
+        if expired_at:
+            entry.expired_at = expired_at
+        if notice_applied and channel_id and str(channel_id) not in entry.notices_applied:
+            entry.notices_applied.append(str(channel_id))
+        if history.latest_id is None or (timestamp and timestamp > history.latest_timestamp):
+            history.latest_id = str(story_id)
+            history.latest_timestamp = timestamp or 0
+        try:
+            write_history_file(file, history.to_dict("stories", "latest_story", StoryRecord))
+            logging.debug(f"Saved Instagram story history for {username}: {entry}")
+        except Exception as e:
+            logging.error(f"Error saving Instagram story history for {username}: {e}")
+            print(f"Error saving Instagram story history for {username}: {e}")
 
-def load_last_follower_count(username: str) -> Optional[int]:
-    """Load the last follower count for a user."""
-    file = LAST_FOLLOWER_COUNT_FILE.format(username)
+def confirm_post_deleted(ig_client: instagrapi.Client, shortcode: str) -> bool:
+    """Confirm with a targeted media lookup that a post no longer exists."""
     try:
-        with open(file, "r") as f:
-            count = int(f.read().strip())
-            logging.debug(f"Loaded last follower count for {username}: {count}")
-            return count
-    except (FileNotFoundError, ValueError):
-        logging.warning(f"No valid last follower count found for {username}, starting fresh")
-        return None
-
-def save_last_follower_count(username: str, count: int) -> None:
-    """Save the last follower count for a user."""
-    file = LAST_FOLLOWER_COUNT_FILE.format(username)
-    try:
-        with open(file, "w") as f:
-            f.write(str(count))
-        logging.debug(f"Saved last follower count for {username}: {count}")
+        ig_client.media_info(ig_client.media_pk_from_code(shortcode), use_cache=False)
+        logging.debug(f"Post {shortcode} still exists, not marking as deleted")
+        return False
+    except MediaNotFound:
+        return True
     except Exception as e:
-        logging.error(f"Error saving follower count for {username}: {e}")
-        print(f"Error saving follower count for {username}: {e}")
+        logging.warning(f"Could not confirm deletion of post {shortcode}, will retry next cycle: {e}")
+        return False
 
-def download_profile_picture(user, username: str, retries: int = 3) -> Tuple[Optional[io.BytesIO], Optional[str], str]:
+def find_deleted_posts(
+    ig_client: instagrapi.Client,
+    username: str,
+    history_posts: List[PostRecord],
+    window_posts: List,
+    fetched_shortcodes: List[str]
+) -> List[PostRecord]:
+    """Find posted history entries that vanished from inside the fetched time window.
+
+    Only posts newer than the oldest fetched non-pinned post are considered, since
+    anything older simply fell out of the window; an empty window (no recent posts, or an
+    empty answer) checks nothing. Each candidate is confirmed with a targeted lookup
+    before it is reported.
+    """
+    taken_at = [int(post.taken_at.timestamp()) for post in window_posts if post.taken_at]
+    if not taken_at:
+        logging.debug(f"No dated posts in the fetched window for @{username}, skipping deletion checks")
+        return []
+    window_start = min(taken_at)
+    candidates = [
+        entry for entry in history_posts
+        if entry.shortcode not in fetched_shortcodes
+        and not entry.marked_deleted
+        and entry.timestamp > window_start
+        and entry.message_ids
+    ]
+    if len(candidates) > CONFIG.deletion_confirm_limit:
+        logging.debug(f"Limiting deletion checks for @{username} to {CONFIG.deletion_confirm_limit} of {len(candidates)} candidates this cycle")
+        candidates = sorted(candidates, key=lambda entry: entry.timestamp, reverse=True)[:CONFIG.deletion_confirm_limit]
+    logging.debug(f"Deletion candidates for @{username} inside window starting {window_start}: {[entry.shortcode for entry in candidates]}")
+    return [entry for entry in candidates if confirm_post_deleted(ig_client, entry.shortcode)]
+
+def download_profile_picture(user, username: str, retries: int = 3) -> Tuple[Optional[MediaHandle], str]:
     """Download the profile picture for a user."""
     profile_pic_url = str(getattr(user, 'profile_pic_url_hd', user.profile_pic_url))
     for attempt in range(retries):
         try:
-            ig_client, ig_username = get_next_client()
-            logging.debug(f"Attempting to download profile picture for {username} using {ig_username} (attempt {attempt + 1}/{retries})")
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
-            cookies = ig_client.get_settings().get('cookies', {})
-            response = requests.get(profile_pic_url, headers=headers, cookies=cookies)
-            response.raise_for_status()
-            filename = f"profile_{username}.jpg"
-            logging.info(f"Successfully downloaded profile picture for {username}: {filename}")
-            return io.BytesIO(response.content), filename, profile_pic_url
+            with get_next_client() as (ig_client, ig_username):
+                logging.debug(f"Attempting to download profile picture for {username} using {ig_username} (attempt {attempt + 1}/{retries})")
+                headers = {
+                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+                }
+                cookies = ig_client.get_settings().get('cookies', {})
+                response = requests.get(profile_pic_url, headers=headers, cookies=cookies)
+                response.raise_for_status()
+                filename = f"profile_{username}.jpg"
+                logging.info(f"Successfully downloaded profile picture for {username}: {filename}")
+                return MediaHandle(response.content, filename), profile_pic_url
         except Exception as e:
             logging.error(f"Error downloading profile picture for {username} (attempt {attempt + 1}): {e}")
             print(f"Error downloading profile picture for {username} (attempt {attempt + 1}): {e}")
@@ -247,158 +306,156 @@ def download_profile_picture(user, username: str, retries: int = 3) -> Tuple[Opt
                 time.sleep(2 ** attempt * 10)
                 continue
             logging.warning(f"Exhausted retries for profile picture download for {username}")
-            return None, None, profile_pic_url
-    return None, None, profile_pic_url
+            return None, profile_pic_url
+    return None, profile_pic_url
 
-def download_instagram_media(post_url: str, media, retries: int = 5) -> Tuple[List[Tuple[io.BytesIO, str]], List[str]]:
+def download_instagram_media(post_url: str, media, retries: int = 5) -> List[MediaHandle]:
     """Download media for an Instagram post or story."""
     media_items = []
     for attempt in range(retries):
         try:
-            ig_client, username = get_next_client()
-            logging.debug(f"Attempting instagrapi media fetch for {post_url} using {username} (attempt {attempt + 1}/{retries}, media_type: {media.media_type})")
-            if media.media_type == 8:  # Carousel (for posts)
-                media_info = ig_client.media_info(media.pk)
-                logging.debug(f"Media info structure: {vars(media_info)}")
-                resources = getattr(media_info, 'resources', getattr(media_info, 'carousel_media', []))
-                if not resources:
-                    logging.warning(f"No resources or carousel_media found for carousel post {post_url} (attempt {attempt + 1})")
-                    return [], []
-                logging.debug(f"Found {len(resources)} resources for {post_url}")
-                for idx, resource in enumerate(resources):
-                    try:
-                        logging.debug(f"Resource {idx+1} details: {vars(resource)}")
-                        media_url = None
-                        extension = None
-                        if resource.media_type == 1:
-                            if hasattr(resource, 'image_versions2') and resource.image_versions2 and resource.image_versions2.get('candidates'):
-                                media_url = str(resource.image_versions2['candidates'][0]['url'])
-                                extension = '.jpg'
-                            elif hasattr(resource, 'thumbnail_url') and resource.thumbnail_url:
-                                media_url = str(resource.thumbnail_url)
-                                extension = '.jpg'
-                            else:
-                                resource_info = ig_client.media_info(resource.pk)
-                                logging.debug(f"Resource {idx+1} re-fetched info: {vars(resource_info)}")
-                                if hasattr(resource_info, 'image_versions2') and resource_info.image_versions2 and resource_info.image_versions2.get('candidates'):
-                                    media_url = str(resource_info.image_versions2['candidates'][0]['url'])
+            with get_next_client() as (ig_client, username):
+                logging.debug(f"Attempting instagrapi media fetch for {post_url} using {username} (attempt {attempt + 1}/{retries}, media_type: {media.media_type})")
+                if media.media_type == 8:  # Carousel (for posts)
+                    media_info = ig_client.media_info(media.pk)
+                    logging.debug(f"Media info structure: {vars(media_info)}")
+                    resources = getattr(media_info, 'resources', getattr(media_info, 'carousel_media', []))
+                    if not resources:
+                        logging.warning(f"No resources or carousel_media found for carousel post {post_url} (attempt {attempt + 1})")
+                        return []
+                    logging.debug(f"Found {len(resources)} resources for {post_url}")
+                    for idx, resource in enumerate(resources):
+                        try:
+                            logging.debug(f"Resource {idx+1} details: {vars(resource)}")
+                            media_url = None
+                            extension = None
+                            if resource.media_type == 1:
+                                if hasattr(resource, 'image_versions2') and resource.image_versions2 and resource.image_versions2.get('candidates'):
+                                    media_url = str(resource.image_versions2['candidates'][0]['url'])
                                     extension = '.jpg'
-                                elif hasattr(resource_info, 'thumbnail_url') and resource_info.thumbnail_url:
-                                    media_url = str(resource_info.thumbnail_url)
+                                elif hasattr(resource, 'thumbnail_url') and resource.thumbnail_url:
+                                    media_url = str(resource.thumbnail_url)
                                     extension = '.jpg'
                                 else:
-                                    logging.warning(f"Skipping resource {idx+1} in {post_url}: No valid image URL (media_type: 1)")
-                                    continue
-                        elif resource.media_type == 2:
-                            if hasattr(resource, 'video_versions') and resource.video_versions:
-                                media_url = str(resource.video_versions[0].url)
-                                extension = '.mp4'
-                            elif hasattr(resource, 'video_url') and resource.video_url:
-                                media_url = str(resource.video_url)
-                                extension = '.mp4'
-                            else:
-                                resource_info = ig_client.media_info(resource.pk)
-                                logging.debug(f"Resource {idx+1} re-fetched info: {vars(resource_info)}")
-                                if hasattr(resource_info, 'video_versions') and resource_info.video_versions:
-                                    media_url = str(resource_info.video_versions[0].url)
+                                    resource_info = ig_client.media_info(resource.pk)
+                                    logging.debug(f"Resource {idx+1} re-fetched info: {vars(resource_info)}")
+                                    if hasattr(resource_info, 'image_versions2') and resource_info.image_versions2 and resource_info.image_versions2.get('candidates'):
+                                        media_url = str(resource_info.image_versions2['candidates'][0]['url'])
+                                        extension = '.jpg'
+                                    elif hasattr(resource_info, 'thumbnail_url') and resource_info.thumbnail_url:
+                                        media_url = str(resource_info.thumbnail_url)
+                                        extension = '.jpg'
+                                    else:
+                                        logging.warning(f"Skipping resource {idx+1} in {post_url}: No valid image URL (media_type: 1)")
+                                        continue
+                            elif resource.media_type == 2:
+                                if hasattr(resource, 'video_versions') and resource.video_versions:
+                                    media_url = str(resource.video_versions[0].url)
                                     extension = '.mp4'
-                                elif hasattr(resource_info, 'video_url') and resource_info.video_url:
-                                    media_url = str(resource_info.video_url)
+                                elif hasattr(resource, 'video_url') and resource.video_url:
+                                    media_url = str(resource.video_url)
                                     extension = '.mp4'
-                                elif hasattr(resource_info, 'thumbnail_url') and resource_info.thumbnail_url:
-                                    media_url = str(resource_info.thumbnail_url)
-                                    extension = '.jpg'
-                                    logging.info(f"Falling back to thumbnail for video resource {idx+1} in {post_url}")
                                 else:
-                                    logging.warning(f"Skipping resource {idx+1} in {post_url}: No valid video URL (media_type: 2)")
-                                    continue
-                        else:
-                            logging.warning(f"Skipping resource {idx+1} in {post_url}: Unsupported media type (media_type: {getattr(resource, 'media_type', 'unknown')})")
-                            continue
-                        headers = {
-                            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-                        }
-                        cookies = ig_client.get_settings().get('cookies', {})
-                        response = requests.get(media_url, headers=headers, cookies=cookies)
-                        response.raise_for_status()
-                        filename = f"instagram_{post_url.split('/')[-2]}_{idx+1}{extension}"
-                        media_data = io.BytesIO(response.content)
-                        file_size = len(media_data.getvalue())
-                        logging.info(f"Downloaded media {idx+1} for {post_url}: {filename}, size: {file_size} bytes")
-                        if file_size > DISCORD_FILE_SIZE_LIMIT:
-                            logging.warning(f"Media {filename} exceeds Discord file size limit ({DISCORD_FILE_SIZE_LIMIT} bytes)")
+                                    resource_info = ig_client.media_info(resource.pk)
+                                    logging.debug(f"Resource {idx+1} re-fetched info: {vars(resource_info)}")
+                                    if hasattr(resource_info, 'video_versions') and resource_info.video_versions:
+                                        media_url = str(resource_info.video_versions[0].url)
+                                        extension = '.mp4'
+                                    elif hasattr(resource_info, 'video_url') and resource_info.video_url:
+                                        media_url = str(resource_info.video_url)
+                                        extension = '.mp4'
+                                    elif hasattr(resource_info, 'thumbnail_url') and resource_info.thumbnail_url:
+                                        media_url = str(resource_info.thumbnail_url)
+                                        extension = '.jpg'
+                                        logging.info(f"Falling back to thumbnail for video resource {idx+1} in {post_url}")
+                                    else:
+                                        logging.warning(f"Skipping resource {idx+1} in {post_url}: No valid video URL (media_type: 2)")
+                                        continue
+                            else:
+                                logging.warning(f"Skipping resource {idx+1} in {post_url}: Unsupported media type (media_type: {getattr(resource, 'media_type', 'unknown')})")
+                                continue
+                            headers = {
+                                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+                            }
+                            cookies = ig_client.get_settings().get('cookies', {})
+                            response = requests.get(media_url, headers=headers, cookies=cookies)
+                            response.raise_for_status()
+                            filename = f"instagram_{post_url.split('/')[-2]}_{idx+1}{extension}"
+                            media_handle = MediaHandle(response.content, filename)
+                            logging.info(f"Downloaded media {idx+1} for {post_url}: {filename}, size: {media_handle.size} bytes")
+                            if media_handle.size > CONFIG.discord_file_size_limit:
+                                logging.warning(f"Media {filename} exceeds Discord file size limit ({CONFIG.discord_file_size_limit} bytes)")
+                                continue
+                            media_items.append(media_handle)
+                            logging.info(f"Successfully downloaded media {idx+1} for {post_url}: {filename}")
+                        except requests.RequestException as e:
+                            logging.error(f"Error downloading resource {idx+1} for {post_url}: {e}")
                             continue
-                        media_items.append((media_data, filename))
-                        logging.info(f"Successfully downloaded media {idx+1} for {post_url}: {filename}")
-                    except requests.RequestException as e:
-                        logging.error(f"Error downloading resource {idx+1} for {post_url}: {e}")
-                        continue
-                time.sleep(5)
-                return media_items, [item[1] for item in media_items]
-            else:  # Single photo or video (for posts or stories)
-                logging.debug(f"Media details: {vars(media)}")
-                media_url = None
-                extension = None
-                if media.media_type == 2:
-                    if hasattr(media, 'video_versions') and media.video_versions:
-                        media_url = str(media.video_versions[0].url)
-                        extension = '.mp4'
-                    elif hasattr(media, 'video_url') and media.video_url:
-                        media_url = str(media.video_url)
-                        extension = '.mp4'
-                    else:
-                        media_info = ig_client.media_info(media.pk)
-                        logging.debug(f"Media re-fetched info: {vars(media_info)}")
-                        if hasattr(media_info, 'video_versions') and media_info.video_versions:
-                            media_url = str(media_info.video_versions[0].url)
+                    time.sleep(5)
+                    return media_items
+                else:  # Single photo or video (for posts or stories)
+                    logging.debug(f"Media details: {vars(media)}")
+                    media_url = None
+                    extension = None
+                    if media.media_type == 2:
+                        if hasattr(media, 'video_versions') and media.video_versions:
+                            media_url = str(media.video_versions[0].url)
                             extension = '.mp4'
-                        elif hasattr(media_info, 'video_url') and media_info.video_url:
-                            media_url = str(media_info.video_url)
+                        elif hasattr(media, 'video_url') and media.video_url:
+                            media_url = str(media.video_url)
                             extension = '.mp4'
-                        elif hasattr(media_info, 'thumbnail_url') and media_info.thumbnail_url:
-                            media_url = str(media_info.thumbnail_url)
-                            extension = '.jpg'
-                            logging.info(f"Falling back to thumbnail for video media {post_url}")
                         else:
-                            logging.warning(f"No valid video URL for {post_url} (media_type: 2)")
-                            return [], []
-                elif media.media_type == 1:
-                    if hasattr(media, 'image_versions2') and media.image_versions2 and media.image_versions2.get('candidates'):
-                        media_url = str(media.image_versions2['candidates'][0]['url'])
-                        extension = '.jpg'
-                    elif hasattr(media, 'thumbnail_url') and media.thumbnail_url:
-                        media_url = str(media.thumbnail_url)
-                        extension = '.jpg'
-                    else:
-                        media_info = ig_client.media_info(media.pk)
-                        logging.debug(f"Media re-fetched info: {vars(media_info)}")
-                        if hasattr(media_info, 'image_versions2') and media_info.image_versions2 and media_info.image_versions2.get('candidates'):
-                            media_url = str(media_info.image_versions2['candidates'][0]['url'])
+                            media_info = ig_client.media_info(media.pk)
+                            logging.debug(f"Media re-fetched info: {vars(media_info)}")
+                            if hasattr(media_info, 'video_versions') and media_info.video_versions:
+                                media_url = str(media_info.video_versions[0].url)
+                                extension = '.mp4'
+                            elif hasattr(media_info, 'video_url') and media_info.video_url:
+                                media_url = str(media_info.video_url)
+                                extension = '.mp4'
+                            elif hasattr(media_info, 'thumbnail_url') and media_info.thumbnail_url:
+                                media_url = str(media_info.thumbnail_url)
+                                extension = '.jpg'
+                                logging.info(f"Falling back to thumbnail for video media {post_url}")
+                            else:
+                                logging.warning(f"No valid video URL for {post_url} (media_type: 2)")
+                                return []
+                    elif media.media_type == 1:
+                        if hasattr(media, 'image_versions2') and media.image_versions2 and media.image_versions2.get('candidates'):
+                            media_url = str(media.image_versions2['candidates'][0]['url'])
                             extension = '.jpg'
-                        elif hasattr(media_info, 'thumbnail_url') and media_info.thumbnail_url:
-                            media_url = str(media_info.thumbnail_url)
+                        elif hasattr(media, 'thumbnail_url') and media.thumbnail_url:
+                            media_url = str(media.thumbnail_url)
                             extension = '.jpg'
                         else:
-                            logging.warning(f"No valid image URL for {post_url} (media_type: 1)")
-                            return [], []
-                if not media_url:
-                    logging.warning(f"Unsupported media type {media.media_type} or no media found for {post_url} (attempt {attempt + 1})")
-                    return [], []
-                headers = {
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-                }
-                cookies = ig_client.get_settings().get('cookies', {})
-                response = requests.get(media_url, headers=headers, cookies=cookies)
-                response.raise_for_status()
-                filename = f"instagram_{post_url.split('/')[-2]}{extension}"
-                media_data = io.BytesIO(response.content)
-                file_size = len(media_data.getvalue())
-                logging.info(f"Downloaded media for {post_url}: {filename}, size: {file_size} bytes")
-                if file_size > DISCORD_FILE_SIZE_LIMIT:
-                    logging.warning(f"Media {filename} exceeds Discord file size limit ({DISCORD_FILE_SIZE_LIMIT} bytes)")
-                    return [], []
-                time.sleep(5)
-                return [(media_data, filename)], [filename]
+                            media_info = ig_client.media_info(media.pk)
+                            logging.debug(f"Media re-fetched info: {vars(media_info)}")
+                            if hasattr(media_info, 'image_versions2') and media_info.image_versions2 and media_info.image_versions2.get('candidates'):
+                                media_url = str(media_info.image_versions2['candidates'][0]['url'])
+                                extension = '.jpg'
+                            elif hasattr(media_info, 'thumbnail_url') and media_info.thumbnail_url:
+                                media_url = str(media_info.thumbnail_url)
+                                extension = '.jpg'
+                            else:
+                                logging.warning(f"No valid image URL for {post_url} (media_type: 1)")
+                                return []
+                    if not media_url:
+                        logging.warning(f"Unsupported media type {media.media_type} or no media found for {post_url} (attempt {attempt + 1})")
+                        return []
+                    headers = {
+                        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+                    }
+                    cookies = ig_client.get_settings().get('cookies', {})
+                    response = requests.get(media_url, headers=headers, cookies=cookies)
+                    response.raise_for_status()
+                    filename = f"instagram_{post_url.split('/')[-2]}{extension}"
+                    media_handle = MediaHandle(response.content, filename)
+                    logging.info(f"Downloaded media for {post_url}: {filename}, size: {media_handle.size} bytes")
+                    if media_handle.size > CONFIG.discord_file_size_limit:
+                        logging.warning(f"Media {filename} exceeds Discord file size limit ({CONFIG.discord_file_size_limit} bytes)")
+                        return []
+                    time.sleep(5)
+                    return [media_handle]
         except Exception as e:
             if str(e).startswith("429"):
                 logging.warning(f"Instagram rate limit hit for {post_url} with {username}, switching account")
@@ -412,147 +469,179 @@ def download_instagram_media(post_url: str, media, retries: int = 5) -> Tuple[Li
                 time.sleep(2 ** attempt * 10)
                 continue
             logging.warning(f"Exhausted retries for media fetch for {post_url}")
-            return [], []
-    return [], []
+            return []
+    return []
 
-async def fetch_instagram_post_for_user(username: str, channel_id: Optional[int] = None, retries: int = 3) -> Tuple[Optional[Dict], List]:
-    """Fetch the first two non-pinned Instagram posts for a user, select the newer one if the second is more recent, and check for deleted posts."""
+def remember_user_snapshot(username: str, snapshot: UserSnapshot) -> None:
+    """Cache a user snapshot, dropping the least recently stored ones of unmonitored users beyond CONFIG.user_snapshot_max_entries."""
+    with USER_SNAPSHOT_LOCK:
+        USER_SNAPSHOT_CACHE[username] = snapshot
+        USER_SNAPSHOT_CACHE.move_to_end(username)
+        evictable = [name for name in USER_SNAPSHOT_CACHE if name != username and name not in CONFIG.monitored_usernames]
+        while len(USER_SNAPSHOT_CACHE) > CONFIG.user_snapshot_max_entries and evictable:
+            evicted = evictable.pop(0)
+            del USER_SNAPSHOT_CACHE[evicted]
+            logging.debug(f"Dropped the user snapshot of @{evicted} from the cache")
+
+def update_user_snapshot(username: str, user, profile: Optional[MediaHandle]) -> UserSnapshot:
+    """Store the profile fields /userdetails shows, taken from a user_info we already fetched.
+
+    Follower counts go into the follower series for monitored users only.
+    """
+    previous = USER_SNAPSHOT_CACHE.get(username)
+    snapshot = UserSnapshot(
+        full_name=user.full_name,
+        follower_count=user.follower_count,
+        following_count=user.following_count,
+        biography=user.biography,
+        profile_pic_url=str(getattr(user, 'profile_pic_url_hd', None) or user.profile_pic_url),
+        profile=profile or (previous.profile if previous else None),
+        timestamp=time.time()
+    )
+    remember_user_snapshot(username, snapshot)
+    if user.follower_count is not None and username in CONFIG.monitored_usernames:
+        append_follower_sample(username, user.follower_count)
+    return snapshot
+
+def store_user_snapshot(username: str, snapshot: UserSnapshot) -> UserSnapshot:
+    """Keep a snapshot taken by the poller process unless a newer one is cached already."""
+    previous = USER_SNAPSHOT_CACHE.get(username)
+    if previous is not None and previous.timestamp >= snapshot.timestamp:
+        return previous
+    remember_user_snapshot(username, snapshot)
+    return snapshot
+
+def get_profile_picture(user, username: str) -> Optional[MediaHandle]:
+    """Return a user's profile picture, only downloading it when the picture URL changed."""
+    snapshot = USER_SNAPSHOT_CACHE.get(username)
+    profile_pic_url = str(getattr(user, 'profile_pic_url_hd', None) or user.profile_pic_url)
+    if snapshot and snapshot.profile and snapshot.profile_pic_url == profile_pic_url:
+        logging.debug(f"Profile picture for {username} unchanged, reusing snapshot copy")
+        return snapshot.profile
+    profile, _ = download_profile_picture(user, username)
+    return profile
+
+def diff_post_window(posts: List, history_posts: Dict[str, PostRecord]) -> Tuple[List, bool]:
+    """Compare a fetched window of non-pinned posts against the stored history.
+
+    Returns the posts that still need delivering, oldest first, and whether every
+    post in the window was unseen (meaning older unseen posts may lie beyond it).
+    """
+    if not posts:
+        return [], bool(history_posts)
+    history_by_shortcode = history_posts
+    newest_post = max(posts, key=lambda post: post.taken_at or datetime.min.replace(tzinfo=UTC))
+    if not history_by_shortcode:
+        # Nothing recorded yet, only announce the newest post instead of the whole feed
+        return [newest_post], False
+    pending = [post for post in posts if post.code not in history_by_shortcode]
+    whole_window_new = all(post.code not in history_by_shortcode for post in posts)
+    pending.sort(key=lambda post: post.taken_at or datetime.min.replace(tzinfo=UTC))
+    return pending, whole_window_new
+
+def build_post_item(username: str, post, profile: Optional[MediaHandle]) -> PostItem:
+    """Download a post's media and wrap it for delivery."""
+    post_timestamp = int(post.taken_at.timestamp()) if post.taken_at else 0
+    post_url = f"https://www.instagram.com/p/{post.code}/"
+    media = download_instagram_media(post_url, post)
+    if media:
+        logging.info(f"Media downloaded for {post_url}: {[handle.filename for handle in media]}")
+    else:
+        logging.warning(f"Failed to download media for post {post_url}")
+    return PostItem(
+        username=username,
+        media_pk=post.pk,
+        url=post_url,
+        text=post.caption_text or "No caption",
+        timestamp=post_timestamp,
+        media=media,
+        profile=profile,
+        shortcode=post.code,
+        like_count=post.like_count,
+        comment_count=post.comment_count
+    )
+
+def fetch_instagram_post_for_user_sync(username: str, cached_shortcode: Optional[str] = None, retries: int = 3) -> Tuple[List[PostItem], Optional[PostItem]]:
+    """Fetch every unseen non-pinned Instagram post for a user, oldest first, and check for deleted posts.
+
+    The fetch window starts at CONFIG.post_fetch_window posts and is only widened (by paginating)
+    while every non-pinned post in it is unseen, up to CONFIG.post_fetch_max_window posts.
+    Also returns the user's newest post when nothing is new and it isn't the cached
+    cached_shortcode, so /ping can still offer it to channels that never received it.
+    """
     shortcode_history = load_last_ig_post_shortcode(username)
-    shortcode_list = [entry["shortcode"] for entry in shortcode_history.get("posts", [])]
-    latest_post = shortcode_history.get("latest_post", {})
-    latest_shortcode = latest_post.get("shortcode", "")
-    latest_timestamp = latest_post.get("timestamp", "1970-01-01 00:00:00 UTC")
+    history_posts = shortcode_history.entries
+    shortcode_list = list(history_posts)
+    latest_shortcode = shortcode_history.latest_id or ""
+    latest_timestamp = shortcode_history.latest_timestamp
+    ig_username = None
     for attempt in range(retries):
         try:
-            ig_client, ig_username = get_next_client()
-            logging.debug(f"Attempting to fetch Instagram posts for @{username} using {ig_username}, attempt {attempt + 1}/{retries}, shortcode_history: {shortcode_list}, latest_shortcode: {latest_shortcode}, latest_timestamp: {latest_timestamp}, channel_id: {channel_id}")
-            user_id = ig_client.user_id_from_username(username)
-            user = ig_client.user_info_by_username(username)
-            profile_data, profile_filename, profile_pic_url = download_profile_picture(user, username)
-            posts = ig_client.user_medias(user_id, amount=3) 
-            logging.debug(f"Fetched {len(posts)} posts for @{username}")
-            if not posts:
-                logging.info(f"No Instagram posts found for @{username}")
-                print(f"No Instagram posts found for @{username}")
-                deleted_posts = [
-                    {"entry": entry, "username": username} for entry in shortcode_history.get("posts", [])
-                    if channel_id and str(channel_id) in entry["message_ids"]
-                ]
-                logging.debug(f"Potential deleted posts for @{username} (no posts fetched): {[entry['entry']['shortcode'] for entry in deleted_posts]}")
-                if profile_data and profile_filename:
-                    INSTAGRAM_POST_CACHE[username] = INSTAGRAM_POST_CACHE.get(username, {})
-                    INSTAGRAM_POST_CACHE[username]["profile"] = {
-                        "profile_data": io.BytesIO(profile_data.getvalue()),
-                        "profile_filename": profile_filename,
-                        "timestamp": time.time()
-                    }
-                return None, deleted_posts
-
-            non_pinned_posts = []
-            fetched_shortcodes = []
-            for post in posts:
-                post = ig_client.media_info(post.pk)
-                if not hasattr(post, 'is_pinned') or not post.is_pinned:
-                    logging.debug(f"Post {post.code} is not pinned, adding to non_pinned_posts")
-                    non_pinned_posts.append(post)
-                    fetched_shortcodes.append(post.code)
-                else:
-                    logging.debug(f"Skipping pinned post {post.code} with pinned icon")
-            logging.debug(f"Fetched non-pinned shortcodes for @{username}: {fetched_shortcodes}")
-
-            if not non_pinned_posts:
-                logging.info(f"No non-pinned Instagram posts found for @{username}")
-                print(f"No non-pinned Instagram posts found for @{username}")
-                deleted_posts = [
-                    {"entry": entry, "username": username} for entry in shortcode_history.get("posts", [])
-                    if entry["shortcode"] in shortcode_list and channel_id and str(channel_id) in entry["message_ids"]
-                ]
-                logging.debug(f"Potential deleted posts for @{username} (no non-pinned posts): {[entry['entry']['shortcode'] for entry in deleted_posts]}")
-                if profile_data and profile_filename:
-                    INSTAGRAM_POST_CACHE[username] = INSTAGRAM_POST_CACHE.get(username, {})
-                    INSTAGRAM_POST_CACHE[username]["profile"] = {
-                        "profile_data": io.BytesIO(profile_data.getvalue()),
-                        "profile_filename": profile_filename,
-                        "timestamp": time.time()
-                    }
-                return None, deleted_posts
-
-            deleted_posts = [
-                {"entry": entry, "username": username} for entry in shortcode_history.get("posts", [])
-                if entry["shortcode"] in shortcode_list and entry["shortcode"] not in fetched_shortcodes and channel_id and str(channel_id) in entry["message_ids"]
-            ]
-            if deleted_posts:
-                logging.info(f"Detected deleted posts for @{username}: {[entry['entry']['shortcode'] for entry in deleted_posts]}")
-
-            if len(non_pinned_posts) > 1:
-                first_post, second_post = non_pinned_posts[:2]
-                if second_post.taken_at > first_post.taken_at:
-                    post = second_post
-                    logging.debug(f"Selected newer second post for @{username}: {post.code} with timestamp {post.taken_at}")
-                else:
-                    post = first_post
-                    logging.debug(f"Selected first post (not newer) for @{username}: {post.code} with timestamp {post.taken_at}")
-            else:
-                post = non_pinned_posts[0]  # Only one non-pinned post available
-                logging.debug(f"Only one non-pinned post available for @{username}: {post.code}")
-
-            post_timestamp = post.taken_at.strftime("%Y-%m-%d %H:%M:%S UTC") if post.taken_at else "1970-01-01 00:00:00 UTC"
-            channel_ids = next((entry["channel_ids"] for entry in shortcode_history.get("posts", []) if entry["shortcode"] == post.code), [])
-            
-            if post.code not in shortcode_list or (channel_id and str(channel_id) not in channel_ids):
-                save_last_ig_post_shortcode(
-                    username=username,
-                    shortcode=post.code,
-                    timestamp=post_timestamp,
-                    channel_id=None,
-                    like_count=post.like_count,
-                    comment_count=post.comment_count
-                )
-                logging.info(f"{'New post' if post.code not in shortcode_list else 'Existing post, new channel'} found for @{username}, shortcode: {post.code}, ID: {post.pk}, timestamp: {post_timestamp}, likes: {post.like_count}, comments: {post.comment_count}")
-                post_url = f"https://www.instagram.com/p/{post.code}/"
-                media_data_list, filename_list = download_instagram_media(post_url, post)
-                for media_data, _ in media_data_list:
-                    if media_data:
-                        media_data.seek(0)
-                if media_data_list and filename_list:
-                    logging.info(f"Media downloaded for {post_url}: {filename_list}")
-                else:
-                    logging.warning(f"Failed to download media for post {post_url}")
-                if profile_data and profile_filename:
-                    INSTAGRAM_POST_CACHE[username] = INSTAGRAM_POST_CACHE.get(username, {})
-                    INSTAGRAM_POST_CACHE[username]["profile"] = {
-                        "profile_data": io.BytesIO(profile_data.getvalue()),
-                        "profile_filename": profile_filename,
-                        "timestamp": time.time()
-                    }
-                return {
-                    "platform": "Instagram",
-                    "type": "post",
-                    "username": username,
-                    "text": post.caption_text or "No caption",
-                    "url": post_url,
-                    "id": post.pk,
-                    "shortcode": post.code,
-                    "media_data_list": media_data_list,
-                    "filename_list": filename_list,
-                    "timestamp": post_timestamp,
-                    "is_deleted_post": False,
-                    "like_count": post.like_count,
-                    "comment_count": post.comment_count,
-                    "profile_filename": profile_filename,
-                    "profile_data": profile_data
-                }, deleted_posts
-            logging.info(f"No new Instagram post for @{username} (shortcode: {post.code}, timestamp: {post_timestamp}, already processed for channel {channel_id}, channel_ids: {channel_ids})")
-            print(f"No new Instagram post for @{username} (shortcode: {post.code}, timestamp: {post_timestamp}, already processed for channel {channel_id}, channel_ids: {channel_ids})")
-            if profile_data and profile_filename:
-                INSTAGRAM_POST_CACHE[username] = INSTAGRAM_POST_CACHE.get(username, {})
-                INSTAGRAM_POST_CACHE[username]["profile"] = {
-                    "profile_data": io.BytesIO(profile_data.getvalue()),
-                    "profile_filename": profile_filename,
-                    "timestamp": time.time()
-                }
-            return None, deleted_posts
+            with get_next_client() as (ig_client, ig_username):
+                logging.debug(f"Attempting to fetch Instagram posts for @{username} using {ig_username}, attempt {attempt + 1}/{retries}, shortcode_history: {shortcode_list}, latest_shortcode: {latest_shortcode}, latest_timestamp: {latest_timestamp}")
+                user_id = ig_client.user_id_from_username(username)
+                user = ig_client.user_info_by_username(username)
+                profile = get_profile_picture(user, username)
+                update_user_snapshot(username, user, profile)
+
+                non_pinned_posts = []
+                fetched_shortcodes = []
+                pinned_shortcodes = []
+                pending_posts = []
+                fetched_count = 0
+                end_cursor = ""
+                while True:
+                    page, end_cursor = ig_client.user_medias_paginated(user_id, amount=CONFIG.post_fetch_window, end_cursor=end_cursor)
+                    fetched_count += len(page)
+                    for post in page:
+                        post = ig_client.media_info(post.pk)
+                        if not hasattr(post, 'is_pinned') or not post.is_pinned:
+                            logging.debug(f"Post {post.code} is not pinned, adding to non_pinned_posts")
+                            non_pinned_posts.append(post)
+                            fetched_shortcodes.append(post.code)
+                        else:
+                            logging.debug(f"Skipping pinned post {post.code} with pinned icon")
+                            pinned_shortcodes.append(post.code)
+                    pending_posts, whole_window_new = diff_post_window(non_pinned_posts, history_posts)
+                    if not whole_window_new or not page or not end_cursor or fetched_count >= CONFIG.post_fetch_max_window:
+                        break
+                    logging.info(f"Every fetched post for @{username} is unseen ({fetched_count} posts), widening the fetch window")
+                logging.debug(f"Fetched {fetched_count} posts for @{username}, non-pinned shortcodes: {fetched_shortcodes}")
+
+                deleted_posts = find_deleted_posts(ig_client, username, list(history_posts.values()), non_pinned_posts, fetched_shortcodes + pinned_shortcodes)
+                if deleted_posts:
+                    logging.info(f"Detected deleted posts for @{username}: {[entry.shortcode for entry in deleted_posts]}")
+                    current_utc = int(time.time())
+                    for deleted_post in deleted_posts:
+                        save_last_ig_post_shortcode(
+                            username=username,
+                            shortcode=deleted_post.shortcode,
+                            timestamp=deleted_post.timestamp,
+                            marked_deleted=True,
+                            deleted_at=current_utc
+                        )
+
+                if not non_pinned_posts:
+                    logging.info(f"No non-pinned Instagram posts found for @{username}")
+                    print(f"No non-pinned Instagram posts found for @{username}")
+                    return [], None
+
+                if not pending_posts:
+                    newest_post = max(non_pinned_posts, key=lambda post: post.taken_at or datetime.min.replace(tzinfo=UTC))
+                    logging.info(f"No new Instagram post for @{username} (newest shortcode: {newest_post.code}, already processed)")
+                    print(f"No new Instagram post for @{username} (newest shortcode: {newest_post.code}, already processed)")
+                    if newest_post.code == cached_shortcode:
+                        return [], None
+                    logging.info(f"Newest post {newest_post.code} of @{username} isn't cached, fetching it for /ping")
+                    return [], build_post_item(username, newest_post, profile)
+
+                posts_output = []
+                for post in pending_posts:
+                    logging.info(f"New post found for @{username}, shortcode: {post.code}, ID: {post.pk}, likes: {post.like_count}, comments: {post.comment_count}")
+                    posts_output.append(build_post_item(username, post, profile))
+                return posts_output, None
         except Exception as e:
+            report_client_error(ig_username, e)
             if str(e).startswith("429"):
                 logging.warning(f"Instagram rate limit hit for @{username} with {ig_username}, switching account")
                 print(f"Instagram rate limit hit for @{username} with {ig_username}, switching account")
@@ -562,10 +651,6 @@ async def fetch_instagram_post_for_user(username: str, channel_id: Optional[int]
             elif isinstance(e, KeyError) and 'data' in str(e):
                 logging.error(f"KeyError: 'data' in Instagram API response for @{username}: {e}")
                 print(f"KeyError: 'data' in Instagram API response for @{username}: {e}")
-                try:
-                    logging.debug(f"Raw API response: {ig_client.last_json}")
-                except:
-                    logging.debug("No last_json available")
                 if attempt < retries - 1:
                     time.sleep(2 ** attempt * 10)
                     continue
@@ -576,105 +661,118 @@ async def fetch_instagram_post_for_user(username: str, channel_id: Optional[int]
                     time.sleep(2 ** attempt * 10)
                     continue
             logging.warning(f"Exhausted retries for fetching Instagram posts for @{username}")
-            return None, []
-    return None, []
-
-async def fetch_instagram_stories_for_user(username: str, channel_id: Optional[int] = None, retries: int = 3) -> List[Dict]:
+            return [], None
+    return [], None
+
+async def single_flight(operation: str, username: str, fetch: Callable[[], Awaitable]):
+    """Run fetch once for every concurrent caller asking for the same (operation, username).
+
+    Callers arriving while a request is in flight await that request and share its result
+    instead of hitting Instagram again.
+    """
+    key = (operation, username)
+    in_flight = INFLIGHT_REQUESTS.get(key)
+    if in_flight is not None:
+        logging.debug(f"Joining in-flight Instagram request {operation} for @{username}")
+        return await asyncio.shield(in_flight)
+    future = asyncio.get_running_loop().create_future()
+    INFLIGHT_REQUESTS[key] = future
+    try:
+        result = await fetch()
+    except BaseException as e:
+        if isinstance(e, asyncio.CancelledError):
+            future.cancel()
+        else:
+            future.set_exception(e)
+            future.exception()  # Mark as retrieved when nobody else joined
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        INFLIGHT_REQUESTS.pop(key, None)
+
+async def fetch_instagram_post_for_user(username: str, retries: int = 3) -> Tuple[List[PostItem], Optional[PostItem]]:
+    """Fetch every unseen non-pinned Instagram post for a user without blocking the event loop."""
+    cached = INSTAGRAM_POST_CACHE.latest(username)
+    cached_shortcode = cached.shortcode if cached else None
+    return await single_flight("posts", username, lambda: asyncio.to_thread(fetch_instagram_post_for_user_sync, username, cached_shortcode, retries))
+
+def fetch_instagram_stories_for_user_sync(username: str, retries: int = 3) -> List[StoryItem]:
     """Fetch active Instagram stories for a user."""
-    story_history = load_last_ig_story(username)
-    story_ids = [entry["story_id"] for entry in story_history.get("stories", [])]
+    story_history = load_last_ig_story(username).entries
+    story_ids = list(story_history)
     stories_output = []
+    ig_username = None
     for attempt in range(retries):
         try:
-            ig_client, ig_username = get_next_client()
-            logging.debug(f"Attempting to fetch Instagram stories for @{username} using {ig_username}, attempt {attempt + 1}/{retries}, story_history: {story_ids}, channel_id: {channel_id}")
-            user_id = ig_client.user_id_from_username(username)
-            user = ig_client.user_info_by_username(username)
-            profile_data, profile_filename, profile_pic_url = download_profile_picture(user, username)
-            stories = ig_client.user_stories(user_id)
-            logging.debug(f"Fetched {len(stories)} stories for @{username}")
-            if not stories:
-                logging.info(f"No active Instagram stories found for @{username}")
-                print(f"No active Instagram stories found for @{username}")
-                if profile_data and profile_filename:
-                    INSTAGRAM_STORY_CACHE[username] = INSTAGRAM_STORY_CACHE.get(username, {})
-                    INSTAGRAM_STORY_CACHE[username]["profile"] = {
-                        "profile_data": io.BytesIO(profile_data.getvalue()),
-                        "profile_filename": profile_filename,
-                        "timestamp": time.time()
-                    }
-                return []
-
-            fetched_story_ids = []
-            for story in stories:
-                story_id = str(story.pk)
-                fetched_story_ids.append(story_id)
-                story_timestamp = story.taken_at.strftime("%Y-%m-%d %H:%M:%S UTC") if story.taken_at else "1970-01-01 00:00:00 UTC"
-                channel_ids = next((entry["channel_ids"] for entry in story_history.get("stories", []) if entry["story_id"] == story_id), [])
-
-                if story_id not in story_ids or (channel_id and str(channel_id) not in channel_ids):
-                    # Instagram stories don't have a direct URL, so use profile URL
-                    story_url = f"https://www.instagram.com/stories/{username}/{story_id}/"
-                    media_data_list, filename_list = download_instagram_media(story_url, story)
-                    for media_data, _ in media_data_list:
-                        if media_data:
-                            media_data.seek(0)
-                    if media_data_list and filename_list:
-                        logging.info(f"Media downloaded for story {story_url}: {filename_list}")
-                    else:
-                        logging.warning(f"Failed to download media for story {story_url}")
-
-                    save_last_ig_story(
-                        username=username,
-                        story_id=story_id,
-                        timestamp=story_timestamp,
-                        channel_id=None
-                    )
-                    logging.info(f"New story found for @{username}, story_id: {story_id}, timestamp: {story_timestamp}")
-                    stories_output.append({
-                        "platform": "Instagram",
-                        "type": "story",
-                        "username": username,
-                        "text": getattr(story, 'caption_text', "No caption") or "No caption",
-                        "url": story_url,
-                        "id": story.pk,
-                        "shortcode": story_id,
-                        "media_data_list": media_data_list,
-                        "filename_list": filename_list,
-                        "timestamp": story_timestamp,
-                        "is_deleted_post": False, 
-                        "like_count": None, 
-                        "comment_count": None,  
-                        "profile_filename": profile_filename,
-                        "profile_data": profile_data
-                    })
-
-            expired_stories = [
-                {"entry": entry, "username": username} for entry in story_history.get("stories", [])
-                if entry["story_id"] not in fetched_story_ids and channel_id and str(channel_id) in entry["message_ids"]
-            ]
-            if expired_stories:
-                logging.info(f"Detected expired stories for @{username}: {[entry['entry']['story_id'] for entry in expired_stories]}")
-                current_utc = datetime.now(UTC).strftime("%Y-%m-%d %H:%M:%S UTC")
-                for expired_story in expired_stories:
-                    save_last_ig_story(
-                        username=username,
-                        story_id=expired_story["entry"]["story_id"],
-                        timestamp=expired_story["entry"]["timestamp"],
-                        channel_id=channel_id,
-                        expired=True,
-                        expired_at=current_utc
+            with get_next_client() as (ig_client, ig_username):
+                logging.debug(f"Attempting to fetch Instagram stories for @{username} using {ig_username}, attempt {attempt + 1}/{retries}, story_history: {story_ids}")
+                user_id = ig_client.user_id_from_username(username)
+                user = ig_client.user_info_by_username(username)
+                profile = get_profile_picture(user, username)
+                update_user_snapshot(username, user, profile)
+                stories = ig_client.user_stories(user_id)
+                logging.debug(f"Fetched {len(stories)} stories for @{username}")
+                if not stories:
+                    logging.info(f"No active Instagram stories found for @{username}")
+                    print(f"No active Instagram stories found for @{username}")
+
+                fetched_story_ids = []
+                for story in stories:
+                    story_id = str(story.pk)
+                    fetched_story_ids.append(story_id)
+                    story_timestamp = int(story.taken_at.timestamp()) if story.taken_at else 0
+
+                    if story_id not in story_ids:
+                        # Instagram stories don't have a direct URL, so use profile URL
+                        story_url = f"https://www.instagram.com/stories/{username}/{story_id}/"
+                        media = download_instagram_media(story_url, story)
+                        if media:
+                            logging.info(f"Media downloaded for story {story_url}: {[handle.filename for handle in media]}")
+                        else:
+                            logging.warning(f"Failed to download media for story {story_url}")
+                        logging.info(f"New story found for @{username}, story_id: {story_id}, timestamp: {story_timestamp}")
+                        stories_output.append(StoryItem(
+                            username=username,
+                            media_pk=story.pk,
+                            url=story_url,
+                            text=getattr(story, 'caption_text', "No caption") or "No caption",
+                            timestamp=story_timestamp,
+                            media=media,
+                            profile=profile,
+                            story_id=story_id
+                        ))
+
+                _, previous_story_ids = LAST_FETCHED_STORY_IDS.get(username, (0, None))
+                LAST_FETCHED_STORY_IDS[username] = (time.time(), set(fetched_story_ids))
+                # The expiry schedule is what expires stories; a story missing from one response
+                # (an empty or partial answer) only confirms an expiry that is already due. Stories
+                # without a timestamp have no scheduled expiry and need two polls in a row without them.
+                now = time.time()
+                expired_stories = [
+                    entry for entry in story_history.values()
+                    if entry.story_id not in fetched_story_ids and not entry.expired
+                    and entry.message_ids
+                    and (
+                        entry.timestamp + STORY_EXPIRATION_HOURS * 3600 <= now if entry.timestamp
+                        else previous_story_ids is not None and entry.story_id not in previous_story_ids
                     )
-
-            if profile_data and profile_filename:
-                INSTAGRAM_STORY_CACHE[username] = INSTAGRAM_STORY_CACHE.get(username, {})
-                INSTAGRAM_STORY_CACHE[username]["profile"] = {
-                    "profile_data": io.BytesIO(profile_data.getvalue()),
-                    "profile_filename": profile_filename,
-                    "timestamp": time.time()
-                }
-            return stories_output
+                ]
+                if expired_stories:
+                    logging.info(f"Detected expired stories for @{username}: {[entry.story_id for entry in expired_stories]}")
+                    current_utc = int(time.time())
+                    for expired_story in expired_stories:
+                        save_last_ig_story(
+                            username=username,
+                            story_id=expired_story.story_id,
+                            timestamp=expired_story.timestamp,
+                            expired=True,
+                            expired_at=current_utc
+                        )
+                return stories_output
         except Exception as e:
+            report_client_error(ig_username, e)
             if str(e).startswith("429"):
                 logging.warning(f"Instagram rate limit hit for stories @{username} with {ig_username}, switching account")
                 print(f"Instagram rate limit hit for stories @{username} with {ig_username}, switching account")
@@ -684,10 +782,6 @@ async def fetch_instagram_stories_for_user(username: str, channel_id: Optional[i
             elif isinstance(e, KeyError) and 'data' in str(e):
                 logging.error(f"KeyError: 'data' in Instagram API response for stories @{username}: {e}")
                 print(f"KeyError: 'data' in Instagram API response for stories @{username}: {e}")
-                try:
-                    logging.debug(f"Raw API response: {ig_client.last_json}")
-                except:
-                    logging.debug("No last_json available")
                 if attempt < retries - 1:
                     time.sleep(2 ** attempt * 10)
                     continue
@@ -701,219 +795,172 @@ async def fetch_instagram_stories_for_user(username: str, channel_id: Optional[i
             return []
     return []
 
-async def fetch_instagram_content(channel_id: Optional[int] = None) -> Tuple[List, List]:
-    """Fetch Instagram posts and stories for monitored users."""
+async def fetch_instagram_stories_for_user(username: str, retries: int = 3) -> List[StoryItem]:
+    """Fetch active Instagram stories for a user without blocking the event loop."""
+    return await single_flight("stories", username, lambda: asyncio.to_thread(fetch_instagram_stories_for_user_sync, username, retries))
+
+async def fetch_instagram_content(usernames: Optional[List[str]] = None) -> Tuple[List[ContentItem], List[PostItem]]:
+    """Fetch Instagram posts and stories for monitored users.
+
+    Content is new when no channel has received it yet, so a single fetch can be fanned
+    out to every subscribed channel. Deleted posts and expired stories are recorded in
+    the history, where apply_pending_notices picks them up. Also returns the newest posts
+    that weren't new but had to be cached again, which are only offered through /ping.
+    """
+    await wait_for_sessions()
     posts = []
-    deleted_posts = []
+    latest_posts = []
     stories = []
-    current_time = time.time()
-    
-    for username in INSTAGRAM_USERNAMES_TO_MONITOR:
+    for username in usernames if usernames is not None else CONFIG.monitored_usernames:
         # Fetch posts
-        post, deleted = await fetch_instagram_post_for_user(username, channel_id=channel_id)
-        if post:
-            INSTAGRAM_POST_CACHE[username] = {
-                "post": post,
-                "timestamp": current_time
-            }
-            logging.debug(f"Cached new Instagram post for @{username}, shortcode: {post['shortcode']}, timestamp: {post['timestamp']}, is_deleted_post: {post['is_deleted_post']}")
-            posts.append(post)
-        if deleted:
-            deleted_posts.extend(deleted)
-            logging.debug(f"Collected deleted posts for @{username}: {[entry['entry']['shortcode'] for entry in deleted]}")
+        user_posts, latest_post = await fetch_instagram_post_for_user(username)
+        if user_posts:
+            posts.extend(user_posts)
+        if latest_post:
+            latest_posts.append(latest_post)
         
         # Fetch stories
-        user_stories = await fetch_instagram_stories_for_user(username, channel_id=channel_id)
+        user_stories = await fetch_instagram_stories_for_user(username)
         if user_stories:
-            INSTAGRAM_STORY_CACHE[username] = INSTAGRAM_STORY_CACHE.get(username, {})
-            for story in user_stories:
-                INSTAGRAM_STORY_CACHE[username][story["shortcode"]] = {
-                    "story": story,
-                    "timestamp": current_time
-                }
-                logging.debug(f"Cached new Instagram story for @{username}, story_id: {story['shortcode']}, timestamp: {story['timestamp']}")
-                stories.append(story)
-    
-    return posts + stories, deleted_posts
-
-async def userdetails_instagram(username: str = "avamax") -> Tuple[discord.Embed, Optional[discord.File]]:
-    """Fetch Instagram user details for the userdetails command."""
-    try:
-        ig_client, ig_username = get_next_client()
+            stories.extend(user_stories)
+
+    cache_content_items(latest_posts + posts + stories)
+    return posts + stories, latest_posts
+
+def configure_content_caches() -> None:
+    """Apply the configured budgets to the post and story caches."""
+    for cache in (INSTAGRAM_POST_CACHE, INSTAGRAM_STORY_CACHE):
+        cache.configure(CONFIG.content_cache_media_budget_bytes, CONFIG.content_cache_max_entries, CONFIG.content_cache_ttl_seconds)
+
+def cache_content_items(content_items: List[ContentItem]) -> None:
+    """Cache the newest fetched post of each user and every fetched story."""
+    newest_posts = {}
+    for item in content_items:
+        if isinstance(item, PostItem):
+            newest_posts[item.username] = item
+        else:
+            INSTAGRAM_STORY_CACHE.put(item)
+            logging.debug(f"Cached new Instagram story for @{item.username}, story_id: {item.story_id}, timestamp: {item.timestamp}")
+    for username, post in newest_posts.items():
+        INSTAGRAM_POST_CACHE.put(post)
+        logging.debug(f"Cached new Instagram post for @{username}, shortcode: {post.shortcode}, timestamp: {post.timestamp}")
+
+def record_fetched_items(content_items: List[ContentItem]) -> None:
+    """Mark fetched posts and stories as seen in their users' history.
+
+    Only called once the items are safely in the outbox, so a crash in between means
+    they are fetched again rather than lost. New stories get their expiry scheduled here.
+    """
+    for item in content_items:
+        if isinstance(item, PostItem):
+            save_last_ig_post_shortcode(
+                username=item.username,
+                shortcode=item.shortcode,
+                timestamp=item.timestamp,
+                channel_id=None,
+                like_count=item.like_count,
+                comment_count=item.comment_count
+            )
+        else:
+            save_last_ig_story(
+                username=item.username,
+                story_id=item.story_id,
+                timestamp=item.timestamp,
+                channel_id=None
+            )
+            if item.timestamp:
+                schedule_story_expiry(item.username, item.story_id, item.timestamp + STORY_EXPIRATION_HOURS * 3600)
+
+def refresh_user_snapshot(username: str) -> UserSnapshot:
+    """Fetch a user's profile with a single Instagram request and store it as their snapshot."""
+    with get_next_client() as (ig_client, ig_username):
+        logging.debug(f"Refreshing user snapshot for @{username} using {ig_username}")
         user = ig_client.user_info_by_username(username)
-        last_follower_count = load_last_follower_count(username)
-        current_follower_count = user.follower_count
-        save_last_follower_count(username, current_follower_count)
-
-        follower_change = None
-        change_text = "No previous follower count available."
-        if last_follower_count is not None:
-            follower_change = current_follower_count - last_follower_count
-            if follower_change > 0:
-                change_text = f"Gained {follower_change} followers since last check."
-            elif follower_change < 0:
-                change_text = f"Lost {abs(follower_change)} followers since last check."
-            else:
-                change_text = "No change in follower count since last check."
-
-        current_time = time.time()
-        last_post_time = "No non-pinned posts found."
-        last_post_id = "N/A"
-        last_story_time = "No stories found."
-        last_story_id = "N/A"
-        if username in INSTAGRAM_POST_CACHE:
-            cached = INSTAGRAM_POST_CACHE[username]
-            if cached.get("post") and current_time - cached["timestamp"] < CACHE_VALIDITY_SECONDS:
-                logging.info(f"Using cached post time for @{username}, shortcode: {cached['post']['shortcode']}")
-                print(f"Using cached post time for @{username}")
-                last_post_time = cached["post"]["timestamp"]
-                last_post_id = cached["post"]["id"]
-            else:
-                logging.debug(f"Cache expired or empty for posts @{username}, fetching new post time")
-
-        if username in INSTAGRAM_STORY_CACHE:
-            cached_stories = INSTAGRAM_STORY_CACHE[username]
-            for story_id, cached in cached_stories.items():
-                if story_id != "profile" and cached.get("story") and current_time - cached["timestamp"] < CACHE_VALIDITY_SECONDS:
-                    logging.info(f"Using cached story time for @{username}, story_id: {cached['story']['shortcode']}")
-                    print(f"Using cached story time for @{username}")
-                    last_story_time = cached["story"]["timestamp"]
-                    last_story_id = cached["story"]["id"]
-                    break
-
-        if last_post_time == "No non-pinned posts found":
-            posts = ig_client.user_medias(user.pk, amount=5)
-            if posts:
-                non_pinned_posts = []
-                for post in posts:
-                    post = ig_client.media_info(post.pk)
-                    if not hasattr(post, 'is_pinned') or not post.is_pinned:
-                        logging.debug(f"Post {post.code} is not pinned, adding to non_pinned_posts for @{username}")
-                        non_pinned_posts.append(post)
-                    else:
-                        logging.debug(f"Skipping pinned post {post.code} with pinned icon for @{username}")
-                
-                if non_pinned_posts:
-                    first_non_pinned_post = non_pinned_posts[0]
-                    last_post_time = first_non_pinned_post.taken_at.strftime("%Y-%m-%d %H:%M:%S UTC") if first_non_pinned_post.taken_at else "Unknown"
-                    last_post_id = first_non_pinned_post.pk
-                    post_url = f"https://www.instagram.com/p/{first_non_pinned_post.code}/"
-                    media_data_list, filename_list = download_instagram_media(post_url, first_non_pinned_post)
-                    for media_data, _ in media_data_list:
-                        if media_data:
-                            media_data.seek(0)
-                    INSTAGRAM_POST_CACHE[username] = {
-                        "post": {
-                            "platform": "Instagram",
-                            "type": "post",
-                            "username": username,
-                            "text": first_non_pinned_post.caption_text or "No caption",
-                            "url": post_url,
-                            "id": first_non_pinned_post.pk,
-                            "shortcode": first_non_pinned_post.code,
-                            "media_data_list": media_data_list,
-                            "filename_list": filename_list,
-                            "timestamp": last_post_time,
-                            "is_deleted_post": False,
-                            "like_count": first_non_pinned_post.like_count,
-                            "comment_count": first_non_pinned_post.comment_count
-                        },
-                        "timestamp": current_time
-                    }
-                    profile_data, profile_filename, _ = download_profile_picture(user, username)
-                    if profile_data and profile_filename:
-                        INSTAGRAM_POST_CACHE[username]["profile"] = {
-                            "profile_data": io.BytesIO(profile_data.getvalue()),
-                            "profile_filename": profile_filename,
-                            "timestamp": current_time
-                        }
-                    logging.debug(f"Cached new post time for @{username}, shortcode: {first_non_pinned_post.code}")
-                else:
-                    logging.info(f"No non-pinned posts found for @{username}")
-                    print(f"No non-pinned posts found for @{username}")
-                    profile_data, profile_filename, _ = download_profile_picture(user, username)
-                    if profile_data and profile_filename:
-                        INSTAGRAM_POST_CACHE[username] = INSTAGRAM_POST_CACHE.get(username, {})
-                        INSTAGRAM_POST_CACHE[username]["profile"] = {
-                            "profile_data": io.BytesIO(profile_data.getvalue()),
-                            "profile_filename": profile_filename,
-                            "timestamp": current_time
-                        }
-
-        if last_story_time == "No stories found":
-            stories = ig_client.user_stories(user.pk)
-            if stories:
-                first_story = stories[0]
-                last_story_time = first_story.taken_at.strftime("%Y-%m-%d %H:%M:%S UTC") if first_story.taken_at else "Unknown"
-                last_story_id = first_story.pk
-                story_url = f"https://www.instagram.com/stories/{username}/{first_story.pk}/"
-                media_data_list, filename_list = download_instagram_media(story_url, first_story)
-                for media_data, _ in media_data_list:
-                    if media_data:
-                        media_data.seek(0)
-                INSTAGRAM_STORY_CACHE[username] = INSTAGRAM_STORY_CACHE.get(username, {})
-                INSTAGRAM_STORY_CACHE[username][first_story.pk] = {
-                    "story": {
-                        "platform": "Instagram",
-                        "type": "story",
-                        "username": username,
-                        "text": getattr(first_story, 'caption_text', "No caption") or "No caption",
-                        "url": story_url,
-                        "id": first_story.pk,
-                        "shortcode": str(first_story.pk),
-                        "media_data_list": media_data_list,
-                        "filename_list": filename_list,
-                        "timestamp": last_story_time,
-                        "is_deleted_post": False,
-                        "like_count": None,
-                        "comment_count": None
-                    },
-                    "timestamp": current_time
-                }
-                profile_data, profile_filename, _ = download_profile_picture(user, username)
-                if profile_data and profile_filename:
-                    INSTAGRAM_STORY_CACHE[username]["profile"] = {
-                        "profile_data": io.BytesIO(profile_data.getvalue()),
-                        "profile_filename": profile_filename,
-                        "timestamp": current_time
-                    }
-                logging.debug(f"Cached new story time for @{username}, story_id: {first_story.pk}")
-            else:
-                logging.info(f"No stories found for @{username}")
-                print(f"No stories found for @{username}")
-                profile_data, profile_filename, _ = download_profile_picture(user, username)
-                if profile_data and profile_filename:
-                    INSTAGRAM_STORY_CACHE[username] = INSTAGRAM_STORY_CACHE.get(username, {})
-                    INSTAGRAM_STORY_CACHE[username]["profile"] = {
-                        "profile_data": io.BytesIO(profile_data.getvalue()),
-                        "profile_filename": profile_filename,
-                        "timestamp": current_time
-                    }
+        return update_user_snapshot(username, user, get_profile_picture(user, username))
+
+def build_userdetails_embed(username: str, snapshot: UserSnapshot) -> discord.Embed:
+    """Build the userdetails embed from a user snapshot and, for monitored users, the stored post/story history."""
+    current_follower_count = snapshot.follower_count
+    baseline = follower_baseline(username, int(snapshot.timestamp)) if current_follower_count is not None else None
+
+    change_text = "No previous follower count available."
+    if baseline is not None:
+        baseline_at, baseline_count = baseline
+        follower_change = current_follower_count - baseline_count
+        if follower_change > 0:
+            change_text = f"Gained {follower_change} followers since <t:{baseline_at}:R>."
+        elif follower_change < 0:
+            change_text = f"Lost {abs(follower_change)} followers since <t:{baseline_at}:R>."
+        else:
+            change_text = f"No change in follower count since <t:{baseline_at}:R>."
+
+    if username in CONFIG.monitored_usernames:
+        post_history = load_last_ig_post_shortcode(username)
+        story_history = load_last_ig_story(username)
+        last_post_time = f"<t:{post_history.latest_timestamp}:F>" if post_history.latest_timestamp else "No non-pinned posts found."
+        last_post_id = post_history.latest_id or "N/A"
+        last_story_time = f"<t:{story_history.latest_timestamp}:F>" if story_history.latest_timestamp else "No stories found."
+        last_story_id = story_history.latest_id or "N/A"
+    else:
+        # Posts and stories are only recorded for monitored users
+        last_post_time = last_story_time = "Not tracked"
+        last_post_id = last_story_id = "N/A"
+
+    embed = discord.Embed(
+        title=f"{username} | Instagram",
+        color=INSTAGRAM_EMBED_COLOR
+    )
+    embed.add_field(name="Full Name", value=snapshot.full_name or "N/A", inline=True)
+    embed.add_field(name="Followers", value=current_follower_count, inline=True)
+    embed.add_field(name="Following", value=snapshot.following_count, inline=True)
+    embed.add_field(name="Bio", value=snapshot.biography or "N/A", inline=False)
+    embed.add_field(name="Follower Change", value=change_text, inline=False)
+    embed.add_field(name="Last Post", value=last_post_time, inline=True)
+    embed.add_field(name="Last Story", value=last_story_time, inline=True)
+    embed.set_footer(text=f"Post: {last_post_id} | Story ID: {last_story_id}")
+    if snapshot.profile:
+        embed.set_thumbnail(url=f"attachment://{snapshot.profile.filename}")
+    return embed
+
+async def fetch_user_snapshot(username: str) -> UserSnapshot:
+    """Refresh a user snapshot with this process's Instagram sessions."""
+    await wait_for_sessions()
+    return await asyncio.to_thread(refresh_user_snapshot, username)
+
+async def refresh_user_snapshot_in_background(username: str, fetch_snapshot: Callable[[str], Awaitable[UserSnapshot]]) -> None:
+    """Refresh a stale user snapshot without making the caller wait for it."""
+    try:
+        await single_flight("userdetails", username, lambda: fetch_snapshot(username))
+        logging.debug(f"Background refresh of user snapshot for @{username} finished")
+    except Exception as e:
+        logging.error(f"Background refresh of user snapshot for @{username} failed: {e}")
 
-        profile_data, profile_filename, _ = download_profile_picture(user, username)
-
-        embed = discord.Embed(
-            title=f"{username} | Instagram",
-            color=0xC13584
-        )
-        embed.add_field(name="Full Name", value=user.full_name or "N/A", inline=True)
-        embed.add_field(name="Followers", value=current_follower_count, inline=True)
-        embed.add_field(name="Following", value=user.following_count, inline=True)
-        embed.add_field(name="Bio", value=user.biography or "N/A", inline=False)
-        embed.add_field(name="Follower Change", value=change_text, inline=False)
-        embed.add_field(name="Last Post", value=last_post_time, inline=True)
-        embed.add_field(name="Last Story", value=last_story_time, inline=True)
-        embed.set_footer(text=f"Post ID: {last_post_id} | Story ID: {last_story_id}")
+async def userdetails_instagram(username: str = "avamax", fetch_snapshot: Callable[[str], Awaitable[UserSnapshot]] = fetch_user_snapshot) -> Tuple[discord.Embed, Optional[discord.File]]:
+    """Fetch Instagram user details for the userdetails command from the user snapshot cache.
 
+    A missing snapshot is fetched (once for all concurrent callers); a snapshot older than
+    CONFIG.userdetails_ttl_seconds is served as is and refreshed in the background. fetch_snapshot
+    must leave the snapshot it returns in USER_SNAPSHOT_CACHE; the gateway passes one that
+    asks the poller process instead of logging into Instagram itself.
+    """
+    try:
+        snapshot = USER_SNAPSHOT_CACHE.get(username)
+        if snapshot is None:
+            snapshot = await single_flight("userdetails", username, lambda: fetch_snapshot(username))
+        elif time.time() - snapshot.timestamp > CONFIG.userdetails_ttl_seconds and ("userdetails", username) not in INFLIGHT_REQUESTS:
+            task = asyncio.create_task(refresh_user_snapshot_in_background(username, fetch_snapshot))
+            BACKGROUND_TASKS.add(task)
+            task.add_done_callback(BACKGROUND_TASKS.discard)
+        else:
+            logging.info(f"Using cached user snapshot for @{username}")
+        embed = build_userdetails_embed(username, snapshot)
         file = None
-        if profile_data and profile_filename:
-            file = discord.File(profile_data, filename=profile_filename)
-            embed.set_thumbnail(url=f"attachment://{profile_filename}")
-            logging.info(f"Embedding profile picture for @{username}: {profile_filename}")
-
+        if snapshot.profile:
+            file = discord.File(io.BytesIO(snapshot.profile.data), filename=snapshot.profile.filename)
+            logging.info(f"Embedding profile picture for @{username}: {snapshot.profile.filename}")
         logging.info(f"Prepared user details for @{username}")
         return embed, file
     except Exception as e:
         logging.error(f"Error fetching user details for @{username}: {e}")
         print(f"Error fetching user details for @{username}: {e}")
-        raise
\ No newline at end of file
+        raise
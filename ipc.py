@@ -0,0 +1,159 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+from item_codec import decode_value
+from records import ContentItem, UserSnapshot
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '.env'))
+POLLER_SOCKET = os.getenv("POLLER_SOCKET")  # Set to run the Instagram poller as a separate process (poller.py)
+POLLER_REQUEST_TIMEOUT = 900  # A poll downloads media and backs off on rate limits, so give it time
+USERDETAILS_REQUEST_TIMEOUT = 120
+IPC_READ_LIMIT = 16 * 1024 * 1024  # Messages carry metadata only, media go through the media store
+
+class PollerConnection:
+    """A connected poller process and the poll requests waiting for its answer."""
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.name = "poller"
+
+POLLER_CONNECTIONS: List[PollerConnection] = []
+_request_ids = itertools.count(1)
+_server: Optional[asyncio.AbstractServer] = None
+
+async def send_message(writer: asyncio.StreamWriter, message: Dict) -> None:
+    """Send one newline-delimited JSON message."""
+    writer.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+    await writer.drain()
+
+async def read_message(reader: asyncio.StreamReader) -> Optional[Dict]:
+    """Read one message, or None once the other side has gone away."""
+    line = await reader.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+async def handle_poller_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Track a poller from when it connects until it goes away, routing its answers to their requests."""
+    connection = PollerConnection(reader, writer)
+    POLLER_CONNECTIONS.append(connection)
+    try:
+        while True:
+            try:
+                message = await read_message(reader)
+            except (ConnectionError, ValueError) as e:
+                logging.warning(f"Dropping connection to {connection.name}: {e}")
+                break
+            if message is None:
+                break
+            if message.get("type") == "hello":
+                connection.name = message.get("name") or connection.name
+                logging.info(f"Poller {connection.name} connected")
+                print(f"Poller {connection.name} connected")
+            elif message.get("type") == "result":
+                future = connection.pending.pop(message.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+            else:
+                logging.warning(f"Ignoring unknown message from {connection.name}: {message.get('type')}")
+    finally:
+        POLLER_CONNECTIONS.remove(connection)
+        for future in connection.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"{connection.name} disconnected"))
+        writer.close()
+        logging.warning(f"Poller {connection.name} disconnected")
+        print(f"Poller {connection.name} disconnected")
+
+async def start_poller_server(path: str) -> asyncio.AbstractServer:
+    """Listen for poller processes on a Unix socket."""
+    global _server
+    if os.path.exists(path):
+        os.remove(path)  # Left behind by a previous run
+    _server = await asyncio.start_unix_server(handle_poller_connection, path, limit=IPC_READ_LIMIT)
+    logging.info(f"Waiting for poller processes on {path}")
+    return _server
+
+async def send_request(connection: PollerConnection, message: Dict, timeout: float) -> Dict:
+    """Send a request to one poller and wait for its answer."""
+    request_id = next(_request_ids)
+    future = asyncio.get_running_loop().create_future()
+    connection.pending[request_id] = future
+    try:
+        await send_message(connection.writer, {**message, "id": request_id})
+        result = await asyncio.wait_for(future, timeout=timeout)
+    finally:
+        connection.pending.pop(request_id, None)
+    if result.get("error"):
+        raise RuntimeError(f"{connection.name} failed to {message['type']}: {result['error']}")
+    return result
+
+async def poll_connection(connection: PollerConnection, usernames: List[str]) -> Dict:
+    """Send a poll request to one poller and wait for its answer."""
+    return await send_request(connection, {"type": "poll", "usernames": usernames}, POLLER_REQUEST_TIMEOUT)
+
+async def request_poll(usernames: List[str]) -> Tuple[List[ContentItem], List[ContentItem], Dict[str, Tuple[float, Set[str]]], Dict[str, UserSnapshot]]:
+    """Ask every connected poller to fetch its share of the given users and merge what they found.
+
+    Returns the new items, the newest posts that only need caching again (see
+    fetch_instagram_content), the story ids each user's latest poll returned and the
+    user snapshots the pollers took from the profiles they fetched. Media are
+    read back from the media store in a worker thread. Users whose poller died are
+    skipped until its leases lapse and another poller takes them over.
+    """
+    connections = list(POLLER_CONNECTIONS)
+    if not connections:
+        raise ConnectionError("No poller process is connected")
+    results = await asyncio.gather(*(poll_connection(connection, usernames) for connection in connections), return_exceptions=True)
+    content_items = []
+    latest_posts = []
+    fetched_story_ids = {}
+    snapshots = {}
+    polled = set()
+    seen = set()
+    errors = []
+    for connection, result in zip(connections, results):
+        if isinstance(result, BaseException):
+            logging.error(f"Poll through {connection.name} failed: {result}")
+            errors.append(result)
+            continue
+        logging.debug(f"{connection.name} polled {result.get('polled')}")
+        polled.update(result.get("polled", []))
+        for item in await asyncio.to_thread(decode_value, result.get("items", [])):
+            if (item.KIND, str(item.identifier)) not in seen:
+                seen.add((item.KIND, str(item.identifier)))
+                content_items.append(item)
+        latest_posts.extend(await asyncio.to_thread(decode_value, result.get("latest_posts", [])))
+        for username, (fetched_at, story_ids) in result.get("fetched_story_ids", {}).items():
+            fetched_story_ids[username] = (fetched_at, set(story_ids))
+        snapshots.update(await asyncio.to_thread(decode_value, result.get("snapshots", {})))
+    if len(errors) == len(results):
+        raise errors[0]
+    unpolled = [username for username in usernames if username not in polled]
+    if unpolled:
+        logging.warning(f"No poller holds the lease on {unpolled} yet, they are skipped this cycle")
+    return content_items, latest_posts, fetched_story_ids, snapshots
+
+async def request_user_snapshot(username: str) -> UserSnapshot:
+    """Have a poller fetch a user's profile for /userdetails, so the gateway never logs into Instagram itself.
+
+    Tries the connected pollers in turn and raises the last error if none of them succeeds.
+    """
+    connections = list(POLLER_CONNECTIONS)
+    if not connections:
+        raise ConnectionError("No poller process is connected")
+    error = None
+    for connection in connections:
+        try:
+            result = await send_request(connection, {"type": "userdetails", "username": username}, USERDETAILS_REQUEST_TIMEOUT)
+        except (ConnectionError, RuntimeError, asyncio.TimeoutError) as e:
+            logging.error(f"Fetching user details for @{username} through {connection.name} failed: {e}")
+            error = e
+            continue
+        return await asyncio.to_thread(decode_value, result["snapshot"])
+    raise error
@@ -0,0 +1,47 @@
+from dataclasses import fields
+from typing import Set
+from media_store import get_media, put_media
+from records import ContentItem, MediaHandle, PostItem, StoryItem, UserSnapshot
+
+ITEM_TYPES = {item_type.KIND: item_type for item_type in (PostItem, StoryItem)}
+
+def encode_value(value, referenced: Set[str]):
+    """Turn items, user snapshots and media into JSON, moving file bytes into the media store."""
+    if isinstance(value, MediaHandle):
+        if value.loaded:
+            value.key = put_media(value.data, value.key)
+        referenced.add(value.key)
+        return {"$media": value.key, "filename": value.filename}
+    if isinstance(value, ContentItem):
+        return {"$item": value.KIND, **{f.name: encode_value(getattr(value, f.name), referenced) for f in fields(value)}}
+    if isinstance(value, UserSnapshot):
+        return {"$snapshot": True, **{f.name: encode_value(getattr(value, f.name), referenced) for f in fields(value)}}
+    if isinstance(value, dict):
+        return {key: encode_value(item, referenced) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode_value(item, referenced) for item in value]
+    return value
+
+def decode_value(value, lazy_media: bool = False):
+    """Rebuild what encode_value wrote, reading file bytes back from the media store.
+
+    Media whose files are gone decode to None and are left out of lists. With lazy_media,
+    the media of items decode to key-only handles instead, for ContentCache.load_media to
+    read when they are needed; profile pictures are always read back.
+    """
+    if isinstance(value, list):
+        return [item for item in (decode_value(item, lazy_media) for item in value) if item is not None]
+    if not isinstance(value, dict):
+        return value
+    if "$media" in value:
+        data = get_media(value["$media"])
+        return MediaHandle(data, value["filename"], value["$media"]) if data is not None else None
+    if "$item" in value:
+        decoded = {key: decode_value(item) for key, item in value.items() if not key.startswith("$") and not (lazy_media and key == "media")}
+        if lazy_media:
+            decoded["media"] = [MediaHandle(None, media["filename"], media["$media"]) for media in value.get("media", [])]
+        return ITEM_TYPES[value["$item"]](**decoded)
+    decoded = {key: decode_value(item, lazy_media) for key, item in value.items() if not key.startswith("$")}
+    if "$snapshot" in value:
+        return UserSnapshot(**decoded)
+    return decoded
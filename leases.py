@@ -0,0 +1,77 @@
+import logging
+import math
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Iterator, List
+
+LEASE_DB_FILE = "poller_leases.db"
+LEASE_SECONDS = 60  # A poller that stopped renewing for this long is considered gone and its users move on
+LEASE_RENEW_INTERVAL = LEASE_SECONDS / 3
+
+def open_lease_db() -> sqlite3.Connection:
+    db = sqlite3.connect(LEASE_DB_FILE, timeout=30, isolation_level=None)
+    db.execute("CREATE TABLE IF NOT EXISTS pollers (name TEXT PRIMARY KEY, heartbeat_at REAL NOT NULL)")
+    db.execute("CREATE TABLE IF NOT EXISTS leases (username TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)")
+    return db
+
+@contextmanager
+def lease_transaction() -> Iterator[sqlite3.Connection]:
+    """Run statements in one write transaction, so pollers claiming at the same time take turns."""
+    db = open_lease_db()
+    try:
+        db.execute("BEGIN IMMEDIATE")
+        yield db
+        db.execute("COMMIT")
+    except BaseException:
+        if db.in_transaction:
+            db.execute("ROLLBACK")
+        raise
+    finally:
+        db.close()
+
+def claim_usernames(owner: str, usernames: List[str]) -> List[str]:
+    """Take this poller's fair share of the monitored users and return the ones it should poll.
+
+    Each live poller holds at most ceil(users / live pollers) leases: extras are given up
+    when another poller joins, and users whose poller stopped renewing are taken over.
+    """
+    now = time.time()
+    with lease_transaction() as db:
+        db.execute("INSERT INTO pollers (name, heartbeat_at) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET heartbeat_at = excluded.heartbeat_at", (owner, now))
+        db.execute("DELETE FROM pollers WHERE heartbeat_at <= ?", (now - LEASE_SECONDS,))
+        db.execute("DELETE FROM leases WHERE expires_at <= ? OR owner NOT IN (SELECT name FROM pollers)", (now,))
+        live_pollers = db.execute("SELECT COUNT(*) FROM pollers").fetchone()[0]
+        quota = math.ceil(len(usernames) / max(live_pollers, 1))
+        leases = dict(db.execute("SELECT username, owner FROM leases").fetchall())
+        mine = sorted(username for username in usernames if leases.get(username) == owner)
+        for username in mine[quota:]:
+            db.execute("DELETE FROM leases WHERE username = ? AND owner = ?", (username, owner))
+            logging.info(f"Gave up the lease on @{username} to rebalance across {live_pollers} pollers")
+        mine = mine[:quota]
+        for username in sorted(usernames):
+            if len(mine) >= quota:
+                break
+            if username not in leases:
+                mine.append(username)
+                logging.info(f"Took the lease on @{username}")
+        db.executemany(
+            "INSERT INTO leases (username, owner, expires_at) VALUES (?, ?, ?) ON CONFLICT(username) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at",
+            [(username, owner, now + LEASE_SECONDS) for username in mine]
+        )
+    return sorted(mine)
+
+def renew_leases(owner: str) -> int:
+    """Keep this poller alive and its leases held between polls; returns how many it holds."""
+    now = time.time()
+    with lease_transaction() as db:
+        db.execute("INSERT INTO pollers (name, heartbeat_at) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET heartbeat_at = excluded.heartbeat_at", (owner, now))
+        renewed = db.execute("UPDATE leases SET expires_at = ? WHERE owner = ?", (now + LEASE_SECONDS, owner)).rowcount
+    return renewed
+
+def release_leases(owner: str) -> None:
+    """Hand this poller's users back straight away, on a clean shutdown."""
+    with lease_transaction() as db:
+        db.execute("DELETE FROM leases WHERE owner = ?", (owner,))
+        db.execute("DELETE FROM pollers WHERE name = ?", (owner,))
+    logging.info(f"Released the leases of {owner}")
@@ -0,0 +1,56 @@
+import hashlib
+import logging
+import os
+import time
+from typing import Optional, Set
+
+MEDIA_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "media_store")
+MEDIA_STORE_RETENTION_SECONDS = 2 * 86400  # Unreferenced files are kept at least this long
+
+def media_key(data: bytes) -> str:
+    """Return the content address of a file."""
+    return hashlib.sha256(data).hexdigest()
+
+def media_path(key: str) -> str:
+    return os.path.join(MEDIA_STORE_DIR, key)
+
+def put_media(data: bytes, key: Optional[str] = None) -> str:
+    """Store a file by content address (once) and return its key."""
+    key = key or media_key(data)
+    path = media_path(key)
+    if not os.path.exists(path):
+        os.makedirs(MEDIA_STORE_DIR, exist_ok=True)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(data)
+        os.replace(f"{path}.tmp", path)
+        logging.debug(f"Stored {len(data)} bytes in the media store as {key}")
+    return key
+
+def get_media(key: str) -> Optional[bytes]:
+    """Read a stored file back, or None if it is gone."""
+    try:
+        with open(media_path(key), "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        logging.warning(f"Media {key} is missing from the media store")
+        return None
+
+def prune_media_store(referenced: Set[str]) -> int:
+    """Delete stored files nothing references any more once they are past the retention period."""
+    removed = 0
+    cutoff = time.time() - MEDIA_STORE_RETENTION_SECONDS
+    try:
+        entries = list(os.scandir(MEDIA_STORE_DIR))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        if entry.name in referenced or entry.stat().st_mtime > cutoff:
+            continue
+        try:
+            os.remove(entry.path)
+            removed += 1
+        except OSError as e:
+            logging.warning(f"Could not remove {entry.name} from the media store: {e}")
+    if removed:
+        logging.info(f"Pruned {removed} unreferenced files from the media store")
+    return removed
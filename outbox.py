@@ -0,0 +1,142 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Set, Tuple
+from content_cache import read_media
+from item_codec import decode_value, encode_value
+from records import ContentItem, MediaHandle
+
+OUTBOX_FILE = "outbox.json"
+OUTBOX_MAX_AGE_SECONDS = 86400  # Items Discord still hasn't accepted after this long are given up on
+
+@dataclass(slots=True)
+class OutboxEntry:
+    """An item waiting to be sent to a channel, kept until Discord accepted every message of it."""
+    channel_id: int
+    item: ContentItem
+    enqueued_at: float
+    parts_sent: List[int] = field(default_factory=list)  # Indices of the rendered messages already sent
+    parts: Optional[List[List[str]]] = None  # Media filenames of each message, fixed when first queued so parts_sent stays meaningful
+
+    @property
+    def key(self) -> Tuple[int, str, str]:
+        return (self.channel_id, self.item.KIND, str(self.item.identifier))
+
+# (channel id, kind, identifier) -> entry, mirrored to OUTBOX_FILE with media in the media store
+OUTBOX: Dict[Tuple[int, str, str], OutboxEntry] = {}
+OUTBOX_MEDIA_KEYS: Set[str] = set()  # Media store keys the persisted outbox refers to
+_dirty = False
+_flush_task: Optional[asyncio.Task] = None
+
+def write_outbox_file(entries: List[OutboxEntry]) -> Set[str]:
+    """Persist the outbox and return the media store keys it refers to."""
+    referenced = set()
+    data = [
+        {"channel_id": entry.channel_id, "item": encode_value(entry.item, referenced), "enqueued_at": entry.enqueued_at, "parts_sent": entry.parts_sent, "parts": entry.parts}
+        for entry in entries
+    ]
+    with open(f"{OUTBOX_FILE}.tmp", "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(f"{OUTBOX_FILE}.tmp", OUTBOX_FILE)
+    return referenced
+
+def load_outbox() -> List[OutboxEntry]:
+    """Load the outbox left by the previous run, dropping entries that are too old to send."""
+    try:
+        with open(OUTBOX_FILE, "r") as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        logging.debug(f"No outbox to resume: {e}")
+        return []
+    now = time.time()
+    for raw in data:
+        try:
+            entry = OutboxEntry(int(raw["channel_id"]), decode_value(raw["item"]), float(raw["enqueued_at"]), list(raw.get("parts_sent", [])), raw.get("parts"))
+        except (KeyError, TypeError, ValueError) as e:
+            logging.warning(f"Skipping unreadable outbox entry: {e}")
+            continue
+        if now - entry.enqueued_at > OUTBOX_MAX_AGE_SECONDS:
+            logging.warning(f"Dropping {entry.item.KIND} {entry.item.identifier} for channel {entry.channel_id} from the outbox, it couldn't be sent for {now - entry.enqueued_at:.0f}s")
+            continue
+        OUTBOX.setdefault(entry.key, entry)
+        OUTBOX_MEDIA_KEYS.update(media.key for media in entry.item.media if media.key)
+    logging.info(f"Loaded {len(OUTBOX)} undelivered items from the outbox")
+    return list(OUTBOX.values())
+
+async def flush_outbox() -> None:
+    """Write the outbox until it is on disk as it is now, coalescing changes made meanwhile."""
+    global _dirty
+    while _dirty:
+        _dirty = False
+        try:
+            referenced = await asyncio.to_thread(write_outbox_file, list(OUTBOX.values()))
+            OUTBOX_MEDIA_KEYS.clear()
+            OUTBOX_MEDIA_KEYS.update(referenced)
+        except Exception as e:
+            logging.error(f"Error saving outbox: {e}")
+            print(f"Error saving outbox: {e}")
+            return
+
+def schedule_persist_outbox() -> asyncio.Task:
+    """Persist the outbox in the background, for callbacks that can't wait."""
+    global _dirty, _flush_task
+    _dirty = True
+    if _flush_task is None or _flush_task.done():
+        _flush_task = asyncio.create_task(flush_outbox())
+    return _flush_task
+
+async def persist_outbox() -> None:
+    """Mark the outbox changed and wait until the change is on disk."""
+    await asyncio.shield(schedule_persist_outbox())
+
+def add_to_outbox(channel_id: int, content_items: List[ContentItem]) -> List[OutboxEntry]:
+    """Add items for a channel to the outbox (keeping entries already waiting) and return their entries.
+
+    Call persist_outbox afterwards to wait until they are durable.
+    """
+    entries = []
+    now = time.time()
+    for item in content_items:
+        entry = OutboxEntry(channel_id, item, now)
+        entries.append(OUTBOX.setdefault(entry.key, entry))
+    return entries
+
+def mark_part_sent(entry: OutboxEntry, part: int, part_count: int) -> None:
+    """Record that Discord accepted one message of an entry, removing the entry once all of them went out."""
+    if part not in entry.parts_sent:
+        entry.parts_sent.append(part)
+    if len(entry.parts_sent) >= part_count and OUTBOX.get(entry.key) is entry:
+        del OUTBOX[entry.key]
+    schedule_persist_outbox()
+
+def expired_outbox_entries() -> List[OutboxEntry]:
+    """Remove and return the entries that have waited longer than OUTBOX_MAX_AGE_SECONDS."""
+    now = time.time()
+    expired = [entry for entry in OUTBOX.values() if now - entry.enqueued_at > OUTBOX_MAX_AGE_SECONDS]
+    for entry in expired:
+        del OUTBOX[entry.key]
+    if expired:
+        schedule_persist_outbox()
+    return expired
+
+async def load_entry_media(entry: OutboxEntry) -> ContentItem:
+    """Return the entry's item with its media in memory, reading released files back from the media store.
+
+    The cached item is left alone; files that are gone from the store are left out.
+    """
+    if all(media.loaded for media in entry.item.media):
+        return entry.item
+    handles = list(entry.item.media)
+    stored = [handle for handle in handles if not handle.loaded]
+    data = dict(zip(map(id, stored), await asyncio.to_thread(read_media, stored)))
+    media = []
+    for handle in handles:
+        value = handle.data if handle.loaded else data[id(handle)]
+        if value is None:
+            logging.warning(f"Media {handle.filename} of {entry.item.KIND} {entry.item.identifier} is gone from the media store, sending without it")
+            continue
+        media.append(MediaHandle(value, handle.filename, handle.key))
+    return replace(entry.item, media=media)
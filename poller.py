@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import os
+import socket
+from typing import Dict, List
+
+# Configured before importing the bot's modules so the poller logs to its own file
+logging.basicConfig(filename="poller.log", level=logging.DEBUG, format="%(asctime)s:%(levelname)s:%(message)s")
+
+from config import CONFIG_WATCH_INTERVAL, load_config, reload_config_if_changed
+from instagram import INSTAGRAM_POST_CACHE, INSTAGRAM_STORY_CACHE, LAST_FETCHED_STORY_IDS, USER_SNAPSHOT_CACHE, configure_content_caches, fetch_instagram_content, fetch_user_snapshot, single_flight
+from ipc import IPC_READ_LIMIT, POLLER_SOCKET, read_message, send_message
+from item_codec import encode_value
+from leases import LEASE_RENEW_INTERVAL, claim_usernames, release_leases, renew_leases
+from records import ContentItem, PostItem
+from sessions import start_sessions
+
+POLLER_NAME = os.getenv("POLLER_NAME") or f"{socket.gethostname()}:{os.getpid()}"
+POLLER_RECONNECT_SECONDS = 5
+GATEWAY_CONNECTED = asyncio.Event()  # Leases are only renewed while the gateway can actually ask for polls
+
+async def poll(usernames: List[str]) -> Dict:
+    """Fetch this poller's share of the given users and build the result message, with media moved to the media store."""
+    usernames = await asyncio.to_thread(claim_usernames, POLLER_NAME, usernames)
+    logging.info(f"Polling {usernames} as {POLLER_NAME}")
+    content_items, latest_posts = await fetch_instagram_content(usernames=usernames) if usernames else ([], [])
+    encoded = await asyncio.to_thread(encode_value, content_items, set())
+    encoded_latest = await asyncio.to_thread(encode_value, latest_posts, set())
+    fetched_story_ids = {
+        username: [LAST_FETCHED_STORY_IDS[username][0], sorted(LAST_FETCHED_STORY_IDS[username][1])]
+        for username in usernames if username in LAST_FETCHED_STORY_IDS
+    }
+    snapshots = await asyncio.to_thread(encode_value, {username: snapshot for username in usernames if (snapshot := USER_SNAPSHOT_CACHE.get(username))}, set())
+    await release_media(content_items + latest_posts)
+    return {"type": "result", "items": encoded, "latest_posts": encoded_latest, "fetched_story_ids": fetched_story_ids, "snapshots": snapshots, "polled": usernames}
+
+async def userdetails(username: str) -> Dict:
+    """Fetch a user's profile for the gateway's /userdetails."""
+    snapshot = await single_flight("userdetails", username, lambda: fetch_user_snapshot(username))
+    return {"type": "result", "snapshot": await asyncio.to_thread(encode_value, snapshot, set())}
+
+async def release_media(content_items: List[ContentItem]) -> None:
+    """Drop the media of handed-over items from this process's caches; the gateway sends them."""
+    for item in content_items:
+        await (INSTAGRAM_POST_CACHE if isinstance(item, PostItem) else INSTAGRAM_STORY_CACHE).release_media(item)
+
+async def keep_leases() -> None:
+    """Renew this poller's leases between polls, so they only lapse if the process dies or loses the gateway."""
+    while True:
+        await asyncio.sleep(LEASE_RENEW_INTERVAL)
+        if not GATEWAY_CONNECTED.is_set():
+            continue
+        try:
+            await asyncio.to_thread(renew_leases, POLLER_NAME)
+        except Exception as e:
+            logging.error(f"Error renewing leases of {POLLER_NAME}: {e}")
+
+async def watch_config() -> None:
+    """Pick up edits to the config file, like the bot does."""
+    while True:
+        await asyncio.sleep(CONFIG_WATCH_INTERVAL)
+        if reload_config_if_changed():
+            configure_content_caches()
+
+async def answer_request(writer: asyncio.StreamWriter, message: Dict) -> None:
+    """Run one request from the gateway and send back its result, or the error it failed with."""
+    try:
+        if message["type"] == "poll":
+            result = await poll(message["usernames"])
+        else:
+            result = await userdetails(message["username"])
+    except Exception as e:
+        logging.error(f"Error answering {message['type']} request {message['id']} from the gateway: {e}")
+        print(f"Error answering {message['type']} request {message['id']} from the gateway: {e}")
+        result = {"type": "result", "error": str(e)}
+    result["id"] = message["id"]
+    try:
+        await send_message(writer, result)
+    except ConnectionError as e:
+        logging.warning(f"Could not answer {message['type']} request {message['id']}, the gateway went away: {e}")
+
+async def serve_gateway(path: str) -> None:
+    """Answer the gateway's requests until the connection drops, then give up this poller's leases.
+
+    Each request runs in its own task, so a /userdetails lookup does not wait for a poll;
+    the gateway itself only sends one poll at a time.
+    """
+    reader, writer = await asyncio.open_unix_connection(path, limit=IPC_READ_LIMIT)
+    requests = set()
+    try:
+        await send_message(writer, {"type": "hello", "name": POLLER_NAME})
+        GATEWAY_CONNECTED.set()
+        logging.info(f"Connected to the gateway on {path} as {POLLER_NAME}")
+        print(f"Connected to the gateway on {path} as {POLLER_NAME}")
+        while True:
+            message = await read_message(reader)
+            if message is None:
+                return
+            if message.get("type") not in ("poll", "userdetails"):
+                logging.warning(f"Ignoring unknown message from the gateway: {message.get('type')}")
+                continue
+            task = asyncio.create_task(answer_request(writer, message))
+            requests.add(task)
+            task.add_done_callback(requests.discard)
+    finally:
+        for task in requests:
+            task.cancel()
+        writer.close()
+        if GATEWAY_CONNECTED.is_set():
+            # Hand the users over straight away, a poller that is still connected may be able to poll them
+            GATEWAY_CONNECTED.clear()
+            await asyncio.to_thread(release_leases, POLLER_NAME)
+
+async def main() -> None:
+    """Run the Instagram poller, reconnecting to the gateway whenever it restarts.
+
+    Several pollers can run side by side, each with its own Instagram accounts
+    (INSTAGRAM_ACCOUNT_NUMBERS); they split the monitored users between them through leases.
+    """
+    if not POLLER_SOCKET:
+        raise SystemExit("Set POLLER_SOCKET in .env to the socket the bot listens on")
+    load_config()
+    configure_content_caches()
+    start_sessions()
+    lease_task = asyncio.create_task(keep_leases())
+    config_task = asyncio.create_task(watch_config())
+    try:
+        while True:
+            try:
+                await serve_gateway(POLLER_SOCKET)
+                logging.warning("Gateway closed the connection")
+            except (ConnectionError, FileNotFoundError, OSError, ValueError) as e:
+                logging.warning(f"Could not reach the gateway on {POLLER_SOCKET}: {e}")
+            await asyncio.sleep(POLLER_RECONNECT_SECONDS)
+    finally:
+        lease_task.cancel()
+        config_task.cancel()
+        await asyncio.to_thread(release_leases, POLLER_NAME)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+from dataclasses import dataclass, field, fields
+from typing import ClassVar, Dict, List, Optional, Type
+
+@dataclass(slots=True)
+class MediaHandle:
+    """A downloaded file (media or profile picture) kept as raw bytes.
+
+    data is None once the bytes were released to the media store; they are read
+    back from there by key.
+    """
+    data: Optional[bytes]
+    filename: str
+    key: Optional[str] = None  # media store address, once it has been stored
+
+    @property
+    def size(self) -> int:
+        return len(self.data) if self.data is not None else 0
+
+    @property
+    def loaded(self) -> bool:
+        return self.data is not None
+
+@dataclass(slots=True, kw_only=True)
+class ContentItem:
+    """A new post or story fetched from Instagram, ready to be announced."""
+    KIND: ClassVar[str] = ""
+    KEY: ClassVar[str] = ""
+    username: str
+    media_pk: int
+    url: str
+    text: str
+    timestamp: int
+    media: List[MediaHandle] = field(default_factory=list)
+    profile: Optional[MediaHandle] = None
+
+    @property
+    def identifier(self) -> str:
+        return getattr(self, self.KEY)
+
+@dataclass(slots=True, kw_only=True)
+class PostItem(ContentItem):
+    KIND: ClassVar[str] = "post"
+    KEY: ClassVar[str] = "shortcode"
+    shortcode: str
+    like_count: Optional[int] = None
+    comment_count: Optional[int] = None
+
+@dataclass(slots=True, kw_only=True)
+class StoryItem(ContentItem):
+    KIND: ClassVar[str] = "story"
+    KEY: ClassVar[str] = "story_id"
+    story_id: str
+
+@dataclass(slots=True, kw_only=True)
+class HistoryRecord:
+    """A post or story as stored in a user's history file."""
+    KEY: ClassVar[str] = ""
+    channel_ids: List[str] = field(default_factory=list)
+    message_ids: Dict[str, str] = field(default_factory=dict)  # channel id -> message id
+    timestamp: int = 0
+    notices_applied: List[str] = field(default_factory=list)  # channels already showing the deleted/expired notice
+
+    @property
+    def identifier(self) -> str:
+        return getattr(self, self.KEY)
+
+    def to_dict(self) -> Dict:
+        data = {self.KEY: self.identifier}
+        data.update((f.name, getattr(self, f.name)) for f in fields(self) if f.name != self.KEY)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "HistoryRecord":
+        return cls(**{f.name: data[f.name] for f in fields(cls) if f.name in data})
+
+@dataclass(slots=True, kw_only=True)
+class PostRecord(HistoryRecord):
+    KEY: ClassVar[str] = "shortcode"
+    shortcode: str
+    marked_deleted: bool = False
+    deleted_at: Optional[int] = None
+    like_count: Optional[int] = None
+    comment_count: Optional[int] = None
+
+@dataclass(slots=True, kw_only=True)
+class StoryRecord(HistoryRecord):
+    KEY: ClassVar[str] = "story_id"
+    story_id: str
+    expired: bool = False
+    expired_at: Optional[int] = None
+
+@dataclass(slots=True)
+class History:
+    """A user's post or story history, keyed by shortcode / story id in insertion order."""
+    entries: Dict[str, HistoryRecord] = field(default_factory=dict)
+    latest_id: Optional[str] = None
+    latest_timestamp: int = 0
+
+    def to_dict(self, entries_key: str, latest_key: str, record_type: Type[HistoryRecord]) -> Dict:
+        """Serialize into the on-disk layout ({latest_key: {...}, entries_key: [...]})."""
+        latest = {record_type.KEY: self.latest_id, "timestamp": self.latest_timestamp} if self.latest_id is not None else {}
+        return {latest_key: latest, entries_key: [entry.to_dict() for entry in self.entries.values()]}
+
+    @classmethod
+    def from_dict(cls, data: Dict, entries_key: str, latest_key: str, record_type: Type[HistoryRecord]) -> "History":
+        entries = {}
+        for entry in data.get(entries_key, []):
+            record = record_type.from_dict(entry)
+            entries[str(record.identifier)] = record
+        latest = data.get(latest_key) or {}
+        return cls(entries, latest.get(record_type.KEY), latest.get("timestamp") or 0)
+
+@dataclass(slots=True)
+class UserSnapshot:
+    """The profile fields /userdetails shows for a user."""
+    full_name: Optional[str]
+    follower_count: Optional[int]
+    following_count: Optional[int]
+    biography: Optional[str]
+    profile_pic_url: str
+    profile: Optional[MediaHandle]
+    timestamp: float
@@ -0,0 +1,211 @@
+import discord
+import collections
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, OrderedDict, Set, Tuple
+from assets import INSTAGRAM_LOGO, get_asset
+from delivery import DISCORD_MAX_FILES_PER_MESSAGE, plan_attachment_packing
+from records import ContentItem, PostItem, PostRecord, StoryRecord
+from story_expiry import STORY_EXPIRATION_HOURS
+
+INSTAGRAM_EMBED_COLOR = 0xC13584
+DELETED_POST_NOTICE = "**Deleted Post**: This post has been deleted."
+EXPIRED_STORY_NOTICE = "**Expired Story**: This story has expired."
+RENDER_CACHE_SIZE = 64
+
+@dataclass(slots=True)
+class RenderedItem:
+    """The embeds, files and link buttons of one message announcing a content item."""
+    embeds: List[discord.Embed]
+    files: List[Tuple[bytes, str]]
+    buttons: List[Tuple[str, str]]
+    media_filenames: List[str]  # The item's media in this message, to render the same split again (see render_item)
+
+# (kind, identifier) -> (item, logo reference, upload limit, render); lets a fan-out render each item once
+RENDER_CACHE: OrderedDict[Tuple[str, str], Tuple[ContentItem, Optional[str], int, List[RenderedItem]]] = collections.OrderedDict()
+
+def format_discord_timestamp(value: Optional[int], identifier: str, label: str, fallback: str = "Unknown") -> str:
+    """Convert a stored epoch timestamp into a Discord timestamp token."""
+    if value and isinstance(value, int):
+        return f"<t:{value}:F>"
+    logging.warning(f"{label} is missing or not an epoch timestamp for {identifier}: {value}")
+    return fallback
+
+@lru_cache(maxsize=256)
+def embed_template(username: str, icon_url: Optional[str]) -> Dict:
+    """Return the static part (colour and author block) shared by every embed for a user."""
+    author = {"name": f"@{username} | Instagram"}
+    if icon_url:
+        author["icon_url"] = icon_url
+    return {"type": "rich", "color": INSTAGRAM_EMBED_COLOR, "author": author}
+
+def new_embed(username: str, icon_url: Optional[str], title: str, description: Optional[str], fields: List[Dict], thumbnail: Optional[str] = None) -> discord.Embed:
+    """Build an embed from the user's cached template plus the per-item parts."""
+    template = embed_template(username, icon_url)
+    data = {**template, "author": dict(template["author"]), "title": title, "fields": [dict(field) for field in fields]}
+    if description:
+        data["description"] = description
+    if thumbnail:
+        data["thumbnail"] = {"url": f"attachment://{thumbnail}"}
+    return discord.Embed.from_dict(data)
+
+def item_fields(item: ContentItem) -> List[Dict]:
+    """Compute the fields of a new post or story embed."""
+    posted_at = format_discord_timestamp(item.timestamp, item.identifier, "posted_at")
+    if isinstance(item, PostItem):
+        return [
+            {"name": "Post ID", "value": str(item.media_pk), "inline": True},
+            {"name": "Shortcode", "value": item.shortcode, "inline": True},
+            {"name": "Posted At", "value": posted_at, "inline": True},
+            {"name": "Likes", "value": str(item.like_count if item.like_count is not None else "Unknown"), "inline": True},
+            {"name": "Comments", "value": str(item.comment_count if item.comment_count is not None else "Unknown"), "inline": True},
+        ]
+    expires_at = format_discord_timestamp(item.timestamp + STORY_EXPIRATION_HOURS * 3600 if item.timestamp else None, item.identifier, "expires_at")
+    return [
+        {"name": "Story ID", "value": item.identifier, "inline": True},
+        {"name": "Posted At", "value": posted_at, "inline": True},
+        {"name": "Expires At", "value": expires_at, "inline": True},
+    ]
+
+def build_rendered_item(
+    item: ContentItem,
+    icon_url: Optional[str],
+    logo_file: Optional[Tuple[bytes, str]],
+    upload_limit: int,
+    plan: Optional[List[List[str]]] = None
+) -> List[RenderedItem]:
+    """Render a new post or story into messages with one embed per media file.
+
+    Carousels that don't fit one message's file count or upload limit are packed into as
+    few messages as possible; the logo and profile picture go once into each of them and
+    the link button into the first. A plan (the media filenames of each message) renders
+    that split instead; later messages whose media are all gone come out empty.
+    """
+    content_type = item.KIND
+    for idx, media in enumerate(item.media):
+        logging.debug(f"Processing {content_type} media {idx+1} for {item.url}: {media.filename}, size: {media.size} bytes")
+    shared_files = [logo_file] if logo_file else []
+    if item.profile:
+        shared_files.append((item.profile.data, item.profile.filename))
+    if plan is not None:
+        index_by_filename = {media.filename: idx for idx, media in enumerate(item.media)}
+        messages = [[index_by_filename[filename] for filename in filenames if filename in index_by_filename] for filenames in plan]
+        if logo_file and not fits_next_to(messages, item, shared_files, upload_limit):
+            logging.info(f"Leaving the logo out of resumed {content_type} {item.identifier}, its messages were split without room for it")
+            shared_files.remove(logo_file)
+            icon_url = None
+    else:
+        messages = plan_attachment_packing([media.size for media in item.media], sum(len(data) for data, _ in shared_files), len(shared_files), upload_limit)
+    if not messages:
+        logging.warning(f"No media available for Instagram {content_type} {item.identifier}")
+        messages = [[]]
+    elif len(messages) > 1:
+        logging.info(f"Splitting Instagram {content_type} {item.identifier} with {len(item.media)} media across {len(messages)} messages")
+
+    fields = item_fields(item)
+    thumbnail = item.profile.filename if item.profile else None
+    rendered = []
+    for message_idx, media_indices in enumerate(messages):
+        if plan is not None and message_idx > 0 and not media_indices:
+            rendered.append(RenderedItem([], [], [], []))
+            continue
+        embeds = []
+        for idx in media_indices or [0]:
+            title = f"New Instagram {content_type.capitalize()}{' (Media ' + str(idx+1) + ')' if idx > 0 else ''}"
+            if content_type == "story":
+                description = ""
+            elif idx == 0:
+                description = item.text
+            else:
+                description = f"Additional media {idx+1} for {content_type}"
+            embeds.append(new_embed(item.username, icon_url, title, description, fields, thumbnail))
+        files = shared_files + [(item.media[idx].data, item.media[idx].filename) for idx in media_indices]
+        buttons = [(f"View {content_type.capitalize()}", item.url)] if message_idx == 0 else []
+        rendered.append(RenderedItem(embeds, files, buttons, [item.media[idx].filename for idx in media_indices]))
+    return rendered
+
+def fits_next_to(messages: List[List[int]], item: ContentItem, shared_files: List[Tuple[bytes, str]], upload_limit: int) -> bool:
+    """Check that every message of a split stays within Discord's file count and upload limit next to the shared files."""
+    shared_size = sum(len(data) for data, _ in shared_files)
+    return all(
+        len(media_indices) + len(shared_files) <= DISCORD_MAX_FILES_PER_MESSAGE
+        and shared_size + sum(item.media[idx].size for idx in media_indices) <= upload_limit
+        for media_indices in messages
+    )
+
+def render_item(item: ContentItem, upload_limit: int, plan: Optional[List[List[str]]] = None) -> List[RenderedItem]:
+    """Render an item, reusing the render when the same item goes out to several channels.
+
+    The logo is linked from its hosted copy when Discord already has one, and only
+    attached otherwise, which changes how a carousel splits; pass the plan of an earlier
+    render (its media_filenames) to keep the same messages. The returned embeds are
+    shared between deliveries and must not be modified.
+    """
+    icon_url, logo_file = get_asset(INSTAGRAM_LOGO).reference()
+    key = (item.KIND, item.identifier)
+    cached = RENDER_CACHE.get(key)
+    if (
+        cached and cached[0] is item and cached[1] == icon_url and cached[2] == upload_limit
+        and (plan is None or plan == [rendered.media_filenames for rendered in cached[3]])
+    ):
+        RENDER_CACHE.move_to_end(key)
+        return cached[3]
+    rendered = build_rendered_item(item, icon_url, logo_file, upload_limit, plan)
+    RENDER_CACHE[key] = (item, icon_url, upload_limit, rendered)
+    while len(RENDER_CACHE) > RENDER_CACHE_SIZE:
+        RENDER_CACHE.popitem(last=False)
+    return rendered
+
+def forget_rendered_item(item: ContentItem) -> None:
+    """Drop an item's cached render, and the file bytes it holds, once nothing will send it again."""
+    key = (item.KIND, item.identifier)
+    cached = RENDER_CACHE.get(key)
+    if cached and cached[0] is item:
+        del RENDER_CACHE[key]
+
+def set_attachment_refs(embed: discord.Embed, username: str, attachment_names: Set[str]) -> None:
+    """Point an edited embed's author icon and thumbnail at the attachments its message still has."""
+    if INSTAGRAM_LOGO in attachment_names:
+        icon_url = f"attachment://{INSTAGRAM_LOGO}"
+    else:
+        icon_url, logo_file = get_asset(INSTAGRAM_LOGO).reference()
+        if logo_file:
+            icon_url = None  # Edits never upload new files
+    author = embed_template(username, icon_url)["author"]
+    embed.set_author(name=author["name"], icon_url=author.get("icon_url"))
+    profile_filename = f"profile_{username}.jpg"
+    if profile_filename in attachment_names:
+        embed.set_thumbnail(url=f"attachment://{profile_filename}")
+
+def render_deleted_post_notice(
+    embed: Optional[discord.Embed],
+    entry: PostRecord,
+    message_id: Optional[str],
+    deleted_at: int,
+    like_count,
+    comment_count
+) -> discord.Embed:
+    """Turn a post's embed (or a fresh one) into its deletion notice."""
+    if embed is None:
+        embed = discord.Embed(title="Deleted Instagram Post", color=INSTAGRAM_EMBED_COLOR)
+    embed.description = f"{embed.description or 'No caption'}\n\n{DELETED_POST_NOTICE}"
+    embed.clear_fields()
+    embed.add_field(name="Post ID", value=message_id or "N/A", inline=True)
+    embed.add_field(name="Shortcode", value=entry.shortcode, inline=True)
+    embed.add_field(name="Posted At", value=format_discord_timestamp(entry.timestamp, entry.shortcode, "posted_at"), inline=True)
+    embed.add_field(name="Deleted At", value=format_discord_timestamp(deleted_at, entry.shortcode, "deleted_at"), inline=True)
+    embed.add_field(name="Likes", value=like_count, inline=True)
+    embed.add_field(name="Comments", value=comment_count, inline=True)
+    return embed
+
+def render_expired_story_notice(embed: Optional[discord.Embed], entry: StoryRecord, expired_at: int) -> discord.Embed:
+    """Turn a story's embed (or a fresh one) into its expiry notice."""
+    if embed is None:
+        embed = discord.Embed(title="Expired Instagram Story", color=INSTAGRAM_EMBED_COLOR)
+    embed.description = EXPIRED_STORY_NOTICE
+    embed.clear_fields()
+    embed.add_field(name="Story ID", value=entry.story_id, inline=True)
+    embed.add_field(name="Posted At", value=format_discord_timestamp(entry.timestamp, f"story {entry.story_id}", "posted_at"), inline=True)
+    embed.add_field(name="Expired At", value=format_discord_timestamp(expired_at, f"story {entry.story_id}", "expired_at"), inline=True)
+    return embed
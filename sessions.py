@@ -0,0 +1,219 @@
+import instagrapi
+from instagrapi.exceptions import LoginRequired
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+SESSION_LOGIN_RETRY_SECONDS = 600  # How long an account that failed to log in is skipped
+SESSION_MAINTENANCE_INTERVAL = 300  # How often used sessions are checkpointed to disk
+SESSION_VALIDATE_SECONDS = 6 * 3600  # Sessions not checked for this long are validated in the background
+
+@dataclass(slots=True)
+class AccountSession:
+    """An Instagram account and its client, which is created lazily."""
+    username: str
+    password: str
+    session_file: str
+    client: Optional[instagrapi.Client] = None
+    login_failed_at: float = 0.0
+    invalid: bool = False  # Instagram rejected the session, skip it until it's re-established
+    validated_at: float = 0.0
+    used_at: float = 0.0
+    checkpointed_at: float = 0.0
+    settings_digest: Optional[str] = None
+    lock: threading.RLock = field(default_factory=threading.RLock)  # Held while a thread uses the client, instagrapi clients aren't thread-safe
+
+SESSIONS: List[AccountSession] = []
+_rotation: Optional[Iterator[int]] = None
+_startup_task: Optional[asyncio.Task] = None
+_maintenance_task: Optional[asyncio.Task] = None
+_maintenance_wakeup: Optional[asyncio.Event] = None
+_maintenance_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def configure_sessions(accounts: List[Dict]) -> None:
+    """Register the accounts to rotate through; nothing is loaded until start_sessions."""
+    global _rotation
+    SESSIONS[:] = [AccountSession(account["username"], account["password"], account["session_file"]) for account in accounts]
+    _rotation = itertools.cycle(range(len(SESSIONS)))
+
+def settings_digest(settings: Dict) -> str:
+    """Fingerprint session settings so unchanged sessions aren't rewritten."""
+    return hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode()).hexdigest()
+
+def checkpoint_session(session: AccountSession) -> bool:
+    """Save an account's session if Instagram rotated anything since it was last saved."""
+    if session.client is None:
+        return False
+    settings = session.client.get_settings()
+    digest = settings_digest(settings)
+    session.checkpointed_at = time.time()
+    if digest == session.settings_digest:
+        return False
+    with open(f"{session.session_file}.tmp", 'w') as f:
+        json.dump(settings, f)
+    os.replace(f"{session.session_file}.tmp", session.session_file)
+    session.settings_digest = digest
+    logging.debug(f"Checkpointed Instagram session for {session.username} to {session.session_file}")
+    return True
+
+def load_session(session: AccountSession) -> bool:
+    """Load an account's saved session from disk without contacting Instagram.
+
+    Returns whether a session was loaded; accounts without one log in on first use.
+    """
+    if not os.path.exists(session.session_file):
+        return False
+    try:
+        client = instagrapi.Client()
+        client.load_settings(session.session_file)
+        session.settings_digest = settings_digest(client.get_settings())
+        session.validated_at = os.path.getmtime(session.session_file)
+        session.client = client
+        logging.info(f"Loaded Instagram session for {session.username} from {session.session_file}")
+        return True
+    except Exception as e:
+        logging.warning(f"Could not load Instagram session for {session.username} from {session.session_file}, logging in on first use: {e}")
+        return False
+
+def login_session(session: AccountSession) -> instagrapi.Client:
+    """Log an account in (again, if its session was rejected) and save its session."""
+    with session.lock:
+        if session.client is not None and not session.invalid:
+            return session.client
+        started = time.perf_counter()
+        client = session.client or instagrapi.Client()
+        client.login(session.username, session.password, relogin=session.invalid)
+        session.client = client
+        session.invalid = False
+        session.validated_at = time.time()
+        checkpoint_session(session)
+        logging.info(f"Logged in Instagram account {session.username} in {time.perf_counter() - started:.2f}s, saved session to {session.session_file}")
+        return client
+
+def validate_session(session: AccountSession) -> None:
+    """Check a session with a cheap authenticated call, re-establishing it if Instagram rejects it."""
+    if not session.invalid:
+        try:
+            session.client.account_info()
+            session.validated_at = time.time()
+            logging.debug(f"Instagram session for {session.username} is still valid")
+            return
+        except LoginRequired:
+            logging.warning(f"Instagram session for {session.username} expired, logging in again")
+            session.invalid = True
+    login_session(session)
+
+def refresh_session(session: AccountSession) -> None:
+    """Bring one session up to date off the hot path: log in, revalidate or checkpoint it as needed."""
+    try:
+        with session.lock:
+            now = time.time()
+            if session.client is None or session.invalid:
+                if now - session.login_failed_at >= SESSION_LOGIN_RETRY_SECONDS:
+                    login_session(session)
+            elif now - session.validated_at > SESSION_VALIDATE_SECONDS:
+                validate_session(session)
+            elif session.used_at > session.checkpointed_at:
+                checkpoint_session(session)
+    except Exception as e:
+        session.login_failed_at = time.time()
+        logging.error(f"Background refresh of Instagram session for {session.username} failed: {e}")
+        print(f"Background refresh of Instagram session for {session.username} failed: {e}")
+
+def report_client_error(username: str, error: Exception) -> None:
+    """Take a session out of the rotation when Instagram says it is no longer logged in."""
+    if not isinstance(error, LoginRequired):
+        return
+    for session in SESSIONS:
+        if session.username == username and not session.invalid:
+            session.invalid = True
+            logging.warning(f"Instagram session for {session.username} was rejected, re-establishing it in the background")
+            if _maintenance_wakeup is not None and _maintenance_loop is not None:
+                _maintenance_loop.call_soon_threadsafe(_maintenance_wakeup.set)
+
+def acquire_next_session() -> AccountSession:
+    """Lock the next usable account in the rotation, logging it in on first use.
+
+    Accounts another thread is using are skipped while a free one is available;
+    otherwise this waits for one. A thread may take an account it already holds.
+    """
+    start = next(_rotation)
+    for blocking in (False, True):
+        for session in SESSIONS[start:] + SESSIONS[:start]:
+            if session.invalid or (session.client is None and time.time() - session.login_failed_at < SESSION_LOGIN_RETRY_SECONDS):
+                continue
+            if not session.lock.acquire(blocking=blocking):
+                continue
+            if session.invalid:  # Rejected while we waited for it
+                session.lock.release()
+                continue
+            if session.client is None:
+                try:
+                    login_session(session)
+                except Exception as e:
+                    session.lock.release()
+                    session.login_failed_at = time.time()
+                    logging.error(f"Instagram authentication failed for {session.username}: {e}")
+                    print(f"Instagram authentication failed for {session.username}: {e}")
+                    continue
+            session.used_at = time.time()
+            return session
+    raise RuntimeError("No Instagram account is available")
+
+@contextmanager
+def get_next_client() -> Iterator[Tuple[instagrapi.Client, str]]:
+    """Borrow the next usable Instagram client for the duration of a with block.
+
+    instagrapi keeps each request's response on the client (last_json), so no other
+    thread (a poll, a /userdetails refresh, session maintenance) may use it meanwhile.
+    """
+    session = acquire_next_session()
+    try:
+        yield session.client, session.username
+    except Exception:
+        logging.debug(f"Last Instagram response for {session.username}: {getattr(session.client, 'last_json', None)}")
+        raise
+    finally:
+        session.lock.release()
+
+async def load_sessions() -> None:
+    """Load every saved session in parallel, report how long startup took and start maintaining them."""
+    global _maintenance_task
+    started = time.perf_counter()
+    loaded = await asyncio.gather(*(asyncio.to_thread(load_session, session) for session in SESSIONS))
+    logging.info(f"Instagram sessions ready in {time.perf_counter() - started:.2f}s: {sum(loaded)} loaded from disk, {len(loaded) - sum(loaded)} deferred until first use")
+    print(f"Instagram sessions ready in {time.perf_counter() - started:.2f}s")
+    _maintenance_task = asyncio.create_task(run_session_maintenance())
+
+async def run_session_maintenance() -> None:
+    """Checkpoint, revalidate and re-establish sessions in the background, forever."""
+    global _maintenance_wakeup, _maintenance_loop
+    _maintenance_wakeup = asyncio.Event()
+    _maintenance_loop = asyncio.get_running_loop()
+    while True:
+        _maintenance_wakeup.clear()
+        for session in SESSIONS:
+            await asyncio.to_thread(refresh_session, session)
+        try:
+            await asyncio.wait_for(_maintenance_wakeup.wait(), timeout=SESSION_MAINTENANCE_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+def start_sessions() -> asyncio.Task:
+    """Start loading sessions and then maintaining them in the background, once."""
+    global _startup_task
+    if _startup_task is None:
+        _startup_task = asyncio.create_task(load_sessions())
+    return _startup_task
+
+async def wait_for_sessions() -> None:
+    """Wait until saved sessions are loaded, starting the load if nothing did yet."""
+    await asyncio.shield(start_sessions())
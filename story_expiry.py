@@ -0,0 +1,96 @@
+import asyncio
+import heapq
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+STORY_EXPIRATION_HOURS = 24
+STORY_EXPIRY_RECHECK_SECONDS = 300
+STORY_EXPIRY_SCHEDULE_FILE = "story_expiry_schedule.json"
+
+# Min-heap of (expires_at, username, story_id), mirrored to STORY_EXPIRY_SCHEDULE_FILE
+story_expiry_schedule: List[Tuple[int, str, str]] = []
+scheduled_story_keys = set()
+_wakeup: Optional[asyncio.Event] = None
+_wakeup_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def load_story_expiry_schedule() -> None:
+    """Load the persisted story expiry schedule into the in-memory heap."""
+    try:
+        with open(STORY_EXPIRY_SCHEDULE_FILE, "r") as f:
+            data = json.load(f)
+        story_expiry_schedule.clear()
+        scheduled_story_keys.clear()
+        for expires_at, username, story_id in data:
+            story_expiry_schedule.append((int(expires_at), username, str(story_id)))
+            scheduled_story_keys.add((username, str(story_id)))
+        heapq.heapify(story_expiry_schedule)
+        logging.debug(f"Loaded {len(story_expiry_schedule)} scheduled story expiries")
+    except (FileNotFoundError, json.JSONDecodeError, ValueError, TypeError):
+        logging.warning("No valid story expiry schedule found, starting fresh")
+
+def save_story_expiry_schedule() -> None:
+    """Persist the story expiry schedule."""
+    try:
+        with open(f"{STORY_EXPIRY_SCHEDULE_FILE}.tmp", "w") as f:
+            json.dump(sorted(story_expiry_schedule), f)
+        os.replace(f"{STORY_EXPIRY_SCHEDULE_FILE}.tmp", STORY_EXPIRY_SCHEDULE_FILE)
+    except Exception as e:
+        logging.error(f"Error saving story expiry schedule: {e}")
+        print(f"Error saving story expiry schedule: {e}")
+
+def schedule_story_expiry(username: str, story_id: str, expires_at: int) -> None:
+    """Schedule the expiry notice for a story, ignoring stories that are already scheduled.
+
+    Safe to call from worker threads: the heap is only touched on the timer's event loop.
+    """
+    if _wakeup_loop is not None and not on_timer_loop():
+        _wakeup_loop.call_soon_threadsafe(schedule_story_expiry, username, story_id, expires_at)
+        return
+    key = (username, str(story_id))
+    if key in scheduled_story_keys:
+        return
+    heapq.heappush(story_expiry_schedule, (int(expires_at), username, str(story_id)))
+    scheduled_story_keys.add(key)
+    save_story_expiry_schedule()
+    logging.debug(f"Scheduled expiry for story {story_id} of @{username} at {expires_at}")
+    if _wakeup is not None:
+        _wakeup.set()
+
+def on_timer_loop() -> bool:
+    try:
+        return asyncio.get_running_loop() is _wakeup_loop
+    except RuntimeError:
+        return False
+
+def pop_due_story_expiries(now: float) -> List[Tuple[int, str, str]]:
+    """Remove and return every scheduled expiry that is due at the given time."""
+    due = []
+    while story_expiry_schedule and story_expiry_schedule[0][0] <= now:
+        expires_at, username, story_id = heapq.heappop(story_expiry_schedule)
+        scheduled_story_keys.discard((username, story_id))
+        due.append((expires_at, username, story_id))
+    if due:
+        save_story_expiry_schedule()
+    return due
+
+async def run_story_expiry_timer(on_expire: Callable[[str, str, int], Awaitable[None]]) -> None:
+    """Sleep until the next scheduled story expiry and fire on_expire for it, forever."""
+    global _wakeup, _wakeup_loop
+    _wakeup = asyncio.Event()
+    _wakeup_loop = asyncio.get_running_loop()
+    while True:
+        _wakeup.clear()
+        for expires_at, username, story_id in pop_due_story_expiries(time.time()):
+            try:
+                await on_expire(username, story_id, expires_at)
+            except Exception as e:
+                logging.error(f"Error firing scheduled expiry for story {story_id} of @{username}: {e}")
+                print(f"Error firing scheduled expiry for story {story_id} of @{username}: {e}")
+        timeout = max(story_expiry_schedule[0][0] - time.time(), 0) if story_expiry_schedule else None
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,70 @@
+import json
+import logging
+from typing import Dict, List, Optional
+
+SUBSCRIPTIONS_FILE = "subscriptions.json"
+AUTO_POST_CHANNEL_FILE = "auto_post_channel.txt"
+
+# channel id -> {"guild_id": guild id or None, "usernames": [monitored usernames posted there], or None for all of them}
+SUBSCRIPTIONS: Dict[str, Dict] = {}
+
+def load_subscriptions() -> Dict[str, Dict]:
+    """Load the channel subscriptions, migrating the old single auto-post channel file."""
+    SUBSCRIPTIONS.clear()
+    try:
+        with open(SUBSCRIPTIONS_FILE, "r") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            SUBSCRIPTIONS.update(data)
+        logging.debug(f"Loaded subscriptions: {SUBSCRIPTIONS}")
+    except (FileNotFoundError, json.JSONDecodeError):
+        try:
+            with open(AUTO_POST_CHANNEL_FILE, "r") as f:
+                channel_id = int(f.read().strip())
+            SUBSCRIPTIONS[str(channel_id)] = {"guild_id": None, "usernames": None}
+            save_subscriptions()
+            logging.info(f"Migrated auto-post channel {channel_id} to {SUBSCRIPTIONS_FILE}")
+        except (FileNotFoundError, ValueError):
+            logging.warning("No valid subscriptions found, starting fresh")
+    return SUBSCRIPTIONS
+
+def save_subscriptions() -> None:
+    """Save the channel subscriptions."""
+    try:
+        with open(SUBSCRIPTIONS_FILE, "w") as f:
+            json.dump(SUBSCRIPTIONS, f, indent=4)
+        logging.debug(f"Saved subscriptions: {SUBSCRIPTIONS}")
+    except Exception as e:
+        logging.error(f"Error saving subscriptions: {e}")
+        print(f"Error saving subscriptions: {e}")
+
+def subscribe_channel(channel_id: int, guild_id: Optional[int], usernames: Optional[List[str]]) -> None:
+    """Subscribe a channel to the given monitored usernames, or with None to every monitored user, current and future."""
+    subscription = SUBSCRIPTIONS.setdefault(str(channel_id), {"guild_id": None, "usernames": []})
+    subscription["guild_id"] = str(guild_id) if guild_id else subscription.get("guild_id")
+    if usernames is None:
+        subscription["usernames"] = None
+    elif subscription["usernames"] is not None:
+        for username in usernames:
+            if username not in subscription["usernames"]:
+                subscription["usernames"].append(username)
+    save_subscriptions()
+
+def unsubscribe_channels(channel_ids: List[int]) -> None:
+    """Remove every subscription of the given channels."""
+    for channel_id in channel_ids:
+        SUBSCRIPTIONS.pop(str(channel_id), None)
+    save_subscriptions()
+
+def subscription_usernames(subscription: Dict, monitored_usernames: List[str]) -> List[str]:
+    """Return the usernames a subscription covers right now."""
+    return list(monitored_usernames) if subscription["usernames"] is None else subscription["usernames"]
+
+def subscribed_usernames(monitored_usernames: List[str]) -> List[str]:
+    """Return every username at least one channel is subscribed to."""
+    usernames = []
+    for subscription in SUBSCRIPTIONS.values():
+        for username in subscription_usernames(subscription, monitored_usernames):
+            if username not in usernames:
+                usernames.append(username)
+    return usernames
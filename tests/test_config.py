@@ -0,0 +1,30 @@
+import json
+import pytest
+import config
+from config import CONFIG, BotConfig, apply_config, load_config, update_setting
+
+@pytest.fixture(autouse=True)
+def config_file(tmp_path, monkeypatch):
+    path = tmp_path / "config.json"
+    monkeypatch.setattr(config, "CONFIG_FILE", str(path))
+    monkeypatch.setattr(config, "_loaded_mtime", None)
+    apply_config(BotConfig())
+    yield path
+    apply_config(BotConfig())
+
+def test_update_setting_applies_and_saves(config_file):
+    assert update_setting("post_fetch_window", 5) == ["post_fetch_window"]
+    assert CONFIG.post_fetch_window == 5
+    assert json.loads(config_file.read_text())["post_fetch_window"] == 5
+
+def test_update_setting_that_cannot_be_saved_is_not_applied(config_file, monkeypatch):
+    monkeypatch.setattr(config, "CONFIG_FILE", str(config_file.parent / "missing" / "config.json"))
+    with pytest.raises(OSError):
+        update_setting("userdetails_ttl_seconds", 60)
+    assert CONFIG.userdetails_ttl_seconds == BotConfig().userdetails_ttl_seconds
+
+def test_invalid_file_keeps_the_current_settings(config_file):
+    update_setting("check_interval", 30)
+    config_file.write_text(json.dumps({"check_interval": -1}))
+    assert load_config() == []
+    assert CONFIG.check_interval == 30
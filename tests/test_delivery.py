@@ -0,0 +1,51 @@
+import collections
+import discord
+from delivery import DISCORD_MAX_EMBEDS_PER_MESSAGE, DISCORD_MAX_FILES_PER_MESSAGE, OutboundItem, coalesce_batch, plan_attachment_packing
+
+def outbound(identifier, files=(), embeds=1, buttons=1):
+    return OutboundItem(
+        identifier=identifier,
+        embeds=[discord.Embed(title=identifier) for _ in range(embeds)],
+        files=list(files),
+        buttons=[("View", f"https://example.com/{identifier}")] * buttons
+    )
+
+def test_packing_keeps_slides_in_order():
+    assert plan_attachment_packing([60, 50, 40, 30], 10, 1, 100) == [[0], [1, 2], [3]]
+
+def test_packing_fills_messages_up_to_the_budget():
+    assert plan_attachment_packing([30, 30, 30, 30], 10, 1, 100) == [[0, 1, 2], [3]]
+
+def test_packing_respects_the_file_count():
+    sizes = [1] * 12
+    messages = plan_attachment_packing(sizes, 0, 2, 100)
+    assert messages == [list(range(8)), list(range(8, 12))]
+    assert all(len(message) <= DISCORD_MAX_FILES_PER_MESSAGE - 2 for message in messages)
+
+def test_packing_leaves_out_files_that_never_fit():
+    assert plan_attachment_packing([20, 95, 20], 10, 1, 100) == [[0, 2]]
+
+def test_packing_without_room_for_files():
+    assert plan_attachment_packing([1, 1], 0, DISCORD_MAX_FILES_PER_MESSAGE, 100) == []
+
+def test_coalesce_merges_items_that_fit():
+    pending = collections.deque([outbound("a", [(b"x" * 10, "a.jpg")]), outbound("b", [(b"y" * 10, "b.jpg")])])
+    batch = coalesce_batch(pending, 100)
+    assert [item.identifier for item in batch] == ["a", "b"]
+    assert not pending
+
+def test_coalesce_counts_shared_files_once():
+    logo = (b"l" * 40, "logo.png")
+    pending = collections.deque([outbound("a", [logo, (b"x" * 20, "a.jpg")]), outbound("b", [logo, (b"y" * 20, "b.jpg")])])
+    assert len(coalesce_batch(pending, 80)) == 2
+
+def test_coalesce_stops_at_the_upload_limit():
+    pending = collections.deque([outbound("a", [(b"x" * 60, "a.jpg")]), outbound("b", [(b"y" * 60, "b.jpg")])])
+    batch = coalesce_batch(pending, 100)
+    assert [item.identifier for item in batch] == ["a"]
+    assert [item.identifier for item in pending] == ["b"]
+
+def test_coalesce_stops_at_the_embed_limit():
+    pending = collections.deque([outbound("a", embeds=DISCORD_MAX_EMBEDS_PER_MESSAGE - 1), outbound("b", embeds=2), outbound("c")])
+    assert [item.identifier for item in coalesce_batch(pending, 100)] == ["a"]
+    assert [item.identifier for item in coalesce_batch(pending, 100)] == ["b", "c"]
@@ -0,0 +1,57 @@
+import pytest
+import leases
+from leases import LEASE_SECONDS, claim_usernames, release_leases, renew_leases
+
+USERS = ["a", "b", "c", "d", "e"]
+
+@pytest.fixture(autouse=True)
+def lease_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(leases, "LEASE_DB_FILE", str(tmp_path / "leases.db"))
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(leases.time, "time", lambda: now[0])
+    return now
+
+def test_single_poller_takes_every_user(clock):
+    assert claim_usernames("p1", USERS) == USERS
+
+def test_second_poller_gets_a_share_once_the_first_gives_up_extras(clock):
+    claim_usernames("p1", USERS)
+    assert claim_usernames("p2", USERS) == []
+    first = claim_usernames("p1", USERS)
+    assert first == ["a", "b", "c"]
+    assert claim_usernames("p2", USERS) == ["d", "e"]
+
+def test_shares_never_overlap(clock):
+    for _ in range(2):
+        shares = [claim_usernames(owner, USERS) for owner in ("p1", "p2", "p3")]
+    claimed = [username for share in shares for username in share]
+    assert sorted(claimed) == USERS
+    assert max(len(share) for share in shares) == 2
+
+def test_users_of_a_silent_poller_are_taken_over(clock):
+    claim_usernames("p1", USERS)
+    claim_usernames("p2", USERS)
+    claim_usernames("p1", USERS)
+    claim_usernames("p2", USERS)
+    clock[0] += LEASE_SECONDS + 1
+    assert claim_usernames("p2", USERS) == USERS
+
+def test_renewing_keeps_the_leases(clock):
+    claim_usernames("p1", USERS)
+    clock[0] += LEASE_SECONDS / 2
+    assert renew_leases("p1") == len(USERS)
+    clock[0] += LEASE_SECONDS / 2 + 1
+    assert claim_usernames("p2", USERS) == []
+
+def test_released_users_move_on_straight_away(clock):
+    claim_usernames("p1", USERS)
+    claim_usernames("p2", USERS)
+    release_leases("p1")
+    assert claim_usernames("p2", USERS) == USERS
+
+def test_claims_follow_the_current_user_list(clock):
+    claim_usernames("p1", USERS)
+    assert claim_usernames("p1", ["a", "z"]) == ["a", "z"]
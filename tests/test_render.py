@@ -0,0 +1,65 @@
+import time
+import pytest
+from assets import INSTAGRAM_LOGO, get_asset
+from delivery import DISCORD_MAX_FILES_PER_MESSAGE
+from records import MediaHandle, PostItem
+from render import RENDER_CACHE, render_item
+
+UPLOAD_LIMIT = 10 * 1024 * 1024
+
+def carousel(slides):
+    return PostItem(
+        username="someone",
+        media_pk=1,
+        url="https://www.instagram.com/p/ABC/",
+        text="caption",
+        timestamp=1_700_000_000,
+        shortcode="ABC",
+        media=[MediaHandle(b"x" * 100, f"slide_{idx}.jpg") for idx in range(slides)],
+        profile=MediaHandle(b"p" * 10, "profile_someone.jpg")
+    )
+
+@pytest.fixture
+def logo(monkeypatch):
+    asset = get_asset(INSTAGRAM_LOGO)
+    monkeypatch.setattr(asset, "hosted_url", None)
+    monkeypatch.setattr(asset, "hosted_until", 0.0)
+    RENDER_CACHE.clear()
+    yield asset
+    RENDER_CACHE.clear()
+
+def host(asset):
+    asset.hosted_url = "https://cdn.discordapp.com/attachments/1/2/instagram.png"
+    asset.hosted_until = time.time() + 86400
+
+def test_plan_made_while_hosted_resumes_within_the_file_limit(logo):
+    host(logo)
+    item = carousel(14)
+    plan = [rendered.media_filenames for rendered in render_item(item, UPLOAD_LIMIT)]
+    assert [len(filenames) for filenames in plan] == [DISCORD_MAX_FILES_PER_MESSAGE - 1, 5]
+
+    logo.hosted_url = None
+    RENDER_CACHE.clear()
+    resumed = render_item(item, UPLOAD_LIMIT, plan)
+    assert [rendered.media_filenames for rendered in resumed] == plan
+    for rendered in resumed:
+        assert len(rendered.files) <= DISCORD_MAX_FILES_PER_MESSAGE
+        assert INSTAGRAM_LOGO not in [filename for _, filename in rendered.files]
+        assert all(embed.author.icon_url is None for embed in rendered.embeds)
+
+def test_plan_with_room_for_the_logo_keeps_it(logo):
+    host(logo)
+    item = carousel(3)
+    plan = [rendered.media_filenames for rendered in render_item(item, UPLOAD_LIMIT)]
+
+    logo.hosted_url = None
+    RENDER_CACHE.clear()
+    resumed = render_item(item, UPLOAD_LIMIT, plan)
+    assert [filename for _, filename in resumed[0].files] == [INSTAGRAM_LOGO, "profile_someone.jpg", "slide_0.jpg", "slide_1.jpg", "slide_2.jpg"]
+    assert resumed[0].embeds[0].author.icon_url == f"attachment://{INSTAGRAM_LOGO}"
+
+def test_fresh_render_packs_around_the_attached_logo(logo):
+    item = carousel(14)
+    rendered = render_item(item, UPLOAD_LIMIT)
+    assert [len(part.media_filenames) for part in rendered] == [DISCORD_MAX_FILES_PER_MESSAGE - 2, 6]
+    assert all(len(part.files) <= DISCORD_MAX_FILES_PER_MESSAGE for part in rendered)